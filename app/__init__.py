@@ -3,6 +3,24 @@ from config import Config
 
 from .extensions import db, migrate, cors
 from .blueprints import register_blueprints
+from .blueprints.health import init_health
+from .utils.metrics import metrics
+from .utils.transport import transport
+from .utils.cache import response_cache
+from .utils.l2cache import l2_cache
+from .utils.breaker import breakers
+from .utils.retry import retries
+from .utils.ratelimit import rate_limiter
+from .utils.aio import engine
+from .utils.compression import response_compressor
+from .utils.request_logger import request_logger
+from .utils.warmup import cache_warmer
+from .utils.history_writer import history_writer
+from .utils.traffic_rollups import traffic_rollups
+from .utils.history_partitions import history_partitions
+from .services.deputados_roster import deputados_roster
+from .services.ibge_metadata import ibge_metadata
+from .utils.jsonprovider import init_json_provider
 from .utils.helpers import error_response_from_exception 
 from .utils.exceptions import err, ErrorNotFound
 from werkzeug.exceptions import NotFound as HTTPNotFound
@@ -11,12 +29,31 @@ from werkzeug.exceptions import NotFound as HTTPNotFound
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    init_json_provider(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
     cors.init_app(app)
+    metrics.init_app(app)  # primeiro hook: mede a requisição inteira
+    transport.init_app(app)
+    response_cache.init_app(app)
+    l2_cache.init_app(app)
+    breakers.init_app(app)
+    retries.init_app(app)
+    rate_limiter.init_app(app)
+    engine.init_app(app)
+    request_logger.init_app(app)  # antes da compressão (ver RequestLogger.init_app)
+    response_compressor.init_app(app)
+    traffic_rollups.init_app(app)
+    history_writer.init_app(app)
+    history_partitions.init_app(app)
+    # só lêem a config: a carga começa na primeira busca (nada baixa na CLI)
+    deputados_roster.init_app(app)
+    ibge_metadata.init_app(app)
 
     register_blueprints(app)
+    init_health(app)
+    cache_warmer.init_app(app)
 
     @app.errorhandler(err)
     def handle_faif_error(exc):
@@ -12,6 +12,8 @@ def register_blueprints(app):
     from . import servicos
     from . import servidores
     from . import historico
+    from . import batch
+    from . import metrics
 
     app.register_blueprint(cep.bp)
     app.register_blueprint(cnpj.bp)
@@ -21,4 +23,6 @@ def register_blueprints(app):
     app.register_blueprint(ibge.bp)
     app.register_blueprint(servicos.bp)
     app.register_blueprint(servidores.bp)
-    app.register_blueprint(historico.bp)
\ No newline at end of file
+    app.register_blueprint(historico.bp)
+    app.register_blueprint(batch.bp)
+    app.register_blueprint(metrics.bp)
\ No newline at end of file
@@ -0,0 +1,133 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import json
+import os
+import threading
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+
+from ..utils.dispatch import internal_get, is_bulk_route
+from ..utils.exceptions import err
+from ..utils.fetch import logger
+
+bp = Blueprint("batch", __name__, url_prefix="/faif/batch")
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _reset_pool_after_fork() -> None:
+    global _pool_lock, _pool
+    _pool_lock = threading.Lock()
+    _pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def _executor(workers: int) -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faif-batch")
+        return _pool
+
+
+def _invalid(message: str, details: Any = None) -> err:
+    return err(message, status_code=400, error_code="INVALID_BATCH", details=details)
+
+
+def _parse_items(payload: Any, max_items: int) -> List[Tuple[Any, str, str]]:
+    """Valida o corpo e devolve (id, path, query canônica) de cada sub-requisição."""
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise _invalid("Corpo deve ser {\"requests\": [...]} com ao menos um item.")
+    if len(items) > max_items:
+        raise _invalid(f"No máximo {max_items} sub-requisições por lote.", {"received": len(items)})
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise _invalid("Cada item deve ter 'path' (string).", {"index": index})
+        parts = urlsplit(item["path"])
+        if parts.scheme or parts.netloc or not parts.path.startswith("/faif/"):
+            raise _invalid("'path' deve ser uma rota /faif/...", {"index": index, "path": item["path"]})
+        if parts.path.rstrip("/") == bp.url_prefix:
+            raise _invalid("Lotes não podem conter outro lote.", {"index": index})
+        params = item.get("params") or {}
+        if not isinstance(params, dict):
+            raise _invalid("'params' deve ser um objeto.", {"index": index})
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        query += [(str(k), str(v)) for k, v in params.items() if v is not None]
+        if is_bulk_route(parts.path, query):
+            raise _invalid(
+                "Exportações e varreduras não podem ser executadas em lote.",
+                {"index": index, "path": item["path"]},
+            )
+        parsed.append((item.get("id"), parts.path, urlencode(sorted(query))))
+    return parsed
+
+
+def _item_line(index: int, item_id: Any, path: str, query: str, status: int, body: bytes) -> bytes:
+    """Resultado de um item: metadados + a resposta da rota, copiada sem redecodificar."""
+    head = json.dumps(
+        {"index": index, "id": item_id, "path": path + ("?" + query if query else ""), "status": status},
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return head[:-1] + b',"response":' + body + b"}"
+
+
+@bp.route("", methods=["POST"])
+def executar_lote():
+    """
+    Executa várias consultas FAIF de uma vez, em paralelo.
+    Uso: POST /faif/batch
+         {"requests": [{"id": "a", "path": "/faif/cep/01001000"},
+                       {"id": "b", "path": "/faif/deputados", "params": {"nome": "silva"}}]}
+    Cada item traz o status e a resposta da rota no envelope de sempre
+    ({"ok": true, "data": ...} ou {"ok": false, "error": ...}). Itens repetidos
+    são executados uma vez só.
+    Com ?stream=1 (ou Accept: application/x-ndjson) a resposta é NDJSON, uma
+    linha por item na ordem em que ficam prontos; sem isso, um único JSON com
+    os itens na ordem do pedido.
+    """
+    config = current_app.config
+    items = _parse_items(request.get_json(silent=True), int(config.get("BATCH_MAX_ITEMS", 500)))
+    stream = request.args.get("stream") in ("1", "true") or (
+        request.accept_mimetypes.best == NDJSON_MIMETYPE
+    )
+
+    # sub-requisições repetidas são executadas uma vez só
+    indexes: Dict[Tuple[str, str], List[int]] = {}
+    for index, (_, path, query) in enumerate(items):
+        indexes.setdefault((path, query), []).append(index)
+
+    app = current_app._get_current_object()
+    pool = _executor(int(config.get("BATCH_CONCURRENCY", 16)))
+    futures: Dict["Future[Tuple[int, bytes]]", Tuple[str, str]] = {
+        pool.submit(internal_get, app, path, query, purpose="batch"): (path, query) for path, query in indexes
+    }
+    logger.info("[FAIFApi] lote com %d itens (%d distintos)", len(items), len(futures))
+
+    def _lines() -> Iterator[Tuple[int, bytes]]:
+        for future in as_completed(futures):
+            path, query = futures[future]
+            status, body = future.result()
+            for index in indexes[(path, query)]:
+                yield index, _item_line(index, items[index][0], path, query, status, body)
+
+    if stream:
+        return Response(
+            stream_with_context(line + b"\n" for _, line in _lines()),
+            mimetype=NDJSON_MIMETYPE,
+        )
+
+    ordered: List[bytes] = [b""] * len(items)
+    for index, line in _lines():
+        ordered[index] = line
+    body = b'{"ok":true,"data":[' + b",".join(ordered) + b"]}\n"
+    return Response(body, mimetype="application/json")
@@ -1,6 +1,6 @@
-from flask import Blueprint, jsonify
-from ..utils.fetch import fetch_json
-from ..utils.helpers import sanitize_digits
+from flask import Blueprint
+from ..utils.fetch import fetch_raw
+from ..utils.helpers import is_empty_json, raw_success_response, sanitize_digits
 from ..utils.fetch import logger
 
 bp = Blueprint("cep", __name__, url_prefix="/faif/cep")
@@ -14,11 +14,12 @@ def consultar_cep(cep: str):
     """
     digits = sanitize_digits(cep)
     url = f"https://brasilapi.com.br/api/cep/v2/{digits}"
-    dados = fetch_json(
+    dados = fetch_raw(
         url,
         not_found_message="CEP não encontrado.",
         not_found_error_code="CEP_NOT_FOUND",
+        cache_policy="cep",
     )
-    logger.info("[FAIFApi] consultar_cep(%s) -> %s", digits, "OK" if dados else "EMPTY")
+    logger.info("[FAIFApi] consultar_cep(%s) -> %s", digits, "EMPTY" if is_empty_json(dados) else "OK")
 
-    return jsonify({"ok": True, "data": dados})
\ No newline at end of file
+    return raw_success_response(dados)
\ No newline at end of file
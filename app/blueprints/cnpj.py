@@ -1,6 +1,9 @@
-from flask import Blueprint, jsonify
+from typing import Any, Dict, Optional
+from flask import Blueprint
+from ..utils.aio import engine, fetch_json_async
+from ..utils.exceptions import err
 from ..utils.fetch import fetch_json, logger
-from ..utils.helpers import sanitize_digits
+from ..utils.helpers import sanitize_digits, success_response
 from ..services.normalizers import map_cnpj_data
 
 bp = Blueprint("cnpj", __name__, url_prefix="/faif")
@@ -13,9 +16,79 @@ def consultar_cnpj(cnpj: str):
         url,
         not_found_message="CNPJ não encontrado.",
         not_found_error_code="CNPJ_NOT_FOUND",
+        cache_policy="cnpj",
     )
 
     mapped = map_cnpj_data(dados, digits=digits)
     logger.info("[FAIFApi] consultar_cnpj %s -> %s", digits, "OK" if dados else "EMPTY")
 
-    return jsonify({"ok": True, "data": mapped})
\ No newline at end of file
+    return success_response(mapped)
+
+
+def _section(result: Any) -> Dict[str, Any]:
+    """Seção do dossiê a partir do resultado (ou exceção) de uma consulta."""
+    if isinstance(result, err):
+        return {"status": "error", "error": result.to_dict()["error"]}
+    if isinstance(result, BaseException):
+        logger.error("[FAIFApi] seção do dossiê falhou: %r", result)
+        return {"status": "error", "error": err("Erro interno do servidor.").to_dict()["error"]}
+    return {"status": "ok", "data": result}
+
+
+def _skipped(reason: str) -> Dict[str, Any]:
+    return {"status": "skipped", "reason": reason}
+
+
+@bp.route("/cnpj/<cnpj>/dossie", methods=["GET"])
+def dossie_cnpj(cnpj: str):
+    """
+    Dossiê de uma empresa: dados do CNPJ mais o endereço (CEP) e o município
+    (IBGE), consultados em paralelo. Cada seção traz seu próprio status
+    ("ok", "error" ou "skipped"); a falha de uma seção não derruba as outras.
+    Uso: /faif/cnpj/<cnpj>/dossie
+    """
+    digits = sanitize_digits(cnpj)
+    dados = fetch_json(
+        f"https://brasilapi.com.br/api/cnpj/v1/{digits}",
+        not_found_message="CNPJ não encontrado.",
+        not_found_error_code="CNPJ_NOT_FOUND",
+        cache_policy="cnpj",
+    )
+    empresa = map_cnpj_data(dados, digits=digits)
+
+    cep = sanitize_digits(empresa["cep"])
+    codigo_municipio: Optional[Any] = dados.get("codigo_municipio_ibge") if isinstance(dados, dict) else None
+
+    names, coros = [], []
+    if len(cep) == 8:
+        names.append("endereco")
+        coros.append(fetch_json_async(
+            f"https://brasilapi.com.br/api/cep/v2/{cep}",
+            not_found_message="CEP não encontrado.",
+            not_found_error_code="CEP_NOT_FOUND",
+            cache_policy="cep",
+        ))
+    if codigo_municipio:
+        names.append("municipio")
+        coros.append(fetch_json_async(
+            f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{codigo_municipio}",
+            headers={"Accept": "application/json"},
+            not_found_message="Município não encontrado no IBGE.",
+            not_found_error_code="MUNICIPIO_NOT_FOUND",
+            cache_policy="ibge",
+        ))
+
+    secoes: Dict[str, Any] = {
+        "empresa": {"status": "ok", "data": empresa},
+        "endereco": _skipped("CNPJ sem CEP válido."),
+        "municipio": _skipped("CNPJ sem código de município do IBGE."),
+    }
+    for name, result in zip(names, engine.gather(coros) if coros else []):
+        secoes[name] = _section(result)
+
+    logger.info(
+        "[FAIFApi] dossie_cnpj %s -> %s",
+        digits,
+        ", ".join(f"{k}={v['status']}" for k, v in secoes.items()),
+    )
+    return success_response(secoes)
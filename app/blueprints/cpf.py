@@ -1,6 +1,6 @@
-from flask import Blueprint, jsonify, current_app
-from ..utils.fetch import fetch_json
-from ..utils.helpers import sanitize_digits
+from flask import Blueprint, current_app
+from ..utils.fetch import fetch_raw
+from ..utils.helpers import is_empty_json, raw_success_response, sanitize_digits
 from ..utils.fetch import logger
 
 bp = Blueprint("cpf", __name__, url_prefix="/faif/transparencia/pessoa-fisica")
@@ -21,13 +21,14 @@ def buscar_pessoa_fisica(cpf: str, nis: str):
         "User-Agent": "FAIFApi/1.0",
     }
 
-    dados = fetch_json(
+    dados = fetch_raw(
         url,
         headers=headers,
         not_found_message="Pessoa física não encontrada.",
         not_found_error_code="PESSOA_FISICA_NOT_FOUND",
+        cache_policy="pessoa_fisica",
     )
 
-    logger.info("[FAIFApi] buscar_pessoa_fisica cpf=%s nis=%s -> %s", cpf, nis, "OK" if dados else "EMPTY")
+    logger.info("[FAIFApi] buscar_pessoa_fisica cpf=%s nis=%s -> %s", cpf, nis, "EMPTY" if is_empty_json(dados) else "OK")
 
-    return jsonify({"ok": True, "data": dados})
\ No newline at end of file
+    return raw_success_response(dados)
\ No newline at end of file
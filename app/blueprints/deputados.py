@@ -1,7 +1,9 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 from ..utils.fetch import fetch_json, logger
 from ..utils.exceptions import err
+from ..utils.helpers import success_response
 from ..services.normalizers import normalize_deputados_list, normalize_deputado_details
+from ..services.deputados_roster import deputados_roster
 
 bp = Blueprint("deputados", __name__, url_prefix="/faif/deputados")
 
@@ -9,7 +11,10 @@ bp = Blueprint("deputados", __name__, url_prefix="/faif/deputados")
 def buscar_deputados_por_nome():
     """
     Busca deputados por nome via query param e retorna uma lista simplificada.
-    Uso: GET /faif/deputados?nome=<nome>
+    Uso: GET /faif/deputados?nome=<nome>[&fuzzy=1]
+    A busca usa a lista local dos deputados em exercício (cada palavra casa com
+    o início de uma palavra do nome, sem diferenciar acentos); fuzzy=1 tolera
+    erros de digitação. Sem a lista carregada, consulta a API da Câmara.
     """
     nome = request.args.get("nome", "").strip()
     if not nome:
@@ -20,17 +25,23 @@ def buscar_deputados_por_nome():
             details="Query param 'nome' ausente ou vazio.",
         )
 
+    local = deputados_roster.search(nome, fuzzy=request.args.get("fuzzy") in ("1", "true"))
+    if local is not None:
+        logger.info("[FAIFApi] buscar_deputados(nome=%s) -> %d itens (lista local)", nome, len(local))
+        return success_response(local)
+
     url = f"https://dadosabertos.camara.leg.br/api/v2/deputados?nome={nome}"
     dados = fetch_json(
         url,
         headers={"Accept": "application/json"},
         not_found_message="Nenhum deputado encontrado para este nome.",
         not_found_error_code="DEPUTADO_NOT_FOUND",
+        cache_policy="deputados",
     )
 
     normalizado = normalize_deputados_list(dados)
     logger.info("[FAIFApi] buscar_deputados(nome=%s) -> %d itens", nome, len(normalizado))
-    return jsonify({"ok": True, "data": normalizado})
+    return success_response(normalizado)
 
 
 @bp.route("/<int:deputado_id>", methods=["GET"])
@@ -45,10 +56,11 @@ def obter_detalhes_deputado(deputado_id: int):
         headers={"Accept": "application/json"},
         not_found_message="ID de deputado não encontrado.",
         not_found_error_code="DEPUTADO_ID_NOT_FOUND",
+        cache_policy="deputados",
     )
 
     dados_do_deputado = dados.get("dados", {})
 
     normalizado = normalize_deputado_details(dados_do_deputado)
     logger.info("[FAIFApi] obter_detalhes_deputado(id=%d) -> OK", deputado_id)
-    return jsonify({"ok": True, "data": normalizado})
+    return success_response(normalizado)
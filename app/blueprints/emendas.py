@@ -1,36 +1,35 @@
-from typing import Dict, Optional
-from flask import Blueprint, request, jsonify, current_app
-from ..utils.exceptions import err 
-from ..utils.fetch import fetch_json, logger
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import json
+from flask import Blueprint, Response, request, current_app, stream_with_context
+from ..utils.aio import engine, fetch_json_async
+from ..utils.exceptions import ConnectionErrorUpstream, ErrorNotFound, err
+from ..utils.fetch import fetch_raw, logger
+from ..utils.helpers import is_empty_json, raw_success_response
 
 bp = Blueprint("emendas", __name__, url_prefix="/faif/transparencia")
 
+EMENDAS_URL = "https://api.portaldatransparencia.gov.br/api-de-dados/emendas"
+NDJSON_MIMETYPE = "application/x-ndjson"
 
-@bp.route("/emendas/<page>", methods=["GET"])
-def buscar_emendas_parlamentares(page: str):
-    """
-    Busca emendas parlamentares no Portal da Transparência, validando o parâmetro de página.
-    Uso: /faif/transparencia/emendas/<page>
-    Query params opcionais: codigoEmenda, numeroEmenda, nomeAutor, ano, tipoEmenda, codigoFuncao, codigoSubfuncao
-    """
-    try:
-        page_num = int(page)
-        if page_num < 1:
-            raise ValueError
-    except ValueError as exc:
-        raise err(
-            "Parâmetro 'page' deve ser inteiro >= 1.",
-            status_code=400,
-            error_code="INVALID_PAGE",
-            details={"page": page},
-        ) from exc
 
-    params: Dict[str, str] = {"pagina": str(page_num)}
+def _headers() -> Dict[str, str]:
+    return {
+        "Accept": "application/json",
+        "chave-api-dados": current_app.config["TOKEN_PORTAL"],
+        "User-Agent": "FAIFApi/1.0",
+    }
+
 
-    def _get_arg_str(name: str) -> Optional[str]:
-        v = request.args.get(name)
-        return v.strip() if v else None
+def _get_arg_str(name: str) -> Optional[str]:
+    v = request.args.get(name)
+    return v.strip() if v else None
 
+
+def _filtros() -> Dict[str, str]:
+    """Filtros do Portal vindos da query string (tudo menos a página)."""
+    params: Dict[str, str] = {}
     for p_name in ("codigoEmenda", "numeroEmenda", "nomeAutor", "tipoEmenda", "codigoFuncao", "codigoSubfuncao"):
         v = _get_arg_str(p_name)
         if v is not None:
@@ -49,24 +48,164 @@ def buscar_emendas_parlamentares(page: str):
 
     if "nomeAutor" in params:
         params["nomeAutor"] = params["nomeAutor"].upper()
+    return params
 
-    url = "https://api.portaldatransparencia.gov.br/api-de-dados/emendas"
-    headers = {
-        "Accept": "application/json",
-        "chave-api-dados": current_app.config["TOKEN_PORTAL"],
-        "User-Agent": "FAIFApi/1.0",
-    }
+
+def _int_arg(name: str, default: int, minimum: int = 1) -> int:
+    raw = _get_arg_str(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+        if value < minimum:
+            raise ValueError
+    except ValueError as exc:
+        raise err(
+            f"Parâmetro '{name}' deve ser inteiro >= {minimum}.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={name: raw},
+        ) from exc
+    return value
+
+
+@bp.route("/emendas/<page>", methods=["GET"])
+def buscar_emendas_parlamentares(page: str):
+    """
+    Busca emendas parlamentares no Portal da Transparência, validando o parâmetro de página.
+    Uso: /faif/transparencia/emendas/<page>
+    Query params opcionais: codigoEmenda, numeroEmenda, nomeAutor, ano, tipoEmenda, codigoFuncao, codigoSubfuncao
+    """
+    try:
+        page_num = int(page)
+        if page_num < 1:
+            raise ValueError
+    except ValueError as exc:
+        raise err(
+            "Parâmetro 'page' deve ser inteiro >= 1.",
+            status_code=400,
+            error_code="INVALID_PAGE",
+            details={"page": page},
+        ) from exc
+
+    params: Dict[str, str] = {"pagina": str(page_num), **_filtros()}
 
     logger.info("[FAIFApi] Emendas params=%s", params)
 
-    dados = fetch_json(
-        url,
-        headers=headers,
+    dados = fetch_raw(
+        EMENDAS_URL,
+        headers=_headers(),
         params=params,
         not_found_message="Nenhuma emenda encontrada.",
         not_found_error_code="EMENDA_NOT_FOUND",
+        cache_policy="emendas",
     )
     
-    logger.info("[FAIFApi] Resposta da API externa (emendas) -> %s", "OK" if dados else "EMPTY")
+    logger.info("[FAIFApi] Resposta da API externa (emendas) -> %s", "EMPTY" if is_empty_json(dados) else "OK")
+
+    return raw_success_response(b"[]" if is_empty_json(dados) else dados)
+
+def _fetch_page(filtros: Dict[str, str], headers: Dict[str, str], pagina: int) -> "Future[Any]":
+    """
+    Agenda a busca de uma página no motor assíncrono. Usa a política
+    "emendas_export" (TTL 0): uma exportação lê centenas de páginas que não
+    voltam a ser pedidas, e não deve expulsar do LRU nem gravar no L2.
+    """
+    return engine.submit(fetch_json_async(
+        EMENDAS_URL,
+        headers=headers,
+        params={"pagina": str(pagina), **filtros},
+        not_found_message="Nenhuma emenda encontrada.",
+        not_found_error_code="EMENDA_NOT_FOUND",
+        cache_policy="emendas_export",
+    ))
+
+
+def _page_items(future: "Future[Any]", timeout: float) -> List[Any]:
+    """Itens de uma página; página inexistente (404) conta como vazia."""
+    try:
+        dados = future.result(timeout)
+    except ErrorNotFound:
+        return []
+    except FutureTimeout as exc:
+        # a busca já saiu da fila de pendentes: ninguém mais a cancelaria
+        future.cancel()
+        raise ConnectionErrorUpstream("Tempo esgotado ao buscar página de emendas.", timeout=True) from exc
+    return dados if isinstance(dados, list) else []
+
+
+@bp.route("/emendas/export", methods=["GET"])
+def exportar_emendas_parlamentares():
+    """
+    Exporta todas as páginas de emendas que atendem aos filtros, como NDJSON
+    (uma emenda por linha), sem que o cliente precise paginar.
+    Uso: /faif/transparencia/emendas/export?ano=2023&nomeAutor=fulano
+    Query params opcionais: os mesmos filtros de /emendas/<page>, mais
+         inicio (página inicial, padrão 1) e paginas (máximo de páginas).
+    As próximas páginas são buscadas em paralelo (EMENDAS_EXPORT_PREFETCH por
+    vez) enquanto as anteriores são enviadas; a exportação para na primeira
+    página vazia. A memória usada não depende do número de páginas.
+    Se uma página falhar depois que o envio começou, a última linha é o
+    envelope de erro ({"ok": false, "error": ...}) com a página em "details".
+    """
+    config = current_app.config
+    filtros = _filtros()
+    inicio = _int_arg("inicio", 1)
+    max_paginas = int(config.get("EMENDAS_EXPORT_MAX_PAGES", 500))
+    paginas = min(_int_arg("paginas", max_paginas), max_paginas)
+    window = max(1, int(config.get("EMENDAS_EXPORT_PREFETCH", 4)))
+    timeout = float(config.get("EMENDAS_EXPORT_PAGE_TIMEOUT", 60))
+    headers = _headers()
+    fim = inicio + paginas
+
+    logger.info("[FAIFApi] Exportação de emendas filtros=%s páginas=%d..%d", filtros, inicio, fim - 1)
+
+    pending: Deque[Tuple[int, "Future[Any]"]] = deque()
+    proxima = inicio
+
+    def _fill() -> None:
+        nonlocal proxima
+        while len(pending) < window and proxima < fim:
+            pending.append((proxima, _fetch_page(filtros, headers, proxima)))
+            proxima += 1
+
+    _fill()
+    # a primeira página é esperada antes de responder, para que erros de
+    # validação/upstream saiam com o status HTTP certo
+    pagina, future = pending.popleft()
+    try:
+        primeira = _page_items(future, timeout)
+    except BaseException:
+        for _, f in pending:
+            f.cancel()
+        raise
+
+    def _lines() -> Iterator[bytes]:
+        total, enviadas = 0, 0
+        items, atual = primeira, pagina
+        try:
+            while items:
+                enviadas += 1
+                total += len(items)
+                for item in items:
+                    yield json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                _fill()
+                if not pending:
+                    break
+                atual, future = pending.popleft()
+                try:
+                    items = _page_items(future, timeout)
+                except err as exc:
+                    # cópia: a exceção pode ser compartilhada (single-flight) com outras exportações
+                    envelope = exc.to_dict()
+                    envelope["error"] = {**envelope["error"], "details": {"pagina": atual, "details": exc.details}}
+                    logger.warning("[FAIFApi] Exportação de emendas interrompida na página %d: %s", atual, exc)
+                    yield json.dumps(envelope, separators=(",", ":")).encode("utf-8") + b"\n"
+                    return
+        finally:
+            # cliente desconectou ou a exportação terminou: páginas adiantadas não são mais necessárias
+            for _, f in pending:
+                f.cancel()
+            logger.info("[FAIFApi] Exportação de emendas: %d emendas em %d páginas", total, enviadas)
 
-    return jsonify({"ok": True, "data": dados or []})
\ No newline at end of file
+    return Response(stream_with_context(_lines()), mimetype=NDJSON_MIMETYPE)
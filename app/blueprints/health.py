@@ -5,6 +5,23 @@ import platform
 import socket
 from datetime import datetime
 from flask import Blueprint, jsonify
+from ..utils.transport import transport
+from ..utils.cache import response_cache
+from ..utils.l2cache import l2_cache
+from ..utils.singleflight import upstream_flights
+from ..utils.breaker import breakers
+from ..utils.retry import retries
+from ..utils.ratelimit import rate_limiter
+from ..utils.aio import engine
+from ..utils.compression import response_compressor
+from ..utils.warmup import cache_warmer
+from ..utils.history_writer import history_writer
+from ..utils.history_partitions import history_partitions
+from ..utils.traffic_rollups import traffic_rollups
+from ..utils.request_logger import request_logger
+from ..utils.metrics import metrics
+from ..services.deputados_roster import deputados_roster
+from ..services.ibge_metadata import ibge_metadata
 
 bp = Blueprint("health", __name__)
 
@@ -39,7 +56,17 @@ def init_health(app, route="/health"):
                 "request_metrics": {
                     "total_requests": 10,
                     "failed_requests": 1,
-                    "avg_duration_ms": 123
+                    "avg_duration_ms": 123,
+                    "in_flight": 2,
+                    "scope": "all_processes"
+                },
+                "metrics": {
+                    "enabled": true,
+                    "directory": "/run/faif-metrics",
+                    "metrics": 6,
+                    "snapshots": 720,
+                    "snapshot_errors": 0,
+                    "retired_files": 4
                 },
                 "db": {
                     "path": "/path/to/historico.db",
@@ -50,6 +77,165 @@ def init_health(app, route="/health"):
                 "env": {
                     "TOKEN_PORTAL_present": true
                 },
+                "upstream_pools": {
+                    "brasilapi.com.br": {
+                        "maxsize": 20,
+                        "connections_created": 3,
+                        "in_use": 1,
+                        "idle": 2,
+                        "requests": 57
+                    }
+                },
+                "response_cache": {
+                    "entries": 120,
+                    "bytes": 524288,
+                    "hits": 900,
+                    "misses": 120,
+                    "evictions": 0,
+                    ...
+                },
+                "response_cache_l2": {
+                    "enabled": true,
+                    "available": true,
+                    "hits": 310,
+                    "misses": 45,
+                    "writes": 60,
+                    "errors": 0,
+                    "cleaned": 1200,
+                    "invalidations": 2,
+                    "notifies": 3
+                },
+                "upstream_singleflight": {
+                    "in_flight": 0,
+                    "executed": 1020,
+                    "coalesced": 37
+                },
+                "upstream_breakers": {
+                    "api.portaldatransparencia.gov.br": {
+                        "state": "open",
+                        "window_calls": 12,
+                        "window_failures": 2,
+                        "window_timeouts": 9,
+                        "times_opened": 1,
+                        "rejected": 40,
+                        "retry_after_seconds": 21.5
+                    }
+                },
+                "upstream_retries": {
+                    "brasilapi.com.br": {
+                        "attempts": 1040,
+                        "retries": 12,
+                        "hedges": 48,
+                        "hedge_wins": 31,
+                        "deadline_exceeded": 0,
+                        "hedge_delay_ms": 420.5
+                    }
+                },
+                "upstream_rate_limits": {
+                    "api.portaldatransparencia.gov.br": {
+                        "acquired": 500,
+                        "queued": 35,
+                        "wait_seconds": 12.4,
+                        "rejected": 2,
+                        "rate_per_credential": 1.5,
+                        "credentials": 2
+                    }
+                },
+                "async_engine": {
+                    "running": true,
+                    "submitted": 310,
+                    "in_flight": 4,
+                    "hosts": ["brasilapi.com.br"],
+                    "executed": 280,
+                    "coalesced": 30
+                },
+                "json_provider": {
+                    "provider": "orjson",
+                    "native_responses": 5120,
+                    "fallbacks": 3
+                },
+                "response_compression": {
+                    "compressed": 800,
+                    "from_cache": 650,
+                    "bytes_in": 52428800,
+                    "bytes_out": 6291456,
+                    "encodings": ["gzip"],
+                    "ratio": 0.12
+                },
+                "cache_warmup": {
+                    "enabled": true,
+                    "budget_per_minute": 60.0,
+                    "last_warmup": 1700000000.0,
+                    "warmed": 180,
+                    "refreshed": 42,
+                    "failed": 3,
+                    "waits_for_traffic": 0
+                },
+                "history_writer": {
+                    "enabled": true,
+                    "overflow": "drop",
+                    "queued": 12,
+                    "capacity": 10000,
+                    "last_error": null,
+                    "written": 48210,
+                    "batches": 3120,
+                    "dropped": 0,
+                    "failed": 0
+                },
+                "history_partitions": {
+                    "enabled": true,
+                    "retention_days": 90,
+                    "last_run": 1700000000.0,
+                    "runs": 24,
+                    "created": 8,
+                    "dropped": 1,
+                    "rollups_removed": 1440,
+                    "errors": 0
+                },
+                "request_logger": {
+                    "seen": 48230,
+                    "logged": 5012,
+                    "sampled_head": 4822,
+                    "sampled_error": 150,
+                    "sampled_slow": 40,
+                    "over_budget": 3,
+                    "failed": 0,
+                    "overhead_total_ms": 1832.551,
+                    "overhead_max_ms": 4.207,
+                    "enabled": true,
+                    "sample_rate": 0.1,
+                    "overhead_avg_us": 38.0
+                },
+                "traffic_rollups": {
+                    "enabled": true,
+                    "pending": 6,
+                    "last_error": null,
+                    "recorded": 48230,
+                    "flushes": 3120,
+                    "rows_upserted": 9400,
+                    "failed": 0
+                },
+                "deputados_roster": {
+                    "enabled": true,
+                    "loading": false,
+                    "loaded_at": 1700000000.0,
+                    "deputados": 513,
+                    "tokens": 1290,
+                    "refreshes": 4,
+                    "failures": 0,
+                    "searches": 950
+                },
+                "ibge_metadata": {
+                    "enabled": true,
+                    "loading": false,
+                    "loaded_at": 1700000000.0,
+                    "pesquisas": 310,
+                    "tokens": 2400,
+                    "bytes": 1900000,
+                    "refreshes": 4,
+                    "failures": 0,
+                    "searches": 120
+                },
                 "timestamp": "..."
             }
         """
@@ -57,11 +243,6 @@ def init_health(app, route="/health"):
         start = app.config.get("APP_START_TIME", now)
         uptime = now - start
 
-        total_requests = app.config.get("TOTAL_REQUESTS", 0)
-        failed_requests = app.config.get("FAILED_REQUESTS", 0)
-        total_duration = app.config.get("TOTAL_DURATION_MS", 0)
-        avg_duration = int(total_duration / total_requests) if total_requests > 0 else None
-
         payload = {
             "status": "ok",
             "uptime_seconds": round(uptime, 3),
@@ -71,12 +252,26 @@ def init_health(app, route="/health"):
             "platform": platform.platform(),
             "python_version": sys.version.splitlines()[0],
             "app_version": app.config.get("APP_VERSION"),
-            "request_metrics": {
-                "total_requests": total_requests,
-                "failed_requests": failed_requests,
-                "avg_duration_ms": avg_duration,
-            },
+            "request_metrics": metrics.request_summary(),
+            "metrics": metrics.stats(),
             "env": {"TOKEN_PORTAL_present": bool(os.getenv("TOKEN_PORTAL"))},
+            "upstream_pools": transport.stats(),
+            "response_cache": response_cache.stats(),
+            "response_cache_l2": l2_cache.stats(),
+            "upstream_singleflight": upstream_flights.stats(),
+            "upstream_breakers": breakers.stats(),
+            "upstream_retries": retries.stats(),
+            "upstream_rate_limits": rate_limiter.stats(),
+            "async_engine": engine.stats(),
+            "json_provider": app.json.stats(),
+            "response_compression": response_compressor.stats(),
+            "cache_warmup": cache_warmer.stats(),
+            "history_writer": history_writer.stats(),
+            "history_partitions": history_partitions.stats(),
+            "request_logger": request_logger.stats(),
+            "traffic_rollups": traffic_rollups.stats(),
+            "deputados_roster": deputados_roster.stats(),
+            "ibge_metadata": ibge_metadata.stats(),
             "timestamp": datetime.utcfromtimestamp(now).isoformat() + "Z",
         }
 
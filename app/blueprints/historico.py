@@ -1,32 +1,145 @@
-from flask import Blueprint, jsonify, request
-from ..history import listar_historico
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from flask import Blueprint, current_app, jsonify, request
+from ..history import consultar_agregados, listar_historico
 from ..utils.exceptions import err
+from ..utils.helpers import decode_cursor, encode_cursor, invalid_cursor
+from ..utils.traffic_rollups import GRANULARIDADES
 
 bp = Blueprint("historico", __name__, url_prefix="/faif/historico")
 
+
+def _parse_instante(name: str) -> Optional[datetime]:
+    """Data/hora ISO 8601 da query string; sem fuso, é tomada como UTC."""
+    raw = (request.args.get(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        value = datetime.fromisoformat(raw)
+    except ValueError:
+        raise err(
+            f"Parâmetro '{name}' deve ser uma data/hora ISO 8601.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={name: raw},
+        )
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 @bp.route("", methods=["GET"])
 def get_historico():
     """
-    Endpoint para listar o histórico de requisições.
+    Endpoint para listar o histórico de requisições, da mais recente para a mais antiga.
     Aceita um query param opcional `limit` para definir o número de resultados.
+    Filtros opcionais: `endpoint` (path exato), `desde` e `ate` (ISO 8601, intervalo [desde, ate)).
+    A resposta traz `cursor` quando há mais linhas; passe-o de volta (com os
+    mesmos filtros) para a página seguinte.
     Uso: GET /faif/historico
          GET /faif/historico?limit=10
+         GET /faif/historico?endpoint=/faif/cep/01001000&desde=2026-10-01T00:00:00Z&limit=100
+         GET /faif/historico?limit=100&cursor=...
     """
 
     limit_str = request.args.get('limit', '50')
+    max_limit = int(current_app.config.get("HISTORICO_MAX_LIMIT", 1000))
 
     try:
         limit_int = int(limit_str)
-        if limit_int <= 0:
+        if limit_int <= 0 or limit_int > max_limit:
             raise ValueError("O limite deve ser um número positivo.")
     except ValueError:
         raise err(
-            "Parâmetro 'limit' inválido. Deve ser um número inteiro positivo.",
+            f"Parâmetro 'limit' inválido. Deve ser um número inteiro entre 1 e {max_limit}.",
             status_code=400,
             error_code="INVALID_PARAM",
             details={"limit": limit_str}
         )
 
-    resultados = listar_historico(limit=limit_int)
+    endpoint = (request.args.get("endpoint") or "").strip() or None
+    desde, ate = _parse_instante("desde"), _parse_instante("ate")
+    filtros = [endpoint, request.args.get("desde"), request.args.get("ate")]
+
+    depois_de = None
+    cursor_raw = (request.args.get("cursor") or "").strip()
+    if cursor_raw:
+        state = decode_cursor(cursor_raw)
+        try:
+            if state["f"] != filtros:
+                raise ValueError
+            depois_de = (datetime.fromisoformat(state["t"]), int(state["i"]))
+        except (ValueError, TypeError, KeyError) as exc:
+            raise invalid_cursor(cursor_raw) from exc
+
+    resultados, proxima = listar_historico(
+        limit=limit_int, endpoint=endpoint, desde=desde, ate=ate, depois_de=depois_de
+    )
+    cursor = None
+    if proxima is not None:
+        cursor = encode_cursor({"t": proxima[0].isoformat(), "i": proxima[1], "f": filtros})
+
+    return jsonify({"ok": True, "data": resultados, "cursor": cursor})
+
+
+# Intervalo padrão de cada granularidade quando `desde` não é informado
+_JANELA_PADRAO = {"minuto": timedelta(hours=1), "hora": timedelta(days=1)}
+
+
+@bp.route("/agregados", methods=["GET"])
+def get_agregados():
+    """
+    Endpoint de tráfego e latência agregados por rota, lidos da tabela de
+    agregados (sem varrer o histórico): requisições, erros (5xx), erros do
+    cliente (4xx), bytes enviados e latência média, p50, p95 e p99.
+    Parâmetros opcionais: `granularidade` (minuto|hora, padrão hora), `rota`
+    (regra exata, ex. /faif/cep/<cep>), `desde` e `ate` (ISO 8601, intervalo
+    [desde, ate); padrão: a última hora por minuto, o último dia por hora) e
+    `resumo=1` para somar o intervalo todo em uma linha por rota.
+    Uso: GET /faif/historico/agregados
+         GET /faif/historico/agregados?granularidade=minuto&rota=/faif/cep/<cep>
+         GET /faif/historico/agregados?desde=2026-09-01T00:00:00Z&resumo=1
+    """
+    granularidade = (request.args.get("granularidade") or "hora").strip()
+    if granularidade not in GRANULARIDADES:
+        raise err(
+            "Parâmetro 'granularidade' deve ser 'minuto' ou 'hora'.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={"granularidade": granularidade},
+        )
+
+    ate = _parse_instante("ate") or datetime.now(timezone.utc)
+    desde = _parse_instante("desde")
+    if desde is None:
+        # alinhado ao início do período, para não cortar o primeiro pela metade
+        segundos = GRANULARIDADES[granularidade]
+        inicio = (ate - _JANELA_PADRAO[granularidade]).timestamp()
+        desde = datetime.fromtimestamp(inicio - inicio % segundos, tz=timezone.utc)
+    if desde >= ate:
+        raise err(
+            "Parâmetro 'desde' deve ser anterior a 'ate'.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={"desde": desde.isoformat(), "ate": ate.isoformat()},
+        )
+
+    resumo = request.args.get("resumo") == "1"
+    max_periodos = int(current_app.config.get("ROLLUPS_MAX_PERIODS", 10080))
+    periodos = (ate - desde).total_seconds() / GRANULARIDADES[granularidade]
+    if not resumo and periodos > max_periodos:
+        raise err(
+            f"Intervalo grande demais para a granularidade '{granularidade}' "
+            f"(máximo de {max_periodos} períodos); use 'hora' ou 'resumo=1'.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={"periodos": int(periodos)},
+        )
 
-    return jsonify({"ok": True, "data": resultados})
\ No newline at end of file
+    rota = (request.args.get("rota") or "").strip() or None
+    dados = consultar_agregados(granularidade, desde, ate, rota=rota, por_periodo=not resumo)
+    return jsonify({
+        "ok": True,
+        "granularidade": granularidade,
+        "desde": desde.isoformat(),
+        "ate": ate.isoformat(),
+        "data": dados,
+    })
@@ -1,7 +1,13 @@
 # app/blueprints/ibge.py
 
-from flask import Blueprint, request, jsonify
-from ..utils.fetch import fetch_json, logger
+import json
+from typing import Optional
+
+from flask import Blueprint, current_app, request
+from ..services.ibge_metadata import IBGE_PESQUISAS_URL, ibge_metadata
+from ..utils.exceptions import err
+from ..utils.fetch import fetch_json, fetch_raw, logger
+from ..utils.helpers import decode_cursor, encode_cursor, invalid_cursor, raw_success_response
 
 bp = Blueprint("ibge", __name__, url_prefix="/faif/ibge")
 
@@ -12,9 +18,72 @@ def buscar_ibge():
     filtra os resultados. Caso contrário, retorna a lista completa de pesquisas.
     Uso: GET /faif/ibge
          GET /faif/ibge?q=termo
+         GET /faif/ibge?q=termo&limit=20[&cursor=...]
+    A busca é feita localmente, numa cópia dos metadados recarregada
+    periodicamente, e os resultados vêm ordenados por relevância. Com 'limit'
+    (ou 'cursor'), a resposta é paginada: {"itens": [...], "total": n,
+    "cursor": "..." | null}; o cursor devolvido busca a página seguinte.
+    A cópia começa a carregar na primeira busca do processo; enquanto isso,
+    a resposta vem do IBGE, na ordem dele, com a mesma paginação.
     """
     termo = (request.args.get("q") or "").strip()
+    cursor_raw = (request.args.get("cursor") or "").strip()
+    limit_raw = (request.args.get("limit") or "").strip()
+
+    offset, limit = 0, None
+    if cursor_raw:
+        state = decode_cursor(cursor_raw)
+        try:
+            if state["q"] != termo:
+                raise ValueError
+            offset, limit = int(state["o"]), int(state["l"])
+        except (ValueError, TypeError, KeyError) as exc:
+            raise invalid_cursor(cursor_raw) from exc
+    if limit_raw:
+        max_limit = int(current_app.config.get("IBGE_INDEX_MAX_LIMIT", 100))
+        try:
+            limit = int(limit_raw)
+            if not 1 <= limit <= max_limit:
+                raise ValueError
+        except ValueError:
+            raise err(
+                f"Parâmetro 'limit' deve ser inteiro entre 1 e {max_limit}.",
+                status_code=400,
+                error_code="INVALID_PARAM",
+                details={"limit": limit_raw},
+            )
+
+    snapshot = ibge_metadata.current()
+    if snapshot is None:
+        return _buscar_ibge_upstream(termo, offset, limit)
+
+    if termo:
+        posicoes = ibge_metadata.search(snapshot, termo)
+        logger.info("[FAIFApi] IBGE busca local q=%s -> %d pesquisas", termo, len(posicoes))
+    else:
+        posicoes = range(len(snapshot))
+        logger.info("[FAIFApi] IBGE busca geral (sem termo, local)")
+
+    if limit is None:
+        return raw_success_response(snapshot.full if not termo else snapshot.join(posicoes))
+
+    pagina = posicoes[offset:offset + limit]
+    return raw_success_response(_pagina(termo, offset, limit, len(posicoes), snapshot.join(pagina), len(pagina)))
+
+
+def _pagina(termo: str, offset: int, limit: int, total: int, itens: bytes, quantos: int) -> bytes:
+    """Corpo de uma página ({"itens", "total", "cursor"}) com os itens já serializados."""
+    fim = offset + quantos
+    cursor = encode_cursor({"q": termo, "o": fim, "l": limit}) if fim < total else None
+    return b"".join((
+        b'{"itens":', itens,
+        b',"total":', str(total).encode("ascii"),
+        b',"cursor":', json.dumps(cursor).encode("ascii"), b"}",
+    ))
+
 
+def _buscar_ibge_upstream(termo: str, offset: int = 0, limit: Optional[int] = None):
+    """Consulta direta ao IBGE, usada enquanto a cópia local não está disponível."""
     params = {}
 
     if termo:
@@ -23,14 +92,27 @@ def buscar_ibge():
     else:
         logger.info("[FAIFApi] IBGE busca geral (sem termo)")
 
-    url = "https://servicodados.ibge.gov.br/api/v2/metadados/Pesquisa"
+    if limit is not None:
+        dados = fetch_json(
+            IBGE_PESQUISAS_URL,
+            params=params,
+            headers={"Accept": "application/json"},
+            not_found_message="Nenhum resultado encontrado no IBGE.",
+            not_found_error_code="IBGE_NOT_FOUND",
+            cache_policy="ibge",
+        )
+        itens = dados if isinstance(dados, list) else []
+        pagina = itens[offset:offset + limit]
+        corpo = json.dumps(pagina, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return raw_success_response(_pagina(termo, offset, limit, len(itens), corpo, len(pagina)))
 
-    dados = fetch_json(
-        url,
+    dados = fetch_raw(
+        IBGE_PESQUISAS_URL,
         params=params,
         headers={"Accept": "application/json"},
         not_found_message="Nenhum resultado encontrado no IBGE.",
         not_found_error_code="IBGE_NOT_FOUND",
+        cache_policy="ibge",
     )
 
-    return jsonify({"ok": True, "data": dados})
\ No newline at end of file
+    return raw_success_response(dados)
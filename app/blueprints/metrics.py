@@ -0,0 +1,15 @@
+from flask import Blueprint, Response
+from ..utils.metrics import CONTENT_TYPE, metrics
+
+bp = Blueprint("metrics", __name__)
+
+
+@bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Métricas no formato texto do Prometheus: requisições e latência por rota,
+    requisições em andamento, latência e status dos upstreams por host e
+    consultas ao cache. Com METRICS_DIR, soma todos os workers da máquina.
+    Uso: GET /metrics
+    """
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
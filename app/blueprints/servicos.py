@@ -1,6 +1,6 @@
 from flask import Blueprint
-from ..utils.fetch import fetch_json, logger
-from ..utils.helpers import success_response
+from ..utils.fetch import fetch_raw, logger
+from ..utils.helpers import is_empty_json, raw_success_response
 
 bp = Blueprint("servicos", __name__, url_prefix="/faif/servicos")
 
@@ -12,13 +12,14 @@ def consultar_servicos_orgao(cod: str):
     Uso: /faif/servicos/orgao/<cod>
     """
     url = f"https://www.servicos.gov.br/api/v1/orgao/{cod}"
-    dados = fetch_json(
+    dados = fetch_raw(
         url,
         not_found_message="Código SIORG não encontrado.",
         not_found_error_code="SIORG_NOT_FOUND",
+        cache_policy="servicos",
     )
-    logger.info("[FAIFApi] consultar_servicos_orgao cod=%s -> %s", cod, "OK" if dados else "EMPTY")
-    return success_response(dados)
+    logger.info("[FAIFApi] consultar_servicos_orgao cod=%s -> %s", cod, "EMPTY" if is_empty_json(dados) else "OK")
+    return raw_success_response(dados)
 
 
 @bp.route("/servico/<cod>", methods=["GET"])
@@ -28,10 +29,11 @@ def consultar_servicos_servico(cod: str):
     Uso: /faif/servicos/servico/<cod>
     """
     url = f"https://www.servicos.gov.br/api/v1/servicos/{cod}"
-    dados = fetch_json(
+    dados = fetch_raw(
         url,
         not_found_message="Código do serviço não encontrado.",
         not_found_error_code="SERVICO_NOT_FOUND",
+        cache_policy="servicos",
     )
-    logger.info("[FAIFApi] consultar_servicos_servico cod=%s -> %s", cod, "OK" if dados else "EMPTY")
-    return success_response(dados)
+    logger.info("[FAIFApi] consultar_servicos_servico cod=%s -> %s", cod, "EMPTY" if is_empty_json(dados) else "OK")
+    return raw_success_response(dados)
@@ -1,11 +1,23 @@
-from typing import Dict
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
 from flask import Blueprint, request, current_app
+from ..utils.aio import engine, fetch_json_async
 from ..utils.fetch import fetch_json, logger
-from ..utils.helpers import success_response
+from ..utils.helpers import decode_cursor, encode_cursor, invalid_cursor, success_response
 from ..utils.exceptions import ErrorNotFound, err
 
 bp = Blueprint("servidores", __name__, url_prefix="/faif/transparencia")
 
+PESSOAS_FISICAS_URL = "https://api.portaldatransparencia.gov.br/api-de-dados/pessoas-fisicas"
+
+
+def _is_servidor(p: Any) -> bool:
+    if not isinstance(p, dict):
+        return False
+    vinculo = (p.get("vinculo") or "")
+    return isinstance(vinculo, str) and "servidor" in vinculo.lower()
+
 
 @bp.route("/servidores", methods=["GET"])
 def buscar_servidores():
@@ -39,26 +51,23 @@ def buscar_servidores():
 
     params: Dict[str, str] = {"nome": nome, "pagina": str(pagina_int)}
 
-    url = "https://api.portaldatransparencia.gov.br/api-de-dados/pessoas-fisicas"
     headers = {"Accept": "application/json", "chave-api-dados": current_app.config["TOKEN_PORTAL"]}
 
+    if request.args.get("varredura") in ("1", "true") or request.args.get("cursor"):
+        return _buscar_servidores_varredura(nome, pagina_int, headers)
+
     logger.info("[FAIFApi] buscar_servidores nome=%s pagina=%s", nome, pagina_int)
 
     dados = fetch_json(
-        url,
+        PESSOAS_FISICAS_URL,
         headers=headers,
         params=params,
         not_found_message="Nenhuma pessoa encontrada no Portal da Transparência.",
         not_found_error_code="PESSOA_FISICA_NOT_FOUND",
+        cache_policy="servidores",
     )
 
-    servidores = []
-    if isinstance(dados, list):
-        for p in dados:
-            if isinstance(p, dict):
-                vinculo = (p.get("vinculo") or "")
-                if isinstance(vinculo, str) and "servidor" in vinculo.lower():
-                    servidores.append(p)
+    servidores = [p for p in dados if _is_servidor(p)] if isinstance(dados, list) else []
 
     if not servidores:
         raise ErrorNotFound(
@@ -68,3 +77,155 @@ def buscar_servidores():
         )
 
     return success_response(servidores)
+
+
+
+# ---------------------------------------------------------------------------
+# Modo varredura: várias páginas por chamada, com cursor de continuação
+# ---------------------------------------------------------------------------
+
+def _decode_cursor(cursor: str, nome: str) -> Tuple[int, int]:
+    """(página, posição na página) onde a varredura anterior parou."""
+    state = decode_cursor(cursor)
+    try:
+        pagina, offset = int(state["p"]), int(state["o"])
+        if state["n"] != nome or pagina < 1 or offset < 0:
+            raise ValueError
+    except (ValueError, TypeError, KeyError) as exc:
+        raise invalid_cursor(cursor) from exc
+    return pagina, offset
+
+
+async def _varrer(
+    nome: str,
+    headers: Dict[str, str],
+    pagina: int,
+    offset: int,
+    quantidade: int,
+    max_paginas: int,
+    concorrencia: int,
+    prazo: float,
+) -> Tuple[List[Any], Optional[Tuple[int, int]], str, int]:
+    """
+    Lê páginas de pessoas físicas a partir de (pagina, offset), até
+    `concorrencia` por vez e sempre consumidas em ordem, até juntar
+    `quantidade` servidores, achar uma página vazia ou esgotar o orçamento
+    de páginas/tempo. Devolve (servidores, onde continuar, motivo da parada,
+    páginas lidas).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + prazo
+    limite = pagina + max_paginas
+    proxima = pagina
+    pending: Deque[Tuple[int, "asyncio.Future[Any]"]] = deque()
+
+    def _fill() -> None:
+        nonlocal proxima
+        while len(pending) < concorrencia and proxima < limite:
+            pending.append((proxima, asyncio.ensure_future(fetch_json_async(
+                PESSOAS_FISICAS_URL,
+                headers=headers,
+                params={"nome": nome, "pagina": str(proxima)},
+                not_found_message="Nenhuma pessoa encontrada no Portal da Transparência.",
+                not_found_error_code="PESSOA_FISICA_NOT_FOUND",
+                cache_policy="servidores",
+            ))))
+            proxima += 1
+
+    servidores: List[Any] = []
+    lidas = 0
+    try:
+        _fill()
+        while pending:
+            atual, task = pending.popleft()
+            restante = deadline - loop.time()
+            try:
+                if restante <= 0:
+                    raise asyncio.TimeoutError
+                dados = await asyncio.wait_for(task, restante)
+            except asyncio.TimeoutError:
+                return servidores, (atual, offset), "tempo", lidas
+            except ErrorNotFound:
+                dados = []
+            except err as exc:
+                if lidas == 0:
+                    raise
+                logger.warning("[FAIFApi] varredura de servidores parou na página %d: %s", atual, exc)
+                return servidores, (atual, offset), "erro", lidas
+            lidas += 1
+            if not isinstance(dados, list) or not dados:
+                return servidores, None, "fim", lidas
+            for index in range(offset, len(dados)):
+                if _is_servidor(dados[index]):
+                    servidores.append(dados[index])
+                    if len(servidores) >= quantidade:
+                        cursor = (atual, index + 1) if index + 1 < len(dados) else (atual + 1, 0)
+                        return servidores, cursor, "quantidade", lidas
+            offset = 0
+            _fill()
+        return servidores, (proxima, 0), "paginas", lidas
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def _buscar_servidores_varredura(nome: str, pagina: int, headers: Dict[str, str]):
+    """
+    Modo varredura de /faif/transparencia/servidores (?varredura=1 ou ?cursor=...).
+    Query params opcionais: quantidade (servidores desejados), cursor (devolvido
+    pela chamada anterior; tem prioridade sobre 'pagina').
+    Resposta: {"servidores": [...], "cursor": "..." | null, "motivo": "quantidade" |
+    "fim" | "paginas" | "tempo" | "erro", "paginas_lidas": n}. Com cursor null não
+    há mais páginas; senão, a próxima chamada com ?cursor= continua de onde esta
+    parou, sem reler as páginas já vistas.
+    """
+    config = current_app.config
+    offset = 0
+    cursor_raw = (request.args.get("cursor") or "").strip()
+    if cursor_raw:
+        pagina, offset = _decode_cursor(cursor_raw, nome)
+
+    max_resultados = int(config.get("SERVIDORES_SCAN_MAX_RESULTS", 100))
+    quantidade_raw = request.args.get("quantidade", "").strip() or str(min(10, max_resultados))
+    try:
+        quantidade = int(quantidade_raw)
+        if not 1 <= quantidade <= max_resultados:
+            raise ValueError
+    except ValueError:
+        raise err(
+            f"Parâmetro 'quantidade' deve ser inteiro entre 1 e {max_resultados}.",
+            status_code=400,
+            error_code="INVALID_PARAM",
+            details={"quantidade": quantidade_raw},
+        )
+
+    prazo = float(config.get("SERVIDORES_SCAN_TIME_BUDGET", 10))
+    servidores, continuar, motivo, lidas = engine.run(_varrer(
+        nome,
+        headers,
+        pagina,
+        offset,
+        quantidade,
+        int(config.get("SERVIDORES_SCAN_MAX_PAGES", 20)),
+        max(1, int(config.get("SERVIDORES_SCAN_CONCURRENCY", 4))),
+        prazo,
+    ), timeout=prazo + 5)
+
+    logger.info(
+        "[FAIFApi] varredura de servidores nome=%s pagina=%s: %d servidores em %d páginas (%s)",
+        nome, pagina, len(servidores), lidas, motivo,
+    )
+
+    if not servidores and continuar is None:
+        raise ErrorNotFound(
+            "Nenhum servidor encontrado para este nome.",
+            error_code="SERVIDOR_NOT_FOUND",
+            details=f"nome={nome}",
+        )
+
+    return success_response({
+        "servidores": servidores,
+        "cursor": encode_cursor({"n": nome, "p": continuar[0], "o": continuar[1]}) if continuar is not None else None,
+        "motivo": motivo,
+        "paginas_lidas": lidas,
+    })
@@ -1,13 +1,30 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
 from flask import request
-from sqlalchemy import select 
+from sqlalchemy import func, select, tuple_
 
 from .extensions import db
-from .models import Historico
+from .models import Historico, HistoricoRollup
+from .utils.history_writer import history_writer
+from .utils.traffic_rollups import COUNTER_COLUMNS, summarize, traffic_rollups
 
 def salvar_historico(endpoint: str, parametros: dict):
     """
     Salva informações de uma requisição usando o modelo Historico.
+    Com HISTORY_ASYNC (padrão), a linha vai para a fila do `history_writer` e é
+    gravada em lote fora da requisição; a hora é a da requisição, não a da
+    gravação.
     """
+    if history_writer.enabled:
+        history_writer.submit({
+            "endpoint": endpoint,
+            "parametros": parametros,
+            "ip_cliente": request.remote_addr,
+            "data_hora": datetime.now(timezone.utc),
+        })
+        return
+
     novo_registro = Historico(
         endpoint=endpoint,
         parametros=parametros,
@@ -17,11 +34,94 @@ def salvar_historico(endpoint: str, parametros: dict):
     db.session.add(novo_registro)
     db.session.commit()
 
-def listar_historico(limit: int = 50):
+def registrar_trafego(rota: Optional[str], status_code: int, duration_ms: float, bytes_out: Optional[int]):
+    """
+    Soma a requisição nos agregados de tráfego (`traffic_rollups`), pela regra
+    da rota. Vale para toda requisição registrada, mesmo as que não viram
+    linha do histórico (amostragem do request_logger ou fila cheia). Com
+    HISTORY_ASYNC os agregados vão para o banco junto com os lotes do
+    `history_writer`; sem, são gravados aqui.
+    """
+    traffic_rollups.record(rota, datetime.now(timezone.utc), status_code, duration_ms, bytes_out)
+    if history_writer.enabled:
+        history_writer.ensure_started()
+        return
+    with db.engine.begin() as conn:
+        traffic_rollups.flush(conn)
+
+def listar_historico(
+    limit: int = 50,
+    *,
+    endpoint: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+    depois_de: Optional[Tuple[datetime, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[datetime, int]]]:
     """
-    Retorna as últimas N requisições usando a sintaxe de consulta moderna do SQLAlchemy.
+    Retorna as últimas N requisições, da mais recente para a mais antiga,
+    opcionalmente filtradas por endpoint e intervalo [desde, ate).
+
+    A paginação é por chave (keyset): `depois_de` é o (data_hora, id) da última
+    linha da página anterior, e a consulta continua a partir dela usando o
+    índice (data_hora, id), sem OFFSET; o custo de cada página não cresce com
+    a distância do início. Devolve as linhas e a chave para a próxima página
+    (None quando não há mais).
     """
+    stmt = select(Historico)
+    if endpoint:
+        stmt = stmt.where(Historico.endpoint == endpoint)
+    if desde is not None:
+        stmt = stmt.where(Historico.data_hora >= desde)
+    if ate is not None:
+        stmt = stmt.where(Historico.data_hora < ate)
+    if depois_de is not None:
+        stmt = stmt.where(tuple_(Historico.data_hora, Historico.id) < tuple_(*depois_de))
+    stmt = stmt.order_by(Historico.data_hora.desc(), Historico.id.desc()).limit(limit)
 
-    stmt = select(Historico).order_by(Historico.data_hora.desc()).limit(limit)
     registros = db.session.execute(stmt).scalars().all()
-    return [registro.to_dict() for registro in registros]
\ No newline at end of file
+    proxima = (registros[-1].data_hora, registros[-1].id) if len(registros) == limit else None
+    return [registro.to_dict() for registro in registros], proxima
+
+def consultar_agregados(
+    granularidade: str,
+    desde: datetime,
+    ate: datetime,
+    *,
+    rota: Optional[str] = None,
+    por_periodo: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Lê os agregados de tráfego de [desde, ate) na granularidade pedida
+    ("minuto" ou "hora"), opcionalmente de uma só rota. Com `por_periodo`,
+    devolve uma linha por (início, rota); sem, soma o intervalo todo e devolve
+    uma linha por rota, da mais para a menos acessada. Os percentis são
+    calculados dos histogramas somados.
+    """
+    table = HistoricoRollup.__table__
+    somas = [func.sum(table.c[c]).label(c) for c in COUNTER_COLUMNS]
+    chaves = [table.c.inicio, table.c.rota] if por_periodo else [table.c.rota]
+
+    stmt = select(*chaves, *somas).where(
+        table.c.granularidade == granularidade,
+        table.c.inicio >= desde,
+        table.c.inicio < ate,
+    )
+    if rota:
+        stmt = stmt.where(table.c.rota == rota)
+    stmt = stmt.group_by(*chaves)
+    if por_periodo:
+        stmt = stmt.order_by(table.c.inicio, table.c.rota)
+    else:
+        stmt = stmt.order_by(func.sum(table.c.requisicoes).desc(), table.c.rota)
+
+    resultados = []
+    for row in db.session.execute(stmt).mappings():
+        item: Dict[str, Any] = {"rota": row["rota"]}
+        if por_periodo:
+            inicio = row["inicio"]
+            if inicio.tzinfo is None:
+                inicio = inicio.replace(tzinfo=timezone.utc)
+            item["inicio"] = inicio.isoformat()
+        item.update(summarize(row))
+        resultados.append(item)
+    return resultados
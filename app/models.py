@@ -5,12 +5,18 @@ class Historico(db.Model):
     Representa um registro de uma requisição feita à API.
     """
     __tablename__ = 'historico'
+    # No PostgreSQL a tabela é particionada por dia em data_hora e a chave
+    # primária é (id, data_hora); ver a migration 5b1e9d04a3c2.
+    __table_args__ = (
+        db.Index('ix_historico_data_hora_id', 'data_hora', 'id'),
+        db.Index('ix_historico_endpoint_data_hora_id', 'endpoint', 'data_hora', 'id'),
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
     endpoint = db.Column(db.String(255), nullable=False)
     parametros = db.Column(db.JSON)
     ip_cliente = db.Column(db.String(45))
-    data_hora = db.Column(db.DateTime, server_default=db.func.now())
+    data_hora = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
 
     def to_dict(self):
         """Converte o objeto para um dicionário, útil para respostas JSON."""
@@ -20,4 +26,54 @@ class Historico(db.Model):
             'parametros': self.parametros,
             'ip_cliente': self.ip_cliente,
             'data_hora': self.data_hora.isoformat() if self.data_hora else None
-        }
\ No newline at end of file
+        }
+
+class UpstreamCache(db.Model):
+    """
+    Segundo nível do cache de respostas dos upstreams, compartilhado entre os
+    processos e máquinas que usam o mesmo banco. O corpo é guardado em bytes,
+    exatamente como veio do upstream (pronto para repassar).
+    """
+    __tablename__ = 'upstream_cache'
+
+    key_hash = db.Column(db.String(64), primary_key=True)   # sha256 da chave
+    key = db.Column(db.Text, nullable=False)
+    body = db.Column(db.LargeBinary, nullable=False)
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    stored_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    retain_until = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+class HistoricoRollup(db.Model):
+    """
+    Agregado de tráfego e latência de uma rota em um minuto ou uma hora,
+    mantido por `traffic_rollups` (app/utils/traffic_rollups.py). As colunas
+    lat_le_N contam as requisições que levaram até N ms (lat_le_inf, o resto);
+    somadas entre linhas, dão os percentis de qualquer intervalo.
+    """
+    __tablename__ = 'historico_rollup'
+    __table_args__ = (
+        db.Index('ix_historico_rollup_granularidade_inicio', 'granularidade', 'inicio'),
+    )
+
+    granularidade = db.Column(db.String(8), primary_key=True)     # "minuto" ou "hora"
+    rota = db.Column(db.String(255), primary_key=True)            # regra do Flask, ex. /faif/cep/<cep>
+    inicio = db.Column(db.DateTime(timezone=True), primary_key=True)
+    requisicoes = db.Column(db.BigInteger, nullable=False, default=0)
+    erros = db.Column(db.BigInteger, nullable=False, default=0)             # status >= 500
+    erros_cliente = db.Column(db.BigInteger, nullable=False, default=0)     # status 4xx
+    bytes_out = db.Column(db.BigInteger, nullable=False, default=0)
+    duracao_total_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_5 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_10 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_25 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_50 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_100 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_250 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_500 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_1000 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_2500 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_5000 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_10000 = db.Column(db.BigInteger, nullable=False, default=0)
+    lat_le_inf = db.Column(db.BigInteger, nullable=False, default=0)
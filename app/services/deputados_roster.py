@@ -0,0 +1,119 @@
+from bisect import bisect_left
+from difflib import get_close_matches
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from ..utils.exceptions import err
+from ..utils.fetch import fetch_json
+from .normalizers import normalize_deputados_list
+from .snapshot import PeriodicSnapshot
+from .textsearch import fold, tokenize
+
+# ---------------------------------------------------------------------------
+# Lista local dos deputados em exercício, com índice de busca por nome
+# ---------------------------------------------------------------------------
+
+DEPUTADOS_URL = "https://dadosabertos.camara.leg.br/api/v2/deputados"
+
+# A API da Câmara devolve no máximo 100 itens por página
+ROSTER_PAGE_SIZE = 100
+ROSTER_MAX_PAGES = 20
+
+
+class RosterIndex:
+    """
+    Fotografia imutável da lista: os deputados já normalizados (mesmo formato
+    de `normalize_deputados_list`, em ordem de nome) e um índice dos tokens
+    dos nomes, ordenado para busca por prefixo com bisect.
+    """
+
+    __slots__ = ("deputados", "tokens", "postings")
+
+    def __init__(self, deputados: List[Dict[str, Any]]) -> None:
+        self.deputados = tuple(sorted(deputados, key=lambda d: fold(d.get("nome") or "")))
+        postings: Dict[str, set] = {}
+        for position, deputado in enumerate(self.deputados):
+            for token in tokenize(deputado.get("nome") or ""):
+                postings.setdefault(token, set()).add(position)
+        self.postings: Dict[str, FrozenSet[int]] = {t: frozenset(p) for t, p in postings.items()}
+        self.tokens: Tuple[str, ...] = tuple(sorted(self.postings))
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        tokens = self.tokens
+        start = bisect_left(tokens, prefix)
+        end = start
+        while end < len(tokens) and tokens[end].startswith(prefix):
+            end += 1
+        return list(tokens[start:end])
+
+    def search(self, query: str, *, fuzzy: bool = False) -> List[Dict[str, Any]]:
+        """
+        Deputados cujo nome tem, para cada palavra da busca, um token que começa
+        com ela (sem diferenciar acentos e maiúsculas). Com `fuzzy`, palavras
+        sem correspondência por prefixo aceitam tokens parecidos (erros de
+        digitação).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        matches: Optional[FrozenSet[int]] = None
+        for term in terms:
+            tokens = self._prefixed(term)
+            if not tokens and fuzzy:
+                tokens = get_close_matches(term, self.tokens, n=5, cutoff=0.75)
+            found = frozenset().union(*(self.postings[t] for t in tokens))
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return [self.deputados[i] for i in sorted(matches)]
+
+
+class DeputadosRoster(PeriodicSnapshot[RosterIndex]):
+    """
+    Mantém em memória a lista dos deputados em exercício, para que a busca por
+    nome não precise ir à API da Câmara. Recarregada a cada
+    DEPUTADOS_ROSTER_REFRESH segundos (ver `PeriodicSnapshot`); sem a lista,
+    `search` devolve None e a rota consulta a API como antes.
+    """
+
+    label = "lista de deputados"
+    config_prefix = "DEPUTADOS_ROSTER"
+
+    def init_app(self, app) -> None:
+        super().init_app(app)
+        self._stats["searches"] = 0
+        app.extensions["faif_deputados_roster"] = self
+
+    def build(self) -> RosterIndex:
+        """Baixa todas as páginas da lista de deputados em exercício e indexa."""
+        deputados: List[Dict[str, Any]] = []
+        for pagina in range(1, ROSTER_MAX_PAGES + 1):
+            dados = fetch_json(
+                DEPUTADOS_URL,
+                headers={"Accept": "application/json"},
+                params={"itens": str(ROSTER_PAGE_SIZE), "pagina": str(pagina), "ordem": "ASC", "ordenarPor": "nome"},
+                not_found_message="Lista de deputados indisponível.",
+                not_found_error_code="DEPUTADOS_ROSTER_NOT_FOUND",
+            )
+            page = normalize_deputados_list(dados)
+            deputados.extend(page)
+            links = dados.get("links") if isinstance(dados, dict) else None
+            has_next = any(isinstance(link, dict) and link.get("rel") == "next" for link in links or ())
+            if not has_next or len(page) < ROSTER_PAGE_SIZE:
+                break
+        if not deputados:
+            raise err("Lista de deputados veio vazia.", status_code=502, error_code="DEPUTADOS_ROSTER_EMPTY")
+        return RosterIndex(deputados)
+
+    def describe(self, snapshot: RosterIndex) -> Dict[str, Any]:
+        return {"deputados": len(snapshot.deputados), "tokens": len(snapshot.tokens)}
+
+    def search(self, nome: str, *, fuzzy: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Deputados cujo nome corresponde à busca, ou None se a lista não está disponível."""
+        index = self.current()
+        if index is None:
+            return None
+        self._stats["searches"] += 1
+        return index.search(nome, fuzzy=fuzzy)
+
+
+deputados_roster = DeputadosRoster()
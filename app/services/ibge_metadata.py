@@ -0,0 +1,131 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence, Tuple
+import json
+import math
+
+from ..utils.exceptions import err
+from ..utils.fetch import fetch_json
+from .snapshot import PeriodicSnapshot
+from .textsearch import tokenize
+
+# ---------------------------------------------------------------------------
+# Metadados das pesquisas do IBGE em memória, com índice invertido
+# ---------------------------------------------------------------------------
+
+IBGE_PESQUISAS_URL = "https://servicodados.ibge.gov.br/api/v2/metadados/Pesquisa"
+
+# Campos indexados e seus pesos: palavras do título valem mais que as da descrição
+TITLE_FIELDS = ("nome", "titulo", "sigla", "codigo")
+TEXT_FIELDS = ("descricao", "observacao", "objetivo", "assunto")
+TITLE_WEIGHT = 3.0
+TEXT_WEIGHT = 1.0
+
+# Palavra da busca que é só prefixo de um token (ex.: "domic" -> "domicilios")
+PREFIX_WEIGHT = 0.5
+
+
+class MetadataIndex:
+    """
+    Fotografia imutável dos metadados: cada pesquisa já serializada em bytes
+    (as respostas só juntam os pedaços), a lista inteira pronta e um índice
+    invertido token -> {posição: peso}, com os tokens ordenados para busca
+    por prefixo.
+    """
+
+    __slots__ = ("encoded", "full", "postings", "tokens", "idf")
+
+    def __init__(self, items: Sequence[Any]) -> None:
+        self.encoded: Tuple[bytes, ...] = tuple(
+            json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for item in items
+        )
+        self.full = b"[" + b",".join(self.encoded) + b"]"
+        postings: Dict[str, Dict[int, float]] = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            for fields, weight in ((TITLE_FIELDS, TITLE_WEIGHT), (TEXT_FIELDS, TEXT_WEIGHT)):
+                for field in fields:
+                    value = item.get(field)
+                    if not isinstance(value, (str, int)):
+                        continue
+                    for token in tokenize(str(value)):
+                        weights = postings.setdefault(token, {})
+                        weights[position] = weights.get(position, 0.0) + weight
+        self.postings = postings
+        self.tokens: Tuple[str, ...] = tuple(sorted(postings))
+        total = len(items)
+        self.idf = {token: math.log(1 + total / len(weights)) for token, weights in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.encoded)
+
+    def _expand(self, term: str) -> List[str]:
+        """Tokens do índice que começam com `term` (o próprio, se existir, incluído)."""
+        tokens = self.tokens
+        start = bisect_left(tokens, term)
+        end = start
+        while end < len(tokens) and tokens[end].startswith(term):
+            end += 1
+        return list(tokens[start:end])
+
+    def search(self, query: str) -> List[int]:
+        """
+        Posições das pesquisas que contêm alguma palavra da busca, mais
+        relevantes primeiro: primeiro as que casam com mais palavras; entre
+        elas, maior soma de peso do campo x raridade do token (idf), com
+        correspondência só por prefixo valendo metade.
+        """
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in dict.fromkeys(tokenize(query)):
+            best: Dict[int, float] = {}
+            for token in self._expand(term):
+                factor = self.idf[token] * (1.0 if token == term else PREFIX_WEIGHT)
+                for position, weight in self.postings[token].items():
+                    best[position] = max(best.get(position, 0.0), weight * factor)
+            for position, score in best.items():
+                scores[position] = scores.get(position, 0.0) + score
+                matched[position] = matched.get(position, 0) + 1
+        return sorted(scores, key=lambda p: (-matched[p], -scores[p], p))
+
+    def join(self, positions: Sequence[int]) -> bytes:
+        """Lista JSON com as pesquisas das posições, sem reserializar."""
+        encoded = self.encoded
+        return b"[" + b",".join(encoded[p] for p in positions) + b"]"
+
+
+class IbgeMetadata(PeriodicSnapshot[MetadataIndex]):
+    """
+    Mantém em memória a lista de pesquisas do IBGE, recarregada a cada
+    IBGE_INDEX_REFRESH segundos (ver `PeriodicSnapshot`), para que buscas e
+    páginas sejam respondidas sem ir ao upstream nem reserializar a lista.
+    """
+
+    label = "metadados do IBGE"
+    config_prefix = "IBGE_INDEX"
+
+    def init_app(self, app) -> None:
+        super().init_app(app)
+        self._stats["searches"] = 0
+        app.extensions["faif_ibge_metadata"] = self
+
+    def build(self) -> MetadataIndex:
+        dados = fetch_json(
+            IBGE_PESQUISAS_URL,
+            headers={"Accept": "application/json"},
+            not_found_message="Metadados do IBGE indisponíveis.",
+            not_found_error_code="IBGE_NOT_FOUND",
+        )
+        if not isinstance(dados, list) or not dados:
+            raise err("Metadados do IBGE vieram vazios.", status_code=502, error_code="IBGE_INDEX_EMPTY")
+        return MetadataIndex(dados)
+
+    def describe(self, snapshot: MetadataIndex) -> Dict[str, Any]:
+        return {"pesquisas": len(snapshot), "tokens": len(snapshot.tokens), "bytes": len(snapshot.full)}
+
+    def search(self, snapshot: MetadataIndex, query: str) -> List[int]:
+        self._stats["searches"] += 1
+        return snapshot.search(query)
+
+
+ibge_metadata = IbgeMetadata()
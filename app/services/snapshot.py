@@ -0,0 +1,139 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Generic, Optional, TypeVar
+import logging
+import os
+import threading
+import time
+
+from ..utils.exceptions import err
+
+# ---------------------------------------------------------------------------
+# Fotografias locais de dados dos upstreams, recarregadas periodicamente
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PeriodicSnapshot(ABC, Generic[T]):
+    """
+    Base para dados de upstream mantidos em memória e servidos localmente.
+
+    A carga roda numa thread por processo, que sobe na primeira chamada a
+    `current()` (não no `init_app`, para que comandos da CLI, como
+    `flask db upgrade`, não baixem nada): ela monta a primeira fotografia
+    logo de início e depois a recarrega a cada `<config_prefix>_REFRESH`
+    segundos.
+    `current()` nunca espera por ela: enquanto não houver fotografia devolve
+    None e a rota responde pelo upstream. Cada recarga monta um objeto novo
+    com `build()` e só então troca a referência, então quem lê nunca vê uma
+    fotografia pela metade. Se a recarga falhar, a anterior continua valendo;
+    se a primeira carga falhar, ela é tentada de novo a cada
+    `<config_prefix>_RETRY_AFTER` segundos.
+    """
+
+    #: nome usado nos logs
+    label = "fotografia"
+    #: prefixo das chaves de configuração (ENABLED, REFRESH, RETRY_AFTER)
+    config_prefix = ""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.refresh_interval = 6 * 3600.0
+        self.retry_after = 60.0
+        self._snapshot: Optional[T] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._stats = {"refreshes": 0, "failures": 0}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        # a fotografia herdada continua válida; só a thread de carga precisa ser recriada
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app) -> None:
+        prefix = self.config_prefix
+        self.enabled = bool(app.config.get(f"{prefix}_ENABLED", True))
+        self.refresh_interval = float(app.config.get(f"{prefix}_REFRESH", self.refresh_interval))
+        self.retry_after = float(app.config.get(f"{prefix}_RETRY_AFTER", self.retry_after))
+
+    @abstractmethod
+    def build(self) -> T:
+        """Baixa os dados do upstream e monta a fotografia (implementado nas subclasses)."""
+
+    def describe(self, snapshot: T) -> Dict[str, Any]:
+        """Números da fotografia para o /health."""
+        return {}
+
+    # -- carga ---------------------------------------------------------------
+
+    def refresh(self) -> T:
+        """Monta uma fotografia nova e a publica de uma vez."""
+        started = time.monotonic()
+        snapshot = self.build()
+        self._snapshot, self._loaded_at = snapshot, time.time()
+        self._stats["refreshes"] += 1
+        logger.info(
+            "[FAIFApi] %s carregada em %.2fs: %s", self.label, time.monotonic() - started, self.describe(snapshot)
+        )
+        return snapshot
+
+    def current(self) -> Optional[T]:
+        """A fotografia em uso, ou None se desligada ou ainda não carregada. Não bloqueia."""
+        if not self.enabled:
+            return None
+        self.start()
+        return self._snapshot
+
+    # -- thread de carga -----------------------------------------------------
+
+    def start(self) -> None:
+        """Sobe a thread de carga e recarga do processo atual (uma por processo)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stop = threading.Event()
+                name = f"faif-snapshot-{self.config_prefix.lower()}"
+                threading.Thread(target=self._run, args=(self._stop,), name=name, daemon=True).start()
+                self._pid = os.getpid()
+
+    def _first_wait(self) -> float:
+        """Espera antes da primeira carga: zero, ou o resto do intervalo da fotografia herdada."""
+        if self._snapshot is None or self._loaded_at is None:
+            return 0.0
+        return max(0.0, self.refresh_interval - (time.time() - self._loaded_at))
+
+    def _run(self, stop: threading.Event) -> None:
+        # depois do fork (preload), o worker segue com a fotografia do pai até a hora da recarga
+        wait = self._first_wait()
+        while not stop.wait(wait):
+            try:
+                self.refresh()
+            except err as exc:
+                self._stats["failures"] += 1
+                logger.warning("[FAIFApi] falha ao carregar %s: %s", self.label, exc)
+            except Exception:
+                self._stats["failures"] += 1
+                logger.exception("[FAIFApi] carga de %s falhou", self.label)
+            # sem fotografia nenhuma, a próxima tentativa vem mais cedo
+            wait = self.refresh_interval if self._snapshot is not None else self.retry_after
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "loading": self.enabled and snapshot is None,
+            "loaded_at": self._loaded_at,
+            **(self.describe(snapshot) if snapshot is not None else {}),
+            **self._stats,
+        }
@@ -0,0 +1,20 @@
+from typing import List
+import re
+import unicodedata
+
+# ---------------------------------------------------------------------------
+# Normalização de texto para os índices de busca locais
+# ---------------------------------------------------------------------------
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text: str) -> str:
+    """Minúsculas e sem acentos: 'José Patrício' -> 'jose patricio'."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Palavras de `text` depois de `fold`, sem pontuação."""
+    return [t for t in _NON_WORD.split(fold(text)) if t]
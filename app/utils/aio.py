@@ -0,0 +1,374 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import httpx
+
+from .cache import JSONBody, cache_key, response_cache
+from .exceptions import ConnectionErrorUpstream
+from .fetch import (
+    UPSTREAM_FAILURES,
+    FetchOrigin,
+    UpstreamResult,
+    _acquire_breaker,
+    _breaker_outcome,
+    _conditional_headers,
+    _decode_response,
+    _mark_stale,
+    _promote,
+    _store_result,
+    logger,
+)
+from .l2cache import l2_cache
+from .metrics import record_upstream
+from .ratelimit import rate_limiter
+from .retry import retries
+from .transport import transport
+
+# ---------------------------------------------------------------------------
+# Motor assíncrono (asyncio + httpx) para chamadas aos upstreams
+# ---------------------------------------------------------------------------
+
+# Conexões simultâneas por host no motor assíncrono, quando o host não define
+# "async_max_connections" em HTTP_POOLS
+DEFAULT_ASYNC_MAX_CONNECTIONS = 100
+
+# Marcador de "dados stale" da tarefa atual (ver UpstreamEngine.run)
+_stale_marker: ContextVar[Optional[List[bool]]] = ContextVar("faif_stale_marker", default=None)
+
+
+class _LoopState:
+    """Clientes httpx, chamadas em andamento e revalidações de um event loop."""
+
+    def __init__(self) -> None:
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.flights: Dict[str, "asyncio.Future[Any]"] = {}
+        self.refreshing: Set[str] = set()
+        self.tasks: Set["asyncio.Task[Any]"] = set()
+
+
+_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+# Contadores de coalescência do caminho assíncrono
+async_flight_stats = {"executed": 0, "coalesced": 0}
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _loop_states.get(loop)
+    if state is None:
+        state = _LoopState()
+        _loop_states[loop] = state
+    return state
+
+
+def _client_for(host: str) -> httpx.AsyncClient:
+    state = _state()
+    client = state.clients.get(host)
+    if client is None:
+        settings = transport.settings_for(host)
+        max_connections = int(settings.get("async_max_connections", DEFAULT_ASYNC_MAX_CONNECTIONS))
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=int(settings["pool_maxsize"]),
+                keepalive_expiry=float(settings.get("keepalive_idle") or 5),
+            ),
+            follow_redirects=True,
+        )
+        state.clients[host] = client
+    return client
+
+
+def _mark_stale_async() -> None:
+    marker = _stale_marker.get()
+    if marker is not None:
+        marker.append(True)
+    else:
+        _mark_stale()
+
+
+async def fetch_json_async(
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+    not_found_message: str = "Recurso não encontrado.",
+    not_found_error_code: str = "NOT_FOUND",
+    cache_policy: Optional[str] = None,
+) -> Any:
+    """
+    Contraparte assíncrona de `fetch_json`: mesmos parâmetros, mesmo cache,
+    mesmo circuit breaker e mesmas exceções. Chamadas idênticas no mesmo
+    event loop compartilham a mesma ida ao upstream.
+    """
+    body = await _fetch_body_async(
+        url,
+        headers=headers or {},
+        params=params,
+        timeout=timeout,
+        not_found_message=not_found_message,
+        not_found_error_code=not_found_error_code,
+        cache_policy=cache_policy,
+    )
+    return body.value
+
+
+async def _fetch_body_async(
+    url: str,
+    *,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[int],
+    not_found_message: str,
+    not_found_error_code: str,
+    cache_policy: Optional[str],
+) -> JSONBody:
+    key = cache_key(url, params, headers)
+    cached = response_cache.ttl_for(cache_policy) > 0
+    entry = None
+    if cached:
+        entry = response_cache.get(key)
+        if entry is None and l2_cache.enabled:
+            # a consulta ao Postgres é bloqueante: roda fora do event loop
+            row = await asyncio.get_running_loop().run_in_executor(None, l2_cache.get, key)
+            entry = _promote(key, cache_policy, row)
+
+    async def _load() -> JSONBody:
+        result = await _get_upstream_async(
+            url, {**headers, **_conditional_headers(entry)}, params, timeout, not_found_message, not_found_error_code
+        )
+        origin = FetchOrigin(url, headers, params, timeout, not_found_message, not_found_error_code, cache_policy, True)
+        return _store_result(url, key, cache_policy, entry, result, origin)
+
+    if entry is not None:
+        if entry.is_fresh():
+            logger.info("[FAIFApi] cache HIT %s params=%s", url, params)
+            return entry.body
+        if entry.can_revalidate():
+            logger.info("[FAIFApi] cache STALE %s params=%s (revalidando)", url, params)
+            _refresh_in_background_async(key, _load)
+            _mark_stale_async()
+            return entry.body
+
+    try:
+        return await _single_flight(key, _load)
+    except UPSTREAM_FAILURES:
+        if entry is not None and entry.can_serve_on_error():
+            logger.warning("[FAIFApi] upstream falhou, servindo cache stale de %s", url)
+            _mark_stale_async()
+            return entry.body
+        raise
+
+
+async def _single_flight(key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    flights = _state().flights
+    pending = flights.get(key)
+    if pending is not None:
+        async_flight_stats["coalesced"] += 1
+        return await asyncio.shield(pending)
+
+    future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+    flights[key] = future
+    async_flight_stats["executed"] += 1
+    try:
+        result = await load()
+    except BaseException as exc:
+        future.set_exception(exc)
+        # evita aviso de "exception never retrieved" quando ninguém esperava
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        flights.pop(key, None)
+
+
+def _refresh_in_background_async(key: str, load: Callable[[], Awaitable[Any]]) -> None:
+    state = _state()
+    if key in state.refreshing:
+        return
+    state.refreshing.add(key)
+
+    async def _run() -> None:
+        try:
+            await _single_flight(key, load)
+        except Exception as exc:
+            logger.warning("[FAIFApi] revalidação em segundo plano falhou (%s): %s", key.split("|")[0], exc)
+        finally:
+            state.refreshing.discard(key)
+
+    task = asyncio.ensure_future(_run())
+    state.tasks.add(task)
+    task.add_done_callback(state.tasks.discard)
+
+
+async def _get_upstream_async(
+    url: str,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[int],
+    not_found_message: str,
+    not_found_error_code: str,
+) -> UpstreamResult:
+    host = (urlsplit(url).hostname or "").lower()
+    _, read_timeout = transport.timeout_for(host, timeout)
+    return await retries.call_async(
+        host,
+        lambda attempt_timeout, remaining: _attempt_upstream_async(
+            url, host, headers, params, attempt_timeout, not_found_message, not_found_error_code, remaining
+        ),
+        read_timeout,
+    )
+
+
+async def _attempt_upstream_async(
+    url: str,
+    host: str,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[float],
+    not_found_message: str,
+    not_found_error_code: str,
+    deadline: Optional[float] = None,
+) -> UpstreamResult:
+    breaker = _acquire_breaker(url)
+    connect_timeout, read_timeout = transport.timeout_for(host, timeout)
+    error: Optional[BaseException] = None
+    try:
+        headers = await rate_limiter.acquire_async(host, headers, deadline)
+        logger.info("[FAIFApi] GET (async) %s params=%s", url, params)
+        started = time.perf_counter()
+        try:
+            resp = await _client_for(host).get(
+                url,
+                headers=headers,
+                params=params,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+        except httpx.HTTPError as e:
+            record_upstream(
+                host, time.perf_counter() - started, "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+            )
+            logger.exception("[FAIFApi] Erro de conexão com %s", url)
+            raise ConnectionErrorUpstream(
+                "Erro de conexão com serviço externo.",
+                details=str(e),
+                timeout=isinstance(e, httpx.TimeoutException),
+            ) from e
+        record_upstream(host, time.perf_counter() - started, resp.status_code)
+        return _decode_response(resp, url, not_found_message, not_found_error_code)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if breaker is not None:
+            breaker.record(_breaker_outcome(error))
+
+
+class UpstreamEngine:
+    """
+    Event loop dedicado, em uma thread própria, onde rodam as chamadas
+    assíncronas aos upstreams. Código síncrono (views Flask) entrega
+    corrotinas com `submit`/`run`/`gather` e espera o resultado sem ocupar
+    uma thread por chamada em andamento.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.in_flight = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app) -> None:
+        app.extensions["faif_async_engine"] = self
+
+    def _reset_after_fork(self) -> None:
+        # a thread do loop não existe no processo filho
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self.in_flight = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        loop = self._loop
+        if loop is not None:
+            return loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="faif-upstream-engine", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def submit(self, coro: Awaitable[Any], *, marker: Optional[List[bool]] = None) -> "Future[Any]":
+        """Agenda a corrotina no loop do motor e devolve um concurrent.futures.Future."""
+
+        async def _wrapped() -> Any:
+            _stale_marker.set(marker)
+            self.in_flight += 1
+            try:
+                return await coro
+            finally:
+                self.in_flight -= 1
+
+        self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(_wrapped(), self._ensure_loop())
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        Executa a corrotina no motor e bloqueia até o resultado (ou a exceção).
+        Passado o `timeout`, a corrotina é cancelada no loop e sai um
+        ConnectionErrorUpstream(timeout=True), como num timeout de upstream.
+        """
+        marker: List[bool] = []
+        future = self.submit(coro, marker=marker)
+        try:
+            return future.result(timeout)
+        except FutureTimeout as exc:
+            future.cancel()
+            raise ConnectionErrorUpstream(
+                "Tempo esgotado ao consultar serviço externo.", details=f"{timeout}s", timeout=True
+            ) from exc
+        finally:
+            if marker:
+                _mark_stale()
+
+    def gather(self, coros: Iterable[Awaitable[Any]], timeout: Optional[float] = None) -> List[Any]:
+        """
+        Executa várias corrotinas concorrentemente no motor. Devolve uma lista na
+        mesma ordem com o resultado ou a exceção de cada uma. Estourado o
+        `timeout`, todas são canceladas (ver `run`).
+        """
+
+        async def _all() -> List[Any]:
+            return await asyncio.gather(*coros, return_exceptions=True)
+
+        return self.run(_all(), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        loop = self._loop
+        state = _loop_states.get(loop) if loop is not None else None
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "submitted": self.submitted,
+            "in_flight": self.in_flight,
+            "hosts": sorted(state.clients) if state else [],
+            "executed": async_flight_stats["executed"],
+            "coalesced": async_flight_stats["coalesced"],
+        }
+
+
+engine = UpstreamEngine()
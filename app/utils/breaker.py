@@ -0,0 +1,168 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import os
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+# Circuit breaker por host upstream
+# ---------------------------------------------------------------------------
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Resultados registrados na janela deslizante
+SUCCESS = "success"
+FAILURE = "failure"
+TIMEOUT = "timeout"
+# a chamada não chegou ao upstream (ex.: sem cota); só libera a vaga de teste
+SKIPPED = "skipped"
+
+DEFAULT_BREAKER_SETTINGS: Dict[str, Any] = {
+    "window_seconds": 30,       # tamanho da janela deslizante
+    "min_calls": 10,            # mínimo de chamadas na janela para avaliar as taxas
+    "error_rate": 0.5,          # falhas (erros + timeouts) / chamadas que abrem o circuito
+    "timeout_rate": 0.3,        # timeouts / chamadas que abrem o circuito
+    "open_seconds": 15,         # tempo em aberto antes de testar (half-open)
+    "half_open_max_calls": 1,   # chamadas de teste simultâneas em half-open
+}
+
+
+class CircuitBreaker:
+    """
+    Circuito de um upstream: fechado (passa tudo), aberto (rejeita na hora) e
+    meio-aberto (deixa passar poucas chamadas de teste). Abre quando a taxa de
+    erro ou de timeout na janela deslizante passa do limite configurado.
+    """
+
+    def __init__(self, host: str, settings: Dict[str, Any]) -> None:
+        self.host = host
+        self.settings = settings
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._calls: Deque[Tuple[float, str]] = deque()
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        limit = now - self.settings["window_seconds"]
+        while self._calls and self._calls[0][0] < limit:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._probes = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.settings["open_seconds"] - time.monotonic())
+
+    def allow(self) -> bool:
+        """Diz se uma chamada pode seguir para o upstream agora."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self.opened_at < self.settings["open_seconds"]:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.settings["half_open_max_calls"]:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, outcome: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if outcome == SKIPPED:
+                if self.state == HALF_OPEN:
+                    self._probes = max(0, self._probes - 1)
+                return
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if outcome == SUCCESS:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state == OPEN:
+                return
+
+            self._calls.append((now, outcome))
+            self._prune(now)
+            total = len(self._calls)
+            if total < self.settings["min_calls"]:
+                return
+            timeouts = sum(1 for _, o in self._calls if o == TIMEOUT)
+            failures = timeouts + sum(1 for _, o in self._calls if o == FAILURE)
+            if failures / total >= self.settings["error_rate"] or timeouts / total >= self.settings["timeout_rate"]:
+                self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            outcomes = [o for _, o in self._calls]
+            state = self.state
+        return {
+            "state": state,
+            "window_calls": len(outcomes),
+            "window_failures": outcomes.count(FAILURE),
+            "window_timeouts": outcomes.count(TIMEOUT),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": round(self.retry_after(), 3) if state == OPEN else None,
+        }
+
+
+class BreakerRegistry:
+    """Um CircuitBreaker por host, criado sob demanda com as configurações do host."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._defaults: Dict[str, Any] = dict(DEFAULT_BREAKER_SETTINGS)
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("CIRCUIT_BREAKER_ENABLED", True))
+        self._defaults = {**DEFAULT_BREAKER_SETTINGS, **(app.config.get("CIRCUIT_BREAKER_DEFAULTS") or {})}
+        self._hosts = {h.lower(): dict(s) for h, s in (app.config.get("CIRCUIT_BREAKERS") or {}).items()}
+        with self._lock:
+            self._breakers = {}
+        app.extensions["faif_breakers"] = self
+
+    def _reset_after_fork(self) -> None:
+        # o filho começa com circuitos fechados e sem histórico
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def for_host(self, host: str) -> Optional[CircuitBreaker]:
+        if not self.enabled:
+            return None
+        host = host.lower()
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(host)
+                if breaker is None:
+                    settings = {**self._defaults, **self._hosts.get(host, {})}
+                    breaker = CircuitBreaker(host, settings)
+                    self._breakers[host] = breaker
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: b.snapshot() for host, b in list(self._breakers.items())}
+
+
+breakers = BreakerRegistry()
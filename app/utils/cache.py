@@ -0,0 +1,379 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .exceptions import InvalidJSON
+from .metrics import CACHE_LOOKUPS
+
+# ---------------------------------------------------------------------------
+# Cache em memória (TTL + LRU) para respostas dos upstreams
+# ---------------------------------------------------------------------------
+
+# Headers que mudam o conteúdo da resposta e entram na chave como estão
+KEY_HEADERS = ("accept", "accept-language")
+# Headers de credencial: entram na chave apenas como hash
+CREDENTIAL_HEADERS = ("chave-api-dados", "authorization")
+
+# Custo fixo estimado de cada entrada (objeto, chave, nó do OrderedDict)
+ENTRY_OVERHEAD_BYTES = 256
+
+# Representações derivadas (ex.: corpo comprimido) guardadas por entrada
+MAX_VARIANTS = 4
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:24]
+
+
+def cache_key(
+    url: str,
+    params: Optional[Mapping[str, Any]] = None,
+    headers: Optional[Mapping[str, str]] = None,
+) -> str:
+    """
+    Monta a chave canônica de uma requisição GET: host em minúsculas, query
+    string (da URL e de `params`) ordenada, headers relevantes e o hash das
+    credenciais. Tokens nunca aparecem em texto puro.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for k, v in (params or {}).items():
+        if v is not None:
+            query.append((str(k), str(v)))
+    canonical_url = urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(sorted(query)), "")
+    )
+
+    extras = []
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+    for name in KEY_HEADERS:
+        if lowered.get(name):
+            extras.append(f"{name}={lowered[name]}")
+    for name in CREDENTIAL_HEADERS:
+        if lowered.get(name):
+            extras.append(f"{name}#{_digest(lowered[name])}")
+
+    return "GET " + canonical_url + ("|" + "|".join(extras) if extras else "")
+
+
+_UNDECODED = object()
+
+
+class JSONBody:
+    """
+    Corpo JSON de uma resposta do upstream: os bytes UTF-8 como chegaram e o
+    valor decodificado, calculado só quando alguém pede e memorizado.
+    """
+
+    __slots__ = ("raw", "_value")
+
+    def __init__(self, raw: bytes, value: Any = _UNDECODED) -> None:
+        self.raw = raw
+        self._value = value
+
+    @property
+    def value(self) -> Any:
+        if self._value is _UNDECODED:
+            try:
+                self._value = json.loads(self.raw)
+            except ValueError as e:
+                raise InvalidJSON(details=str(e)) from e
+        return self._value
+
+
+class CacheEntry:
+    """
+    Resposta guardada. Depois de `expires_at` a entrada fica "stale": ainda pode
+    ser servida enquanto é revalidada em segundo plano (até `revalidate_until`)
+    ou quando o upstream falha (até `error_until`). `etag`/`last_modified` são
+    os validadores do upstream, usados para revalidar sem baixar o corpo.
+    `variants` guarda representações prontas de respostas montadas a partir da
+    entrada (ex.: o envelope comprimido com gzip), ver `ResponseCache.add_variant`.
+    """
+
+    __slots__ = (
+        "body", "size", "stored_at", "expires_at", "revalidate_until", "error_until", "etag", "last_modified",
+        "variants", "hits", "origin",
+    )
+
+    def __init__(
+        self,
+        body: JSONBody,
+        size: int,
+        ttl: float,
+        stale_while_revalidate: float = 0,
+        stale_if_error: float = 0,
+        *,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self.body = body
+        self.size = size
+        self.stored_at = time.monotonic()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.variants: Optional["OrderedDict[Hashable, bytes]"] = None
+        self.hits = 0
+        # como refazer a chamada (ver fetch.FetchOrigin), para atualizar antes de expirar
+        self.origin: Any = None
+        self.renew(ttl, stale_while_revalidate, stale_if_error)
+
+    def renew(self, ttl: float, stale_while_revalidate: float = 0, stale_if_error: float = 0) -> None:
+        """Recomeça o TTL e as janelas de stale a partir de agora."""
+        now = time.monotonic()
+        self.hits = 0
+        self.expires_at = now + ttl
+        self.revalidate_until = self.expires_at + stale_while_revalidate
+        self.error_until = self.expires_at + stale_if_error
+
+    @property
+    def value(self) -> Any:
+        return self.body.value
+
+    def variant(self, name: Hashable) -> Optional[bytes]:
+        return self.variants.get(name) if self.variants else None
+
+    @property
+    def retain_until(self) -> float:
+        return max(self.revalidate_until, self.error_until)
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.expires_at
+
+    def can_revalidate(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.revalidate_until
+
+    def can_serve_on_error(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.error_until
+
+
+class ResponseCache:
+    """
+    Cache LRU limitado por orçamento de memória (bytes) com TTL por política.
+
+    Cada política (ex.: "cep", "emendas") vem de CACHE_POLICIES no Config e é
+    escolhida pelo blueprint ao chamar `fetch_json(..., cache_policy=...)`.
+    Entradas expiradas continuam guardadas pela janela de stale da política
+    (`stale_while_revalidate`/`stale_if_error`, com padrões em
+    CACHE_STALE_WHILE_REVALIDATE/CACHE_STALE_IF_ERROR).
+    As entradas guardam o corpo recebido do upstream (bytes prontos para
+    repassar) e o tamanho é medido por ele; o valor decodificado é calculado na
+    primeira leitura, compartilhado entre requisições e não deve ser mutado.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.enabled = True
+        self.max_bytes = max_bytes
+        self.policies: Dict[str, Dict[str, Any]] = {}
+        self.stale_while_revalidate = 0.0
+        self.stale_if_error = 0.0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.expirations = 0
+        self.revalidations: Dict[str, Dict[str, int]] = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("CACHE_ENABLED", True))
+        self.max_bytes = int(app.config.get("CACHE_MAX_BYTES", self.max_bytes))
+        self.policies = {k: dict(v) for k, v in (app.config.get("CACHE_POLICIES") or {}).items()}
+        self.stale_while_revalidate = float(app.config.get("CACHE_STALE_WHILE_REVALIDATE", 0))
+        self.stale_if_error = float(app.config.get("CACHE_STALE_IF_ERROR", 0))
+        app.extensions["faif_cache"] = self
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def ttl_for(self, policy: Optional[str]) -> float:
+        """TTL (segundos) da política; 0 quando o cache não se aplica."""
+        if not self.enabled or not policy:
+            return 0
+        return float(self.policies.get(policy, {}).get("ttl", 0))
+
+    def retention_for(self, policy: Optional[str]) -> float:
+        """Por quanto tempo uma entrada nova da política fica guardada (TTL + stale)."""
+        return self.ttl_for(policy) + max(self.stale_windows(policy))
+
+    def stale_windows(self, policy: Optional[str]) -> Tuple[float, float]:
+        """Janelas (stale_while_revalidate, stale_if_error) da política, em segundos."""
+        conf = self.policies.get(policy or "", {})
+        return (
+            float(conf.get("stale_while_revalidate", self.stale_while_revalidate)),
+            float(conf.get("stale_if_error", self.stale_if_error)),
+        )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Devolve a entrada (fresca ou ainda dentro da janela de stale) ou None.
+        Cabe a quem chama decidir o que fazer com uma entrada expirada.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now >= entry.retain_until:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                result = "miss"
+            else:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                if entry.is_fresh(now):
+                    self.hits += 1
+                    result = "hit"
+                else:
+                    self.stale_hits += 1
+                    result = "stale"
+        CACHE_LOOKUPS.inc(result)
+        return entry
+
+    def set(
+        self,
+        key: str,
+        body: JSONBody,
+        *,
+        policy: Optional[str],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        ttl: Optional[float] = None,
+        origin: Any = None,
+    ) -> Optional[CacheEntry]:
+        """
+        Guarda o corpo com o TTL da política. `ttl` explícito (ex.: o que resta
+        a uma entrada trazida do cache L2) substitui o da política e pode ser
+        negativo, criando a entrada já stale.
+        """
+        if self.ttl_for(policy) <= 0:
+            return None
+        ttl = self.ttl_for(policy) if ttl is None else ttl
+        swr, grace = self.stale_windows(policy)
+        entry = CacheEntry(
+            body, len(body.raw) + len(key) + ENTRY_OVERHEAD_BYTES, ttl, swr, grace, etag=etag, last_modified=last_modified
+        )
+        entry.origin = origin
+        if entry.size > self.max_bytes:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def renew(self, key: str, entry: CacheEntry, *, policy: Optional[str]) -> None:
+        """Renova o TTL de uma entrada revalidada (304), recolocando-a se foi removida."""
+        entry.renew(self.ttl_for(policy), *self.stale_windows(policy))
+        with self._lock:
+            current = self._entries.get(key)
+            if current is entry:
+                self._entries.move_to_end(key)
+                return
+            if current is not None:
+                # outra resposta mais nova já ocupou a chave
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def record_revalidation(self, host: str, not_modified: bool) -> None:
+        with self._lock:
+            counts = self.revalidations.setdefault(host, {"sent": 0, "not_modified": 0})
+            counts["sent"] += 1
+            if not_modified:
+                counts["not_modified"] += 1
+
+    def expiring(self, within: float, min_hits: int) -> List[Tuple[str, CacheEntry]]:
+        """
+        Entradas ainda frescas que expiram nos próximos `within` segundos e
+        foram lidas ao menos `min_hits` vezes desde que foram guardadas, das
+        mais lidas para as menos lidas.
+        """
+        now = time.monotonic()
+        with self._lock:
+            found = [
+                (key, entry)
+                for key, entry in self._entries.items()
+                if entry.origin is not None and entry.hits >= min_hits and now < entry.expires_at <= now + within
+            ]
+        return sorted(found, key=lambda item: item[1].hits, reverse=True)
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """Entrada atual da chave, sem contar hit/miss nem mexer na ordem LRU."""
+        return self._entries.get(key)
+
+    def add_variant(self, key: str, entry: CacheEntry, name: Hashable, data: bytes) -> None:
+        """
+        Guarda uma representação derivada da entrada (contada no orçamento de
+        bytes). Cada entrada mantém no máximo MAX_VARIANTS, descartando a mais
+        antiga; entradas que já saíram do cache são ignoradas.
+        """
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            if entry.variants is None:
+                entry.variants = OrderedDict()
+            delta = len(data) - len(entry.variants.pop(name, b""))
+            entry.variants[name] = data
+            while len(entry.variants) > MAX_VARIANTS:
+                _, dropped = entry.variants.popitem(last=False)
+                delta -= len(dropped)
+            entry.size += delta
+            self._bytes += delta
+            self._evict()
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "revalidations": {
+                host: {**counts, "hit_rate": round(counts["not_modified"] / counts["sent"], 4)}
+                for host, counts in list(self.revalidations.items())
+            },
+        }
+
+
+response_cache = ResponseCache()
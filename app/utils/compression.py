@@ -0,0 +1,125 @@
+from typing import Any, Dict, Optional
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request
+
+from .cache import response_cache
+from .fetch import cache_source
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só há gzip
+    brotli = None
+
+# ---------------------------------------------------------------------------
+# Compressão das respostas (gzip/brotli), reaproveitada pelas entradas do cache
+# ---------------------------------------------------------------------------
+
+DEFAULT_COMPRESSION_MIMETYPES = ("application/json", "application/x-ndjson")
+
+
+class ResponseCompressor:
+    """
+    Comprime as respostas da API conforme o Accept-Encoding do cliente
+    (brotli quando disponível, senão gzip), a partir de COMPRESSION_MIN_SIZE.
+
+    Quando a resposta foi montada a partir de uma única entrada do cache (ver
+    `cache_source`), o corpo comprimido fica guardado junto da entrada,
+    identificado pelo digest do corpo original: chaves quentes são comprimidas
+    uma vez só, e respostas diferentes montadas da mesma entrada (envelope
+    stale, outra rota) não se confundem.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.mimetypes = frozenset(DEFAULT_COMPRESSION_MIMETYPES)
+        self._stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("COMPRESSION_ENABLED", True))
+        self.min_size = int(app.config.get("COMPRESSION_MIN_SIZE", self.min_size))
+        self.gzip_level = int(app.config.get("COMPRESSION_GZIP_LEVEL", self.gzip_level))
+        self.brotli_quality = int(app.config.get("COMPRESSION_BROTLI_QUALITY", self.brotli_quality))
+        self.mimetypes = frozenset(app.config.get("COMPRESSION_MIMETYPES") or DEFAULT_COMPRESSION_MIMETYPES)
+        self._stats = {"compressed": 0, "from_cache": 0, "bytes_in": 0, "bytes_out": 0}
+        app.after_request(self.compress_response)
+        app.extensions["faif_compression"] = self
+
+    def encodings(self) -> tuple:
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def _eligible(self, response: Any) -> bool:
+        return (
+            self.enabled
+            and response.mimetype in self.mimetypes
+            and 200 <= response.status_code < 300
+            and response.status_code not in (204, 206)
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and "Content-Encoding" not in response.headers
+        )
+
+    def compress_response(self, response: Any) -> Any:
+        """Hook after_request: negocia a codificação e comprime o corpo."""
+        if not self._eligible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        source = cache_source()
+        data: Optional[bytes] = None
+        if source is not None:
+            key, entry = source
+            name = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+            data = entry.variant(name)
+            if data is None:
+                data = self.compress(body, encoding)
+                response_cache.add_variant(key, entry, name, data)
+            else:
+                self._count("from_cache")
+        if data is None:
+            data = self.compress(body, encoding)
+        if len(data) >= len(body):
+            return response
+
+        self._count("compressed", len(body), len(data))
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def _count(self, name: str, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + 1
+            self._stats["bytes_in"] = self._stats.get("bytes_in", 0) + bytes_in
+            self._stats["bytes_out"] = self._stats.get("bytes_out", 0) + bytes_out
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["encodings"] = list(self.encodings())
+        stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 4) if stats.get("bytes_in") else None
+        return stats
+
+
+response_compressor = ResponseCompressor()
@@ -0,0 +1,71 @@
+from typing import Iterable, Tuple
+import json
+
+from .exceptions import err
+from .fetch import logger
+
+# ---------------------------------------------------------------------------
+# Sub-requisições GET executadas pelo próprio Flask (lote, warm-up)
+# ---------------------------------------------------------------------------
+
+# Marcado no environ das sub-requisições, para hooks que devem ignorá-las
+INTERNAL_ENVIRON_KEY = "faif.internal"
+
+# Rotas que fazem muitas chamadas aos upstreams numa só requisição (exportação
+# em streaming, varredura de servidores): não são repetidas pelo lote nem pelo
+# aquecimento do cache
+BULK_PATH_PREFIXES = ("/faif/transparencia/emendas/export",)
+# path -> {parâmetro: valores que ligam o modo (None: qualquer valor não vazio)}
+BULK_QUERY_FLAGS = {
+    "/faif/transparencia/servidores": {"varredura": ("1", "true"), "cursor": None},
+}
+
+
+def internal_get(app, path: str, query: str = "", *, purpose: str = "internal") -> Tuple[int, bytes]:
+    """
+    Executa um GET nas rotas do app (mesmos handlers, mesmos error handlers,
+    mesmo cache) e devolve (status, corpo JSON sem a quebra de linha final).
+    `purpose` fica em environ["faif.internal"] e aparece nos logs.
+    """
+    try:
+        with app.test_request_context(
+            path, method="GET", query_string=query, environ_base={INTERNAL_ENVIRON_KEY: purpose}
+        ):
+            response = app.full_dispatch_request()
+            # confere antes de ler: get_data() juntaria um streaming inteiro
+            if response.is_streamed or response.mimetype != "application/json":
+                response.close()
+                raise err(
+                    "Resposta inesperada da rota.",
+                    details={"mimetype": response.mimetype, "streamed": response.is_streamed},
+                )
+            return response.status_code, response.get_data().rstrip(b"\n")
+    except err as exc:
+        status, payload = exc.status_code, exc.to_dict()
+    except Exception:
+        logger.exception("[FAIFApi] sub-requisição (%s) falhou: %s?%s", purpose, path, query)
+        fallback = err("Erro interno do servidor.")
+        status, payload = fallback.status_code, fallback.to_dict()
+    return status, json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def is_internal(environ) -> bool:
+    return INTERNAL_ENVIRON_KEY in environ
+
+
+def is_bulk_route(path: str, query: Iterable[Tuple[str, str]]) -> bool:
+    """True para as rotas de BULK_PATH_PREFIXES / BULK_QUERY_FLAGS."""
+    path = path.rstrip("/")
+    if path.startswith(BULK_PATH_PREFIXES):
+        return True
+    flags = BULK_QUERY_FLAGS.get(path)
+    if not flags:
+        return False
+    first: dict = {}
+    for name, value in query:
+        first.setdefault(name, value)  # como request.args.get
+    for name, values in flags.items():
+        value = first.get(name)
+        if value and (values is None or value in values):
+            return True
+    return False
@@ -35,13 +35,23 @@ class ErrorNotFound(err):
         super().__init__(message, status_code=404, error_code=error_code, details=details)
 
 class ConnectionErrorUpstream(err):
-    def __init__(self, message: str, *, details: Optional[str] = None) -> None:
+    def __init__(self, message: str, *, details: Optional[str] = None, timeout: bool = False) -> None:
         super().__init__(message, status_code=502, error_code="UPSTREAM_CONNECTION_ERROR", details=details)
+        self.timeout = timeout
 
 class ErrorUpstream(err):
     def __init__(self, message: str, *, upstream_status: int, details: Optional[str] = None, error_code: str = "UPSTREAM_ERROR") -> None:
         super().__init__(message, status_code=502, error_code=error_code, details=details)
+        self.upstream_status = upstream_status
 
 class InvalidJSON(err):
     def __init__(self, message: str = "Resposta JSON inválida do serviço externo.", *, upstream_status: Optional[int] = None, details: Optional[str] = None) -> None:
         super().__init__(message, status_code=502, error_code="INVALID_JSON", details=details)
+
+class CircuitOpenUpstream(err):
+    def __init__(self, message: str = "Serviço externo temporariamente indisponível.", *, details: Optional[Any] = None) -> None:
+        super().__init__(message, status_code=503, error_code="UPSTREAM_CIRCUIT_OPEN", details=details)
+
+class RateLimitedUpstream(err):
+    def __init__(self, message: str = "Cota do serviço externo esgotada, tente novamente em instantes.", *, details: Optional[Any] = None) -> None:
+        super().__init__(message, status_code=503, error_code="UPSTREAM_RATE_LIMITED", details=details)
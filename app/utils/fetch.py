@@ -1,20 +1,71 @@
-from typing import Any, Dict, Optional
-from .exceptions import ConnectionErrorUpstream, ErrorNotFound, ErrorUpstream, InvalidJSON
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+from flask import g, has_request_context
+from urllib.parse import urlsplit
+from .exceptions import (
+    CircuitOpenUpstream,
+    ConnectionErrorUpstream,
+    ErrorNotFound,
+    ErrorUpstream,
+    InvalidJSON,
+    RateLimitedUpstream,
+)
+from .transport import transport
+from .cache import CacheEntry, JSONBody, cache_key, response_cache
+from .l2cache import L2Row, l2_cache
+from .singleflight import upstream_flights
+from .breaker import FAILURE, SKIPPED, SUCCESS, TIMEOUT, CircuitBreaker, breakers
+from .ratelimit import rate_limiter
+from .retry import retries
+from .metrics import record_upstream
 import requests
+import json
 import logging
 import os
+import re
+import threading
+import time
 
 # ---------------------------------------------------------------------------
 # Centro das requisições
 # ---------------------------------------------------------------------------
 
-# Timeout padrão para chamadas externas (segundos)
-DEFAULT_TIMEOUT = int(os.getenv("FAIF_HTTP_TIMEOUT", "10"))
-
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Falhas do upstream que podem ser cobertas por uma entrada stale do cache
+UPSTREAM_FAILURES = (ConnectionErrorUpstream, ErrorUpstream, InvalidJSON, CircuitOpenUpstream, RateLimitedUpstream)
+
+# Validação do corpo repassado sem decodificar (fetch_raw): "light" confere só
+# a estrutura externa do documento; "full" decodifica o JSON inteiro
+PASSTHROUGH_VALIDATION = os.getenv("FAIF_PASSTHROUGH_VALIDATION", "light")
+
+UTF8_BOM = b"\xef\xbb\xbf"
+JSON_NUMBER = re.compile(rb"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+# Usados por _looks_like_json: bytes apagados do esqueleto (só ficam aspas,
+# colchetes e chaves) e strings que sobram nele depois de tirar os escapes
+_NOT_STRUCTURAL = bytes(b for b in range(256) if b not in b'"[]{}')
+_SKELETON_STRING = re.compile(rb'"[^"]*"')
+
+# Threads que revalidam entradas stale em segundo plano
+REFRESH_WORKERS = int(os.getenv("FAIF_CACHE_REFRESH_WORKERS", "4"))
+
+_refresh_lock = threading.Lock()
+_refreshing: Set[str] = set()
+_refresh_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _reset_refresh_after_fork() -> None:
+    global _refresh_lock, _refresh_pool
+    _refresh_lock = threading.Lock()
+    _refresh_pool = None
+    _refreshing.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_refresh_after_fork)
+
+
 def fetch_json(
     url: str,
     *,
@@ -23,29 +74,485 @@ def fetch_json(
     timeout: Optional[int] = None,
     not_found_message: str = "Recurso não encontrado.",
     not_found_error_code: str = "NOT_FOUND",
+    cache_policy: Optional[str] = None,
 ) -> Any:
+    """
+    Faz GET em um upstream e devolve o JSON decodificado.
+
+    `cache_policy` escolhe uma política de CACHE_POLICIES (ex.: "cep"); sem ela
+    a resposta nunca é guardada nem lida do cache. Chamadas idênticas que
+    chegam enquanto outra está em andamento compartilham o mesmo resultado.
+
+    Uma entrada expirada dentro da janela `stale_while_revalidate` é devolvida
+    na hora enquanto uma atualização roda em segundo plano; se o upstream
+    falhar, a última resposta boa é servida dentro da janela `stale_if_error`.
+    Nos dois casos a requisição atual é marcada como stale (ver `is_stale`).
+    Ao atualizar uma entrada que tem ETag/Last-Modified, a requisição é
+    condicional: um 304 apenas renova o TTL da entrada existente.
+    """
+    return _fetch_body(
+        url,
+        headers=headers,
+        params=params,
+        timeout=timeout,
+        not_found_message=not_found_message,
+        not_found_error_code=not_found_error_code,
+        cache_policy=cache_policy,
+        parse=True,
+    ).value
+
+
+def fetch_raw(
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+    not_found_message: str = "Recurso não encontrado.",
+    not_found_error_code: str = "NOT_FOUND",
+    cache_policy: Optional[str] = None,
+) -> bytes:
+    """
+    Igual a `fetch_json`, mas devolve o corpo JSON do upstream em bytes UTF-8,
+    sem decodificar. Para rotas que repassam a resposta sem alterá-la (ver
+    `raw_success_response`). O corpo passa apenas por uma validação barata
+    (PASSTHROUGH_VALIDATION="light") ou por uma decodificação completa ("full").
+    """
+    return _fetch_body(
+        url,
+        headers=headers,
+        params=params,
+        timeout=timeout,
+        not_found_message=not_found_message,
+        not_found_error_code=not_found_error_code,
+        cache_policy=cache_policy,
+        parse=PASSTHROUGH_VALIDATION == "full",
+    ).raw
+
+
+def _fetch_body(
+    url: str,
+    *,
+    headers: Optional[Dict[str, str]],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[int],
+    not_found_message: str,
+    not_found_error_code: str,
+    cache_policy: Optional[str],
+    parse: bool,
+) -> JSONBody:
     headers = headers or {}
-    timeout = timeout or DEFAULT_TIMEOUT
+    key = cache_key(url, params, headers)
+    cached = response_cache.ttl_for(cache_policy) > 0
+    entry = None
+    if cached:
+        entry = response_cache.get(key)
+        if entry is None and l2_cache.enabled:
+            entry = _promote(key, cache_policy, l2_cache.get(key))
+    origin = FetchOrigin(url, headers, params, timeout, not_found_message, not_found_error_code, cache_policy, parse)
+
+    def _load() -> JSONBody:
+        return _load_origin(key, origin, entry)
+
+    if entry is not None:
+        if entry.is_fresh():
+            logger.info("[FAIFApi] cache HIT %s params=%s", url, params)
+            _record_cache_source(key, entry)
+            return entry.body
+        if entry.can_revalidate():
+            logger.info("[FAIFApi] cache STALE %s params=%s (revalidando)", url, params)
+            _refresh_in_background(key, _load)
+            _mark_stale()
+            _record_cache_source(key, entry)
+            return entry.body
 
-    logger.info("[FAIFApi] GET %s params=%s", url, params)
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=timeout)
-    except requests.RequestException as e:
-        logger.exception("[FAIFApi] Erro de conexão com %s", url)
-        raise ConnectionErrorUpstream("Erro de conexão com serviço externo.", details=str(e)) from e
+        # chamadas idênticas simultâneas esperam a mesma ida ao upstream
+        body, shared = upstream_flights.do(key, _load)
+    except UPSTREAM_FAILURES:
+        if entry is not None and entry.can_serve_on_error():
+            logger.warning("[FAIFApi] upstream falhou, servindo cache stale de %s", url)
+            _mark_stale()
+            _record_cache_source(key, entry)
+            return entry.body
+        raise
+
+    if shared:
+        logger.info("[FAIFApi] GET coalescido %s params=%s", url, params)
+    stored = response_cache.peek(key) if cached else None
+    _record_cache_source(key, stored if stored is not None and stored.body is body else None)
+    return body
+
+
+class FetchOrigin(NamedTuple):
+    """Argumentos de uma chamada, guardados na entrada do cache para poder refazê-la."""
+
+    url: str
+    headers: Dict[str, str]
+    params: Optional[Dict[str, str]]
+    timeout: Optional[int]
+    not_found_message: str
+    not_found_error_code: str
+    cache_policy: Optional[str]
+    parse: bool
+
+
+def _load_origin(key: str, origin: FetchOrigin, entry: Optional[CacheEntry], *, force: bool = False) -> JSONBody:
+    """Vai ao upstream (condicional se houver entrada com validadores) e guarda o resultado."""
+    result = _get_upstream(
+        origin.url,
+        {**origin.headers, **_conditional_headers(entry, force=force)},
+        origin.params,
+        origin.timeout,
+        origin.not_found_message,
+        origin.not_found_error_code,
+        parse=origin.parse,
+    )
+    return _store_result(origin.url, key, origin.cache_policy, entry, result, origin)
+
+
+def refresh_ahead(key: str, entry: CacheEntry) -> bool:
+    """
+    Atualiza uma entrada ainda fresca antes que ela expire, reaproveitando os
+    argumentos da chamada original. Devolve False se a entrada não sabe como
+    ser refeita (ex.: veio do cache L2).
+    """
+    origin: Optional[FetchOrigin] = entry.origin
+    if origin is None:
+        return False
+    upstream_flights.do(key, lambda: _load_origin(key, origin, entry, force=True))
+    return True
+
+
+class UpstreamResult:
+    """Resposta de uma chamada bem-sucedida (ou 304) a um upstream."""
+
+    __slots__ = ("body", "etag", "last_modified", "not_modified")
+
+    def __init__(
+        self,
+        body: Optional[JSONBody] = None,
+        *,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        not_modified: bool = False,
+    ) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+def _conditional_headers(entry: Optional[CacheEntry], *, force: bool = False) -> Dict[str, str]:
+    """
+    Headers de revalidação para uma entrada expirada que tenha validadores
+    (`force` inclui entradas ainda frescas, na atualização antecipada).
+    """
+    if entry is None or (entry.is_fresh() and not force):
+        return {}
+    out = {}
+    if entry.etag:
+        out["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        out["If-Modified-Since"] = entry.last_modified
+    return out
+
+
+def _store_result(
+    url: str,
+    key: str,
+    cache_policy: Optional[str],
+    entry: Optional[CacheEntry],
+    result: UpstreamResult,
+    origin: Optional[FetchOrigin] = None,
+) -> JSONBody:
+    """Guarda o resultado no cache (ou renova a entrada num 304) e devolve o corpo."""
+    if _conditional_headers(entry):
+        response_cache.record_revalidation((urlsplit(url).hostname or "").lower(), result.not_modified)
+    if result.not_modified and entry is not None:
+        logger.info("[FAIFApi] 304 Not Modified, renovando cache de %s", url)
+        response_cache.renew(key, entry, policy=cache_policy)
+        l2_cache.renew(
+            key, ttl=response_cache.ttl_for(cache_policy), retain=response_cache.retention_for(cache_policy)
+        )
+        return entry.body
+    if result.body is None:
+        # 304 sem entrada para renovar: o upstream ignorou a falta de validadores
+        raise ErrorUpstream("Resposta inesperada do serviço externo.", upstream_status=304)
+    if response_cache.ttl_for(cache_policy) > 0:
+        response_cache.set(
+            key,
+            result.body,
+            policy=cache_policy,
+            etag=result.etag,
+            last_modified=result.last_modified,
+            origin=origin,
+        )
+        l2_cache.set(
+            key,
+            result.body.raw,
+            ttl=response_cache.ttl_for(cache_policy),
+            retain=response_cache.retention_for(cache_policy),
+            etag=result.etag,
+            last_modified=result.last_modified,
+            # corpo diferente do que estava em cache: os outros nós descartam a cópia antiga
+            replaced=entry is not None and entry.body.raw != result.body.raw,
+        )
+    return result.body
+
+
+def _promote(key: str, cache_policy: Optional[str], row: Optional[L2Row]) -> Optional[CacheEntry]:
+    """Traz uma entrada do cache L2 (Postgres) para o cache em memória, com o TTL que lhe resta."""
+    if row is None:
+        return None
+    return response_cache.set(
+        key,
+        JSONBody(row.body),
+        policy=cache_policy,
+        etag=row.etag,
+        last_modified=row.last_modified,
+        ttl=row.ttl,
+    )
+
+
+def is_stale() -> bool:
+    """Indica se a requisição atual recebeu algum dado stale do cache."""
+    return has_request_context() and bool(g.get("faif_stale"))
+
+
+def _mark_stale() -> None:
+    if has_request_context():
+        g.faif_stale = True
+
+
+def cache_source() -> Optional[Tuple[str, CacheEntry]]:
+    """
+    (chave, entrada) do cache de onde saíram os dados da requisição atual,
+    quando todos vieram de uma única entrada; None caso contrário.
+    """
+    if not has_request_context():
+        return None
+    sources = g.get("faif_cache_sources")
+    if not sources or any(s is None or s[1] is not sources[0][1] for s in sources):
+        return None
+    return sources[0]
+
+
+def _record_cache_source(key: str, entry: Optional[CacheEntry]) -> None:
+    if has_request_context():
+        g.setdefault("faif_cache_sources", []).append((key, entry) if entry is not None else None)
+
+
+def _refresh_in_background(key: str, load: Callable[[], Any]) -> None:
+    """Agenda uma atualização da chave, no máximo uma por vez."""
+    global _refresh_pool
+
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        if _refresh_pool is None:
+            _refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="faif-refresh")
+        _refreshing.add(key)
+
+    def _run() -> None:
+        try:
+            upstream_flights.do(key, load)
+        except Exception as exc:
+            logger.warning("[FAIFApi] revalidação em segundo plano falhou (%s): %s", key.split("|")[0], exc)
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    _refresh_pool.submit(_run)
+
+
+def _get_upstream(
+    url: str,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[int],
+    not_found_message: str,
+    not_found_error_code: str,
+    *,
+    parse: bool = True,
+) -> UpstreamResult:
+    """
+    Executa a chamada no upstream; devolve o corpo JSON e os validadores.
+    Falhas transitórias são repetidas conforme a política de retry do host
+    (com hedge opcional); cada tentativa passa pelo circuit breaker.
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    _, read_timeout = transport.timeout_for(host, timeout)
+    return retries.call(
+        host,
+        lambda attempt_timeout, remaining: _attempt_upstream(
+            url, headers, params, attempt_timeout, not_found_message, not_found_error_code,
+            parse=parse, deadline=remaining,
+        ),
+        read_timeout,
+    )
+
+
+def _attempt_upstream(
+    url: str,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, str]],
+    timeout: Optional[float],
+    not_found_message: str,
+    not_found_error_code: str,
+    *,
+    parse: bool = True,
+    deadline: Optional[float] = None,
+) -> UpstreamResult:
+    """
+    Uma tentativa. Com o circuito do host aberto falha na hora; sem cota
+    disponível espera na fila do rate limiter do host, no máximo até o que
+    resta do `deadline` da chamada (segundos).
+    """
+    breaker = _acquire_breaker(url)
+    host = (urlsplit(url).hostname or "").lower()
+    error: Optional[BaseException] = None
+    try:
+        headers = rate_limiter.acquire(host, headers, deadline)
+        logger.info("[FAIFApi] GET %s params=%s", url, params)
+        started = time.perf_counter()
+        try:
+            resp = transport.get(url, headers=headers, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            record_upstream(host, time.perf_counter() - started, "timeout" if isinstance(e, requests.Timeout) else "error")
+            logger.exception("[FAIFApi] Erro de conexão com %s", url)
+            raise ConnectionErrorUpstream(
+                "Erro de conexão com serviço externo.",
+                details=str(e),
+                timeout=isinstance(e, requests.Timeout),
+            ) from e
+        record_upstream(host, time.perf_counter() - started, resp.status_code)
+        return _decode_response(resp, url, not_found_message, not_found_error_code, parse=parse)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if breaker is not None:
+            breaker.record(_breaker_outcome(error))
+
+
+def _acquire_breaker(url: str) -> Optional[CircuitBreaker]:
+    """Devolve o breaker do host ou levanta CircuitOpenUpstream se o circuito estiver aberto."""
+    host = (urlsplit(url).hostname or "").lower()
+    breaker = breakers.for_host(host)
+    if breaker is not None and not breaker.allow():
+        logger.warning("[FAIFApi] circuito aberto para %s, rejeitando %s", host, url)
+        raise CircuitOpenUpstream(
+            details={"host": host, "retry_after_seconds": round(breaker.retry_after(), 1)}
+        )
+    return breaker
+
+
+def _breaker_outcome(error: Optional[BaseException]) -> str:
+    """Classifica o resultado da chamada para a janela do circuit breaker."""
+    if error is None or isinstance(error, ErrorNotFound):
+        return SUCCESS
+    if isinstance(error, RateLimitedUpstream):
+        return SKIPPED
+    if isinstance(error, ErrorUpstream):
+        # 4xx indicam problema na requisição, não no upstream
+        status = error.upstream_status
+        return FAILURE if status >= 500 or status == 429 else SUCCESS
+    if isinstance(error, ConnectionErrorUpstream) and error.timeout:
+        return TIMEOUT
+    return FAILURE
+
+
+def _decode_response(
+    resp: Any, url: str, not_found_message: str, not_found_error_code: str, *, parse: bool = True
+) -> UpstreamResult:
+    """
+    Converte a resposta HTTP (requests ou httpx) em UpstreamResult ou na
+    exceção correspondente. Com `parse=False` o corpo não é decodificado,
+    apenas conferido por `_looks_like_json`.
+    """
+    if resp.status_code == 304:
+        return UpstreamResult(not_modified=True)
 
     if resp.status_code == 404:
         raise ErrorNotFound(not_found_message, error_code=not_found_error_code, details=resp.text[:500])
 
-    if not resp.ok:
+    if not 200 <= resp.status_code < 400:
         raise ErrorUpstream(
             "Erro ao consultar serviço externo.",
             upstream_status=resp.status_code,
             details=resp.text[:500],
         )
 
+    raw = resp.content
+    if raw.startswith(UTF8_BOM):
+        raw = raw[len(UTF8_BOM):]
     try:
-        return resp.json()
+        if not _is_utf8(raw):
+            # a resposta repassada é UTF-8: corpos em outra codificação são recodificados
+            dados = resp.json()
+            body = JSONBody(json.dumps(dados, ensure_ascii=False).encode("utf-8"), dados)
+        elif parse or not _looks_like_json(raw):
+            body = JSONBody(raw, resp.json())
+        else:
+            body = JSONBody(raw)
     except ValueError as e:
         logger.exception("[FAIFApi] JSON inválido de %s", url)
         raise InvalidJSON(details=str(e)) from e
+    return UpstreamResult(
+        body,
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
+    )
+
+
+def _looks_like_json(raw: bytes) -> bool:
+    """
+    Conferência estrutural do corpo sem decodificá-lo: as strings fecham, os
+    colchetes e chaves fora delas se equilibram e formam um só documento (o
+    primeiro abre e o último fecha o todo). Pega corpos truncados
+    (`{"a":[1,2}`) e concatenados (`{..}{..}`), que de outra forma iriam
+    para o cache como bytes prontos para enviar. Só usa operações em C
+    (replace, translate, regex num esqueleto pequeno) e sai mais barata que
+    `json.loads`; a sintaxe fina (vírgulas, dois pontos) não é conferida.
+    """
+    text = raw.strip()
+    if not text:
+        return False
+    if b"\\" in text:
+        # sem os escapes, toda aspa que sobra abre ou fecha uma string
+        text = text.replace(b"\\\\", b"").replace(b'\\"', b"")
+    first, last = text[:1], text[-1:]
+    if first == b'"':
+        return len(text) > 1 and last == b'"' and text.count(b'"') == 2
+    if first not in (b"{", b"["):
+        return text in (b"true", b"false", b"null") or JSON_NUMBER.fullmatch(text) is not None
+    if last != (b"}" if first == b"{" else b"]"):
+        return False
+    # tirar '""' só junta strings vizinhas ou apaga vazias: o que está fora delas não muda
+    skeleton = text.translate(None, _NOT_STRUCTURAL).replace(b'""', b"")
+    if skeleton.count(b'"') % 2:
+        return False  # string sem fechamento
+    brackets = _SKELETON_STRING.sub(b"", skeleton) if b'"' in skeleton else skeleton
+    # o miolo precisa se equilibrar sozinho: senão o primeiro fecha antes do fim
+    return _balanced(brackets[1:-1]) and _balanced(brackets)
+
+
+def _balanced(brackets: bytes) -> bool:
+    """Colchetes e chaves bem aninhados; cada passada remove os pares mais internos."""
+    while brackets:
+        reduced = brackets.replace(b"[]", b"").replace(b"{}", b"")
+        if len(reduced) == len(brackets):
+            return False
+        brackets = reduced
+    return True
+
+
+def _is_utf8(raw: bytes) -> bool:
+    if raw.isascii():
+        return True
+    try:
+        raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
@@ -1,6 +1,16 @@
-from flask import jsonify
-from typing import Any
+from flask import Response, jsonify
+from typing import Any, Dict
 from .exceptions import err
+import base64
+import binascii
+import json
+from .fetch import is_stale
+
+# Header que sinaliza respostas montadas com dados stale do cache
+STALE_HEADER = "X-FAIF-Stale"
+
+# Corpos JSON que equivalem a "sem dados" (falsy depois de decodificados)
+EMPTY_JSON_BODIES = frozenset((b"", b"null", b"[]", b"{}", b'""', b"false", b"0"))
 
 # ---------------------------------------------------------------------------
 # Helpers e Respostas
@@ -10,8 +20,44 @@ def sanitize_digits(value: str) -> str:
     return ''.join(filter(str.isdigit, value))
 
 def success_response(data: Any, status_code: int = 200):
+    if is_stale():
+        body = {"ok": True, "stale": True, "data": data}
+        return jsonify(body), status_code, {STALE_HEADER: "true"}
     return jsonify({"ok": True, "data": data}), status_code
 
+def raw_success_response(raw: bytes, status_code: int = 200):
+    """
+    Mesmo envelope de `success_response`, montado em volta do corpo JSON já
+    serializado (ver `fetch_raw`), sem decodificar e recodificar os dados.
+    """
+    stale = is_stale()
+    body = b"".join((b'{"ok":true,', b'"stale":true,' if stale else b"", b'"data":', raw, b"}\n"))
+    response = Response(body, status=status_code, mimetype="application/json")
+    if stale:
+        response.headers[STALE_HEADER] = "true"
+    return response
+
+def is_empty_json(raw: bytes) -> bool:
+    return raw.strip() in EMPTY_JSON_BODIES
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Cursor opaco de paginação: o estado em JSON, em base64 url-safe sem padding."""
+    raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Inverso de `encode_cursor`; cursor malformado vira 400 INVALID_CURSOR."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(state, dict):
+            raise ValueError
+    except (binascii.Error, ValueError) as exc:
+        raise invalid_cursor(cursor) from exc
+    return state
+
+def invalid_cursor(cursor: str) -> err:
+    return err("Cursor inválido para esta busca.", status_code=400, error_code="INVALID_CURSOR", details={"cursor": cursor})
+
 def error_response_from_exception(exc: err):
     return jsonify(exc.to_dict()), exc.status_code
 
@@ -0,0 +1,172 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import re
+import threading
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+from .traffic_rollups import traffic_rollups
+
+# ---------------------------------------------------------------------------
+# Partições diárias do histórico: criação antecipada e retenção
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^historico_p(\d{8})$")
+
+# Chave do advisory lock que impede dois processos de fazer a manutenção juntos
+MAINTENANCE_LOCK_KEY = 0x46414946_48495354  # "FAIF" "HIST"
+
+
+def partition_name(day: date) -> str:
+    return f"historico_p{day:%Y%m%d}"
+
+
+class HistoryPartitions:
+    """
+    Mantém as partições diárias da tabela `historico` (PostgreSQL): cria as
+    dos próximos HISTORY_PARTITION_PREMAKE_DAYS dias e apaga as que ficaram
+    mais velhas que HISTORY_RETENTION_DAYS (0 guarda tudo). Apagar uma
+    partição inteira é instantâneo e não deixa linhas mortas para o vacuum,
+    ao contrário de um DELETE.
+
+    Roda na primeira requisição de cada processo e depois a cada
+    HISTORY_PARTITION_MAINTENANCE_INTERVAL segundos, em uma thread por
+    processo; um advisory lock garante que só um processo por vez faz o
+    trabalho. Criar o app não basta para subir a thread: na CLI (como em
+    `flask db upgrade`, que reconstrói a própria tabela `historico`) nada roda. Em outros bancos só apaga os agregados de tráfego
+    vencidos (`traffic_rollups.cleanup`), o que também é feito no PostgreSQL.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.retention_days = 90
+        self.premake_days = 7
+        self.interval = 3600.0
+        self._app: Any = None
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._stats = {"runs": 0, "created": 0, "dropped": 0, "rollups_removed": 0, "errors": 0}
+        self._last_run: Optional[float] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("HISTORY_PARTITION_MAINTENANCE", True))
+        self.retention_days = int(app.config.get("HISTORY_RETENTION_DAYS", self.retention_days))
+        self.premake_days = int(app.config.get("HISTORY_PARTITION_PREMAKE_DAYS", self.premake_days))
+        self.interval = float(app.config.get("HISTORY_PARTITION_MAINTENANCE_INTERVAL", self.interval))
+        self._app = app
+        app.extensions["faif_history_partitions"] = self
+        if self.enabled:
+            app.before_request(self._start_on_request)
+
+    # -- ciclo de vida -------------------------------------------------------
+
+    def start(self) -> None:
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="faif-history-partitions", daemon=True).start()
+
+    def _start_on_request(self) -> None:
+        # só processos que servem requisições fazem a manutenção
+        if self._pid != os.getpid():
+            self.start()
+
+    def _restart_after_fork(self) -> None:
+        # a thread do pai não existe no filho; a próxima requisição sobe outra
+        self._pid = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pid = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.maintain()
+            except SQLAlchemyError as exc:
+                self._stats["errors"] += 1
+                logger.warning("[FAIFApi] manutenção das partições do histórico falhou: %s", exc)
+            if self._stop.wait(self.interval):
+                return
+
+    # -- manutenção ----------------------------------------------------------
+
+    def maintain(self, today: Optional[date] = None) -> Dict[str, List[str]]:
+        """Cria as partições que faltam e apaga as vencidas. Devolve os nomes."""
+        done: Dict[str, List[str]] = {"created": [], "dropped": []}
+        today = today or datetime.now(timezone.utc).date()
+        with self._app.app_context():
+            engine = db.engine
+            if engine.dialect.name == "postgresql":
+                self._maintain_partitions(engine, today, done)
+            self._cleanup_rollups(engine)
+
+        self._stats["runs"] += 1
+        self._stats["created"] += len(done["created"])
+        self._stats["dropped"] += len(done["dropped"])
+        self._last_run = datetime.now(timezone.utc).timestamp()
+        if done["created"] or done["dropped"]:
+            logger.info(
+                "[FAIFApi] partições do histórico: criadas %s, apagadas %s",
+                done["created"] or "-", done["dropped"] or "-",
+            )
+        return done
+
+    def _maintain_partitions(self, engine, today: date, done: Dict[str, List[str]]) -> None:
+        with engine.begin() as conn:
+            if not conn.execute(select(func.pg_try_advisory_xact_lock(MAINTENANCE_LOCK_KEY))).scalar():
+                return  # outro processo está cuidando disso
+            existing = set(conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'historico'::regclass"
+            )).scalars())
+
+            for offset in range(self.premake_days + 1):
+                day = today + timedelta(days=offset)
+                name = partition_name(day)
+                if name in existing:
+                    continue
+                conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF historico '
+                    f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') "
+                    f"TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+                ))
+                done["created"].append(name)
+
+            if self.retention_days > 0:
+                oldest = today - timedelta(days=self.retention_days)
+                for name in sorted(existing):
+                    match = PARTITION_NAME.match(name)
+                    if match and datetime.strptime(match.group(1), "%Y%m%d").date() < oldest:
+                        conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                        done["dropped"].append(name)
+
+    def _cleanup_rollups(self, engine) -> None:
+        # transação própria, depois das partições: um problema nos agregados
+        # não pode impedir a criação das partições do histórico
+        try:
+            with engine.begin() as conn:
+                self._stats["rollups_removed"] += traffic_rollups.cleanup(conn)
+        except SQLAlchemyError as exc:
+            self._stats["errors"] += 1
+            logger.warning("[FAIFApi] limpeza dos agregados de tráfego falhou: %s", exc)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "retention_days": self.retention_days,
+            "last_run": self._last_run,
+            **self._stats,
+        }
+
+
+history_partitions = HistoryPartitions()
@@ -0,0 +1,194 @@
+from typing import Any, Dict, List, Optional
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+from ..models import Historico
+from .traffic_rollups import traffic_rollups
+
+# ---------------------------------------------------------------------------
+# Gravação do histórico em lotes, fora da requisição
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+# Marca de fim da fila (desligamento)
+_STOP = object()
+
+
+class HistoryWriter:
+    """
+    Fila limitada em memória para as linhas do `historico`, esvaziada por uma
+    thread do processo que grava em lotes (um INSERT de várias linhas) quando
+    junta HISTORY_BATCH_SIZE linhas ou a cada HISTORY_FLUSH_INTERVAL segundos.
+
+    Com a fila cheia (HISTORY_QUEUE_SIZE), HISTORY_OVERFLOW decide: "drop"
+    descarta a linha na hora; "block" espera até HISTORY_BLOCK_TIMEOUT
+    segundos por espaço e só então descarta. As linhas descartadas são
+    contadas em `stats()`. No desligamento do processo, o que está na fila é
+    gravado antes de sair (até HISTORY_SHUTDOWN_TIMEOUT segundos). Depois de
+    cada lote (ou a cada HISTORY_FLUSH_INTERVAL segundos, sem linhas), os
+    agregados de `traffic_rollups` são gravados em uma transação separada.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.queue_size = 10000
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.overflow = "drop"
+        self.block_timeout = 0.05
+        self.shutdown_timeout = 5.0
+        self._app: Any = None
+        self._queue: "queue.Queue[Any]" = queue.Queue(self.queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._stats = {"written": 0, "batches": 0, "dropped": 0, "failed": 0}
+        self._last_error: Optional[str] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        atexit.register(self.close)
+
+    def _reset_after_fork(self) -> None:
+        # a fila e a thread do processo pai não servem no filho
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(self.queue_size)
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("HISTORY_ASYNC", True))
+        self.queue_size = int(app.config.get("HISTORY_QUEUE_SIZE", self.queue_size))
+        self.batch_size = int(app.config.get("HISTORY_BATCH_SIZE", self.batch_size))
+        self.flush_interval = float(app.config.get("HISTORY_FLUSH_INTERVAL", self.flush_interval))
+        self.overflow = app.config.get("HISTORY_OVERFLOW", self.overflow)
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"HISTORY_OVERFLOW deve ser um de {OVERFLOW_POLICIES}, não {self.overflow!r}")
+        self.block_timeout = float(app.config.get("HISTORY_BLOCK_TIMEOUT", self.block_timeout))
+        self.shutdown_timeout = float(app.config.get("HISTORY_SHUTDOWN_TIMEOUT", self.shutdown_timeout))
+        self._app = app
+        self._queue = queue.Queue(self.queue_size)
+        app.extensions["faif_history_writer"] = self
+
+    # -- produção ------------------------------------------------------------
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Enfileira uma linha (colunas do Historico). False se foi descartada."""
+        self.ensure_started()
+        try:
+            if self.overflow == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+        return True
+
+    # -- consumo -------------------------------------------------------------
+
+    def ensure_started(self) -> None:
+        """Sobe a thread de gravação deste processo, se ainda não subiu."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="faif-history-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self) -> None:
+        # a fila pode ser trocada depois de um fork; esta thread usa a do seu processo
+        q = self._queue
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if stopping:
+                # desligamento: grava o que ainda estiver na fila
+                while True:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            try:
+                for start in range(0, len(batch), self.batch_size):
+                    self._write(batch[start:start + self.batch_size])
+                self._flush_rollups()
+            except Exception:
+                # a thread não pode morrer: sem ela a fila enche e "block" trava as requisições
+                self._stats["failed"] += len(batch)
+                logger.exception("[FAIFApi] erro inesperado na gravação do histórico")
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        try:
+            with self._app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(insert(Historico.__table__), rows)
+        except SQLAlchemyError as exc:
+            self._stats["failed"] += len(rows)
+            self._last_error = str(exc).splitlines()[0]
+            logger.warning("[FAIFApi] falha ao gravar %d linhas do histórico: %s", len(rows), self._last_error)
+            return
+        self._stats["written"] += len(rows)
+        self._stats["batches"] += 1
+
+    def _flush_rollups(self) -> None:
+        # transação própria: uma falha nos agregados não derruba as linhas do histórico
+        if not traffic_rollups.pending():
+            return
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                traffic_rollups.flush(conn)
+
+    def close(self) -> None:
+        """Grava o que está na fila e para a thread (chamado também no atexit)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=self.shutdown_timeout)
+        except queue.Full:
+            logger.warning("[FAIFApi] fila do histórico cheia no desligamento; linhas podem se perder")
+            return
+        thread.join(self.shutdown_timeout)
+        if thread.is_alive():
+            logger.warning("[FAIFApi] histórico não terminou de gravar em %.0fs", self.shutdown_timeout)
+        self._thread = None
+        self._pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "overflow": self.overflow,
+            "queued": self._queue.qsize(),
+            "capacity": self.queue_size,
+            "last_error": self._last_error,
+            **self._stats,
+        }
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,87 @@
+from typing import Any, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # encoder nativo é opcional
+    orjson = None
+
+# ---------------------------------------------------------------------------
+# Provider JSON das respostas (encoder nativo com fallback para a stdlib)
+# ---------------------------------------------------------------------------
+
+# Números com expoente: orjson escreve "1e16" onde a stdlib escreve "1e+16".
+# Para achá-los sem regex, os dígitos viram "0" e procura-se por b"0e".
+_DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provider do Flask que serializa as respostas (`jsonify`, dicts devolvidos
+    pelas views) com orjson quando ele está instalado e JSON_ENSURE_ASCII está
+    desligado, produzindo os mesmos bytes do provider padrão: mesma ordem de
+    chaves (JSON_SORT_KEYS), texto em UTF-8 e separadores compactos.
+
+    O orjson só gera UTF-8. Com JSON_ENSURE_ASCII ligado (o padrão) o caminho
+    nativo nem é tentado: as respostas em português cairiam quase todas na
+    stdlib depois de já serializadas uma vez, o que sai mais caro que usar só
+    a stdlib. Também caem na stdlib os casos em que os encoders divergem:
+    números com expoente, inteiros acima de 64 bits, chaves que não são str e
+    o modo debug com indentação.
+
+    Diferença conhecida: no caminho nativo NaN e Infinity saem como `null`
+    (JSON válido), enquanto a stdlib escreve `NaN`/`Infinity`.
+    """
+
+    def __init__(self, app, *, native: bool = True) -> None:
+        super().__init__(app)
+        # O Flask 3 ignora JSON_SORT_KEYS; o provider volta a respeitá-lo
+        self.sort_keys = bool(app.config.get("JSON_SORT_KEYS", self.sort_keys))
+        self.ensure_ascii = bool(app.config.get("JSON_ENSURE_ASCII", self.ensure_ascii))
+        # com ensure_ascii o orjson serializaria para depois descartar
+        self.native = native and orjson is not None and not self.ensure_ascii
+        self.native_responses = 0
+        self.fallbacks = 0
+
+    def response(self, *args: Any, **kwargs: Any):
+        if self.native and not (self.compact is None and self._app.debug) and self.compact is not False:
+            body = self.dumps_native(self._prepare_response_obj(args, kwargs))
+            if body is not None:
+                self.native_responses += 1
+                return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+            self.fallbacks += 1
+        return super().response(*args, **kwargs)
+
+    def dumps_native(self, obj: Any) -> Optional[bytes]:
+        """Serializa com orjson; devolve None quando a saída divergiria da stdlib."""
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            out = orjson.dumps(obj, default=self.default, option=option)
+        except (TypeError, orjson.JSONEncodeError):
+            return None
+        if b"0e" in out.translate(_DIGITS_TO_ZERO):
+            return None
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "provider": "orjson" if self.native else "stdlib",
+            "native_responses": self.native_responses,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def init_json_provider(app) -> None:
+    """
+    Instala o provider conforme Config.JSON_PROVIDER: "auto" (orjson se
+    instalado e JSON_ENSURE_ASCII desligado), "orjson" ou "stdlib".
+    """
+    choice = (app.config.get("JSON_PROVIDER") or "auto").lower()
+    if choice == "orjson" and orjson is None:
+        app.logger.warning("[FAIFApi] JSON_PROVIDER=orjson, mas orjson não está instalado; usando stdlib")
+    elif choice == "orjson" and app.config.get("JSON_ENSURE_ASCII", True):
+        app.logger.warning("[FAIFApi] JSON_PROVIDER=orjson exige FAIF_JSON_ENSURE_ASCII=0; usando stdlib")
+    app.json = FastJSONProvider(app, native=choice != "stdlib")
@@ -0,0 +1,301 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+import psycopg
+from sqlalchemy import cast, create_engine, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import INTERVAL, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import UpstreamCache
+from .cache import response_cache
+
+# ---------------------------------------------------------------------------
+# Cache de segundo nível (PostgreSQL), compartilhado entre processos e nós
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Canal LISTEN/NOTIFY usado para invalidar a chave no cache em memória de todos os nós.
+# Payload: "<id do processo que avisou> <chave>"; o próprio processo ignora o seu aviso.
+INVALIDATION_CHANNEL = "faif_cache_invalidate"
+
+# Payload máximo de um NOTIFY no PostgreSQL (8000 bytes, com folga)
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Escritas no L2 acontecem fora da requisição, nestas threads
+L2_WRITE_WORKERS = int(os.getenv("FAIF_CACHE_L2_WRITE_WORKERS", "2"))
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class L2Row:
+    """Entrada lida do L2; `ttl` é quanto falta para expirar (negativo se já expirou)."""
+
+    __slots__ = ("body", "etag", "last_modified", "ttl")
+
+    def __init__(self, body: bytes, etag: Optional[str], last_modified: Optional[str], ttl: float) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ttl = ttl
+
+
+class PostgresCache:
+    """
+    Segundo nível do cache de respostas, na tabela `upstream_cache`.
+
+    O caminho de leitura consulta o L2 só depois de uma falta no cache em
+    memória; as escritas são feitas em segundo plano para não somar latência à
+    requisição. Falhas do banco nunca derrubam a requisição: o L2 é tratado
+    como falta e fica desligado por CACHE_L2_RETRY_AFTER segundos.
+
+    Cada processo roda duas threads: a limpeza em lotes das linhas que passaram
+    de `retain_until` e o LISTEN no canal de invalidação, que remove a chave do
+    cache em memória local quando outro processo chama `invalidate` ou
+    substitui a entrada (`set(..., replaced=True)`, depois de uma recarga com
+    corpo novo), para que nenhum nó continue servindo a versão antiga até o
+    fim do TTL dela.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.url: Optional[str] = None
+        self.cleanup_interval = 60.0
+        self.cleanup_batch = 500
+        self.retry_after = 30.0
+        self._engine: Any = None
+        self._table: Any = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._down_until = 0.0
+        self._node_id = uuid.uuid4().hex
+        self._stats = {
+            "hits": 0, "misses": 0, "writes": 0, "errors": 0, "cleaned": 0, "invalidations": 0, "notifies": 0,
+        }
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("CACHE_L2_ENABLED", False))
+        self.url = app.config.get("CACHE_L2_DATABASE_URL") or app.config.get("SQLALCHEMY_DATABASE_URI")
+        self.cleanup_interval = float(app.config.get("CACHE_L2_CLEANUP_INTERVAL", self.cleanup_interval))
+        self.cleanup_batch = int(app.config.get("CACHE_L2_CLEANUP_BATCH", self.cleanup_batch))
+        self.retry_after = float(app.config.get("CACHE_L2_RETRY_AFTER", self.retry_after))
+        self._table = UpstreamCache.__table__
+        app.extensions["faif_l2_cache"] = self
+
+    # -- ciclo de vida -------------------------------------------------------
+
+    def _ensure_started(self) -> Any:
+        """Cria engine e threads no processo atual (depois de um fork, recria)."""
+        if self._pid == os.getpid():
+            return self._engine
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._engine is not None:
+                    # conexões herdadas do processo pai não podem ser usadas aqui
+                    self._engine.dispose(close=False)
+                self._engine = create_engine(self.url, pool_pre_ping=True, pool_size=5, max_overflow=5)
+                self._node_id = uuid.uuid4().hex
+                self._writer = ThreadPoolExecutor(max_workers=L2_WRITE_WORKERS, thread_name_prefix="faif-l2-write")
+                self._stop = threading.Event()
+                for target, name in ((self._cleanup_loop, "faif-l2-cleanup"), (self._listen_loop, "faif-l2-listen")):
+                    threading.Thread(target=target, name=name, daemon=True).start()
+                self._pid = os.getpid()
+        return self._engine
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+        if self._engine is not None:
+            self._engine.dispose()
+        self._pid = None
+
+    def _available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._down_until
+
+    def _failed(self, action: str, exc: BaseException) -> None:
+        self._stats["errors"] += 1
+        self._down_until = time.monotonic() + self.retry_after
+        logger.warning("[FAIFApi] cache L2 indisponível (%s): %s; pausando por %.0fs", action, exc, self.retry_after)
+
+    # -- leitura e escrita ---------------------------------------------------
+
+    def get(self, key: str) -> Optional[L2Row]:
+        """Linha ainda retida para a chave, ou None (inclusive se o banco falhar)."""
+        if not self._available():
+            return None
+        t = self._table
+        stmt = select(
+            t.c.body, t.c.etag, t.c.last_modified, func.extract("epoch", t.c.expires_at - func.now())
+        ).where(t.c.key_hash == _key_hash(key), t.c.key == key, t.c.retain_until > func.now())
+        try:
+            with self._ensure_started().connect() as conn:
+                row = conn.execute(stmt).first()
+        except SQLAlchemyError as exc:
+            self._failed("leitura", exc)
+            return None
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return L2Row(bytes(row[0]), row[1], row[2], float(row[3]))
+
+    def set(
+        self,
+        key: str,
+        body: bytes,
+        *,
+        ttl: float,
+        retain: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        replaced: bool = False,
+    ) -> None:
+        """
+        Grava (ou substitui) a entrada em segundo plano. Com `replaced` (havia
+        uma versão anterior em cache), avisa os outros nós na mesma transação
+        para que tirem a versão antiga da memória.
+        """
+        if not self._available():
+            return
+        values = {
+            "key_hash": _key_hash(key),
+            "key": key,
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": func.now(),
+            "expires_at": func.now() + _seconds(ttl),
+            "retain_until": func.now() + _seconds(retain),
+        }
+        stmt = insert(self._table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self._table.c.key_hash],
+            set_={k: stmt.excluded[k] for k in values if k != "key_hash"},
+        )
+        self._submit("escrita", stmt, notify=key if replaced else None)
+
+    def renew(self, key: str, *, ttl: float, retain: float) -> None:
+        """Recomeça o TTL da entrada (revalidação com 304), em segundo plano."""
+        if not self._available():
+            return
+        t = self._table
+        stmt = (
+            update(t)
+            .where(t.c.key_hash == _key_hash(key))
+            .values(expires_at=func.now() + _seconds(ttl), retain_until=func.now() + _seconds(retain))
+        )
+        self._submit("renovação", stmt)
+
+    def _submit(self, action: str, stmt: Any, *, notify: Optional[str] = None) -> None:
+        engine = self._ensure_started()
+
+        def _run() -> None:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(stmt)
+                    if notify is not None:
+                        self._notify(conn, notify)
+                self._stats["writes"] += 1
+            except SQLAlchemyError as exc:
+                self._failed(action, exc)
+
+        self._writer.submit(_run)
+
+    def _notify(self, conn: Any, key: str) -> None:
+        # entregue só no commit, quando a linha nova já está visível para quem for ler
+        payload = f"{self._node_id} {key}"
+        if len(payload.encode("utf-8")) > MAX_NOTIFY_PAYLOAD:
+            return
+        conn.execute(select(func.pg_notify(INVALIDATION_CHANNEL, payload)))
+        self._stats["notifies"] += 1
+
+    def invalidate(self, key: str) -> bool:
+        """Remove a chave do L2 e avisa todos os nós (NOTIFY) para tirá-la da memória."""
+        response_cache.invalidate(key)
+        if not self.enabled:
+            return False
+        try:
+            with self._ensure_started().begin() as conn:
+                conn.execute(delete(self._table).where(self._table.c.key_hash == _key_hash(key)))
+                self._notify(conn, key)
+        except SQLAlchemyError as exc:
+            self._failed("invalidação", exc)
+            return False
+        return True
+
+    # -- threads de manutenção -----------------------------------------------
+
+    def cleanup(self) -> int:
+        """Apaga, em lotes, as linhas que passaram de `retain_until`. Devolve quantas."""
+        t = self._table
+        expired = (
+            select(t.c.key_hash)
+            .where(t.c.retain_until < func.now())
+            .limit(self.cleanup_batch)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        removed = 0
+        while not self._stop.is_set():
+            with self._ensure_started().begin() as conn:
+                count = conn.execute(delete(t).where(t.c.key_hash.in_(expired))).rowcount or 0
+            removed += count
+            if count < self.cleanup_batch:
+                break
+        self._stats["cleaned"] += removed
+        return removed
+
+    def _cleanup_loop(self) -> None:
+        # o jitter espalha as limpezas dos vários processos ao longo do intervalo
+        while not self._stop.wait(self.cleanup_interval * random.uniform(0.5, 1.5)):
+            if not self._available():
+                continue
+            try:
+                removed = self.cleanup()
+                if removed:
+                    logger.info("[FAIFApi] cache L2: %d entradas expiradas removidas", removed)
+            except SQLAlchemyError as exc:
+                self._failed("limpeza", exc)
+
+    def _listen_loop(self) -> None:
+        dsn = self._engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=5.0):
+                            node_id, _, key = notify.payload.partition(" ")
+                            if node_id == self._node_id or not key:
+                                continue
+                            self._stats["invalidations"] += 1
+                            response_cache.invalidate(key)
+            except Exception as exc:
+                logger.warning("[FAIFApi] LISTEN do cache L2 caiu: %s; reconectando", exc)
+                self._stop.wait(self.retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": self._available(),
+            **self._stats,
+        }
+
+
+def _seconds(value: float) -> Any:
+    return cast(literal(f"{float(value):.3f} seconds"), INTERVAL)
+
+
+l2_cache = PostgresCache()
@@ -0,0 +1,484 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from flask import request
+
+try:
+    import fcntl
+except ImportError:  # fora do Unix os arquivos de processos encerrados não são consolidados
+    fcntl = None
+
+# ---------------------------------------------------------------------------
+# Métricas (contadores, gauges e histogramas) no formato texto do Prometheus
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Limites (segundos) dos histogramas de latência; os mesmos dos agregados de tráfego
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rota usada quando a requisição não casou com nenhuma regra (404 de rota)
+UNMATCHED_ROUTE = "(sem rota)"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Chaves no environ da requisição
+_START_KEY = "faif.metrics.start"
+_DONE_KEY = "faif.metrics.done"
+
+_SNAPSHOT_PREFIX = "metrics_"
+_RETIRED_FILE = "retired.json"
+_LOCK_FILE = ".lock"
+
+Key = Tuple[str, Tuple[str, ...]]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Sequence[str]) -> None:
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        shard = self._registry._shard()
+        key = (self.name, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Gauge somado entre threads e processos vivos (como o "livesum" do
+    cliente oficial): serve para quantidades como requisições em andamento.
+    """
+    kind = "gauge"
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        shard = self._registry._shard()
+        key = (self.name, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Metric):
+    """
+    Histograma de faixas fixas. Cada série guarda as contagens por faixa (não
+    acumuladas), a soma e o total; a forma acumulada do Prometheus é montada
+    na exposição.
+    """
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if not self._registry.enabled:
+            return
+        shard = self._registry._shard()
+        key = (self.name, labelvalues)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def _add(target: Dict[Key, Any], key: Key, value: Any) -> None:
+    current = target.get(key)
+    if isinstance(value, list):
+        if current is None:
+            target[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                current[i] += v
+    else:
+        target[key] = (current or 0) + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas do processo, exposto em GET /metrics no formato
+    texto do Prometheus.
+
+    Os valores ficam em um dicionário por thread (cada thread só escreve no
+    seu), então incrementar não pega lock nem disputa com outras threads; a
+    leitura soma os dicionários. Os de threads encerradas são consolidados.
+
+    Com METRICS_DIR, cada processo grava a cada METRICS_FLUSH_INTERVAL
+    segundos (e na saída) um retrato dos seus valores em
+    METRICS_DIR/metrics_<pid>.json, e o /metrics de qualquer worker soma os
+    retratos de todos, como o modo multiprocesso do cliente oficial. Os
+    contadores e histogramas de processos encerrados são consolidados em
+    retired.json e continuam na soma; gauges só contam processos vivos. O
+    diretório deve ser local à máquina e limpo na subida do servidor.
+    Sem METRICS_DIR, /metrics mostra só o processo que respondeu.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.directory: Optional[str] = None
+        self.flush_interval = 5.0
+        self._metrics: Dict[str, _Metric] = {}
+        self._app: Any = None
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._stats = {"snapshots": 0, "snapshot_errors": 0, "retired_files": 0}
+        self._reset_shards()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        atexit.register(self._write_snapshot)
+
+    def _reset_shards(self) -> None:
+        self._local = threading.local()
+        self._shards_lock = threading.Lock()
+        self._live: List[Tuple[threading.Thread, Dict[Key, Any]]] = []
+        self._retired: Dict[Key, Any] = {}
+
+    def _reset_after_fork(self) -> None:
+        # os valores do processo pai continuam sendo dele; o filho começa do zero
+        self._reset_shards()
+        self._pid = None
+        if self.enabled and self.directory and self._app is not None:
+            self.start()
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("METRICS_ENABLED", True))
+        self.directory = app.config.get("METRICS_DIR") or None
+        self.flush_interval = float(app.config.get("METRICS_FLUSH_INTERVAL", self.flush_interval))
+        self._app = app
+        app.extensions["faif_metrics"] = self
+        if not self.enabled:
+            return
+        app.before_request(self._req_start)
+        app.after_request(self._req_end)
+        app.teardown_request(self._req_teardown)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.start()
+
+    # -- definição -----------------------------------------------------------
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, help_text, labelnames))
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"métrica {metric.name!r} já registrada")
+        self._metrics[metric.name] = metric
+        return metric
+
+    # -- valores por thread --------------------------------------------------
+
+    def _shard(self) -> Dict[Key, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[Key, Any] = {}
+            with self._shards_lock:
+                self._fold_dead_threads()
+                self._live.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def _fold_dead_threads(self) -> None:
+        live = []
+        for thread, shard in self._live:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in list(shard.items()):
+                    _add(self._retired, key, value)
+        self._live = live
+
+    def local_values(self) -> Dict[Key, Any]:
+        """Soma dos valores de todas as threads deste processo."""
+        with self._shards_lock:
+            self._fold_dead_threads()
+            parts = [self._retired] + [shard for _, shard in self._live]
+        merged: Dict[Key, Any] = {}
+        for part in parts:
+            for key, value in list(part.items()):
+                _add(merged, key, value)
+        return merged
+
+    # -- vários processos ----------------------------------------------------
+
+    def start(self) -> None:
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="faif-metrics", daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self._write_snapshot()
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{_SNAPSHOT_PREFIX}{pid}.json")
+
+    def _write_snapshot(self) -> None:
+        if not (self.enabled and self.directory):
+            return
+        path = self._snapshot_path(os.getpid())
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump([[name, list(labels), value] for (name, labels), value in self.local_values().items()], fh)
+            os.replace(tmp, path)
+            self._stats["snapshots"] += 1
+        except OSError as exc:
+            self._stats["snapshot_errors"] += 1
+            logger.warning("[FAIFApi] não foi possível gravar as métricas em %s: %s", path, exc)
+
+    @staticmethod
+    def _read(path: str) -> List[Any]:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return []
+
+    def _collect_directory(self) -> Dict[Key, Any]:
+        """
+        Soma os retratos de todos os processos e consolida os de processos
+        encerrados. Tudo acontece sob o flock do diretório, para que dois
+        workers respondendo /metrics ao mesmo tempo não consolidem o mesmo
+        arquivo duas vezes nem contem um processo no seu retrato e no
+        retired.json na mesma leitura.
+        """
+        self._write_snapshot()
+        if fcntl is None:
+            return self._read_directory(retire=False)
+        with open(os.path.join(self.directory, _LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return self._read_directory(retire=True)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_directory(self, *, retire: bool) -> Dict[Key, Any]:
+        merged: Dict[Key, Any] = {}
+        dead: Dict[str, List[Any]] = {}
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith(_SNAPSHOT_PREFIX) and filename.endswith(".json")):
+                continue
+            try:
+                pid = int(filename[len(_SNAPSHOT_PREFIX):-len(".json")])
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, filename)
+            if pid != os.getpid() and not _pid_alive(pid):
+                dead[path] = self._read(path)
+                continue
+            for name, labels, value in self._read(path):
+                _add(merged, (name, tuple(labels)), value)
+
+        retired_path = os.path.join(self.directory, _RETIRED_FILE)
+        retired: Dict[Key, Any] = {}
+        for name, labels, value in self._read(retired_path):
+            _add(retired, (name, tuple(labels)), value)
+        for entries in dead.values():
+            for name, labels, value in entries:
+                metric = self._metrics.get(name)
+                if metric is not None and metric.kind != "gauge":
+                    _add(retired, (name, tuple(labels)), value)
+
+        if retire and dead:
+            tmp = f"{retired_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump([[name, list(labels), value] for (name, labels), value in retired.items()], fh)
+            os.replace(tmp, retired_path)
+            for path in dead:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                self._stats["retired_files"] += 1
+
+        for key, value in retired.items():
+            _add(merged, key, value)
+        return merged
+
+    def values(self) -> Dict[Key, Any]:
+        """Valores somados de todos os processos (com METRICS_DIR) ou deste."""
+        if self.enabled and self.directory:
+            return self._collect_directory()
+        return self.local_values()
+
+    # -- exposição -----------------------------------------------------------
+
+    def render(self, values: Optional[Dict[Key, Any]] = None) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        values = self.values() if values is None else values
+        by_metric: Dict[str, List[Tuple[Tuple[str, ...], Any]]] = {}
+        for (name, labels), value in values.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(by_metric.get(name, ())):
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_labels(metric.labelnames, labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value):
+                    cumulative += count
+                    le = 'le="' + _number(float(bound)) + '"'
+                    lines.append(f"{name}_bucket{_labels(metric.labelnames, labels, le)} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_labels(metric.labelnames, labels)} {_number(float(value[-2]))}")
+                lines.append(f"{name}_count{_labels(metric.labelnames, labels)} {_number(value[-1])}")
+        return "\n".join(lines) + "\n"
+
+    # -- hooks das requisições -----------------------------------------------
+
+    def _req_start(self) -> None:
+        from .dispatch import is_internal  # dispatch importa fetch, que importa este módulo
+
+        environ = request.environ
+        if is_internal(environ):
+            return
+        environ[_START_KEY] = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    def _req_end(self, response):
+        self._observe_request(response.status_code)
+        return response
+
+    def _req_teardown(self, exc: Optional[BaseException]) -> None:
+        if exc is not None:
+            self._observe_request(500)  # exceção que escapou dos error handlers
+        if request.environ.pop(_START_KEY, None) is not None:
+            HTTP_IN_FLIGHT.dec()
+
+    def _observe_request(self, status: int) -> None:
+        environ = request.environ
+        start = environ.get(_START_KEY)
+        if start is None or environ.get(_DONE_KEY):
+            return
+        environ[_DONE_KEY] = True
+        rota = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        HTTP_REQUESTS.inc(rota, request.method, str(status))
+        HTTP_DURATION.observe(time.perf_counter() - start, rota)
+
+    # -- resumo para o /health -----------------------------------------------
+
+    def request_summary(self, values: Optional[Dict[Key, Any]] = None) -> Dict[str, Any]:
+        values = self.values() if values is None else values
+        total = failed = 0
+        duration_sum = 0.0
+        in_flight = 0
+        for (name, labels), value in values.items():
+            if name == HTTP_REQUESTS.name:
+                total += value
+                if labels[2].isdigit() and int(labels[2]) >= 500:
+                    failed += value
+            elif name == HTTP_DURATION.name:
+                duration_sum += value[-2]
+            elif name == HTTP_IN_FLIGHT.name:
+                in_flight += value
+        return {
+            "total_requests": int(total),
+            "failed_requests": int(failed),
+            "avg_duration_ms": int(duration_sum * 1000 / total) if total else None,
+            "in_flight": int(in_flight),
+            "scope": "all_processes" if self.enabled and self.directory else "process",
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "metrics": len(self._metrics),
+            **self._stats,
+        }
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter(
+    "faif_http_requests_total", "Requisições atendidas, por rota, método e status.", ("rota", "method", "status")
+)
+HTTP_DURATION = metrics.histogram(
+    "faif_http_request_duration_seconds", "Tempo até a resposta ficar pronta, por rota.", ("rota",)
+)
+HTTP_IN_FLIGHT = metrics.gauge("faif_http_requests_in_flight", "Requisições em andamento.")
+UPSTREAM_DURATION = metrics.histogram(
+    "faif_upstream_request_duration_seconds", "Duração das chamadas HTTP aos upstreams, por host.", ("host",)
+)
+UPSTREAM_RESPONSES = metrics.counter(
+    "faif_upstream_responses_total",
+    "Respostas dos upstreams por host e status (timeout/error quando não houve resposta).",
+    ("host", "status"),
+)
+CACHE_LOOKUPS = metrics.counter(
+    "faif_cache_lookups_total", "Consultas ao cache de respostas em memória (hit, stale, miss).", ("result",)
+)
+
+
+def record_upstream(host: str, seconds: float, status: Any) -> None:
+    """Registra uma chamada HTTP a um upstream (status numérico, "timeout" ou "error")."""
+    UPSTREAM_DURATION.observe(seconds, host)
+    UPSTREAM_RESPONSES.inc(host, str(status))
@@ -0,0 +1,242 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .exceptions import RateLimitedUpstream
+
+# ---------------------------------------------------------------------------
+# Agendador de cota (token bucket) por upstream e credencial
+# ---------------------------------------------------------------------------
+
+DEFAULT_RATE_SETTINGS: Dict[str, Any] = {
+    "rate": 1.0,                 # fichas repostas por segundo, por credencial
+    "burst": 5,                  # capacidade do balde
+    "max_wait": 3.0,             # quanto uma requisição pode esperar na fila
+    "credential_header": None,   # header com a credencial (ex.: "chave-api-dados")
+    "credentials": (),           # credenciais extras para somar vazão
+}
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+class MemoryBucketBackend:
+    """Baldes em memória, compartilhados entre as threads do processo."""
+
+    #: `take` pode bloquear (I/O); no event loop vai para uma thread
+    blocking = False
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """Tenta retirar uma ficha. Devolve 0 se conseguiu ou os segundos até a próxima."""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class SQLiteBucketBackend:
+    """
+    Baldes em um arquivo SQLite local, compartilhados entre os processos
+    (workers) da máquina. Cada retirada é uma transação BEGIN IMMEDIATE,
+    que pode esperar o lock do arquivo.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RateLimiter:
+    """
+    Token bucket por (host, credencial). Requisições sem ficha esperam na fila
+    até `max_wait` em vez de serem rejeitadas; com várias credenciais
+    configuradas para o host, usa a primeira que tiver ficha disponível.
+    """
+
+    def __init__(self) -> None:
+        self.backend: Any = MemoryBucketBackend()
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        backend = app.config.get("RATE_LIMIT_BACKEND") or "memory"
+        if backend.startswith("sqlite:///"):
+            self.backend = SQLiteBucketBackend(backend[len("sqlite:///"):])
+        else:
+            self.backend = MemoryBucketBackend()
+        self._hosts = {
+            h.lower(): {**DEFAULT_RATE_SETTINGS, **s} for h, s in (app.config.get("RATE_LIMITS") or {}).items()
+        }
+        self._stats = {}
+        app.extensions["faif_rate_limiter"] = self
+
+    def _candidates(self, settings: Dict[str, Any], headers: Dict[str, str]) -> List[Optional[str]]:
+        header = settings.get("credential_header")
+        if not header:
+            return [None]
+        current = next((v for k, v in headers.items() if k.lower() == header.lower()), None)
+        pool = [current] if current else []
+        pool += [c for c in settings.get("credentials") or () if c and c not in pool]
+        return pool or [None]
+
+    def _try_acquire(self, host: str, settings: Dict[str, Any], candidates: List[Optional[str]]) -> Tuple[Optional[str], float, bool]:
+        """Tenta cada credencial; devolve (credencial, espera mínima, conseguiu)."""
+        shortest = float("inf")
+        for credential in candidates:
+            key = host + ("#" + _digest(credential) if credential else "")
+            wait = self.backend.take(key, float(settings["rate"]), float(settings["burst"]))
+            if wait <= 0:
+                return credential, 0.0, True
+            shortest = min(shortest, wait)
+        return None, shortest, False
+
+    def _with_credential(self, settings: Dict[str, Any], headers: Dict[str, str], credential: Optional[str]) -> Dict[str, str]:
+        header = settings.get("credential_header")
+        if not header or credential is None:
+            return headers
+        out = {k: v for k, v in headers.items() if k.lower() != header.lower()}
+        out[header] = credential
+        return out
+
+    def _account(self, host: str, waited: float, acquired: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(host, {"acquired": 0, "queued": 0, "wait_seconds": 0.0, "rejected": 0})
+            stats["acquired" if acquired else "rejected"] += 1
+            if waited > 0:
+                stats["queued"] += 1
+                stats["wait_seconds"] += waited
+
+    def _reject(self, host: str, retry_after: float) -> RateLimitedUpstream:
+        return RateLimitedUpstream(details={"host": host, "retry_after_seconds": round(retry_after, 1)})
+
+    def acquire(self, host: str, headers: Dict[str, str], deadline: Optional[float] = None) -> Dict[str, str]:
+        """
+        Espera uma ficha para o host e devolve os headers a usar (com a
+        credencial escolhida). Levanta RateLimitedUpstream se a espera passar
+        de `max_wait` (ou de `deadline`, em segundos, se menor), sem dormir
+        quando já se sabe que a ficha não chegaria a tempo.
+        """
+        settings = self._hosts.get(host)
+        if settings is None:
+            return headers
+        candidates = self._candidates(settings, headers)
+        max_wait = min(float(settings["max_wait"]), deadline if deadline is not None else float("inf"))
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            credential, wait, ok = self._try_acquire(host, settings, candidates)
+            if ok:
+                self._account(host, waited, True)
+                return self._with_credential(settings, headers, credential)
+            if waited + wait > max_wait:
+                self._account(host, waited, False)
+                raise self._reject(host, wait)
+            time.sleep(wait)
+            waited = time.monotonic() - started
+
+    async def acquire_async(self, host: str, headers: Dict[str, str], deadline: Optional[float] = None) -> Dict[str, str]:
+        """
+        Versão assíncrona de `acquire`; espera com asyncio.sleep. Com backend
+        bloqueante (SQLite) a retirada roda no executor, fora do event loop.
+        """
+        settings = self._hosts.get(host)
+        if settings is None:
+            return headers
+        candidates = self._candidates(settings, headers)
+        max_wait = min(float(settings["max_wait"]), deadline if deadline is not None else float("inf"))
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            if self.backend.blocking:
+                credential, wait, ok = await loop.run_in_executor(None, self._try_acquire, host, settings, candidates)
+            else:
+                credential, wait, ok = self._try_acquire(host, settings, candidates)
+            if ok:
+                self._account(host, waited, True)
+                return self._with_credential(settings, headers, credential)
+            if waited + wait > max_wait:
+                self._account(host, waited, False)
+                raise self._reject(host, wait)
+            await asyncio.sleep(wait)
+            waited = time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for host, settings in self._hosts.items():
+            stats = dict(self._stats.get(host, {"acquired": 0, "queued": 0, "wait_seconds": 0.0, "rejected": 0}))
+            stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+            stats["rate_per_credential"] = settings["rate"]
+            stats["credentials"] = len(self._candidates(settings, {})) if settings.get("credential_header") else 1
+            out[host] = stats
+        return out
+
+
+rate_limiter = RateLimiter()
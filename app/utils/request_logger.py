@@ -1,14 +1,21 @@
 # request_logger.py
+import random
 import time
-from typing import Any
-from flask import request, g, current_app
+from typing import Any, Dict, Optional
+from flask import request, current_app
 
-from FAIFApi.app.history import salvar_historico
+from ..history import registrar_trafego, salvar_historico
+from .dispatch import is_internal
 
 # Limites para truncamento - pra não ficar muito pesado
 MAX_STR_LEN = 1000        # máximo de caracteres para strings salvas
 MAX_DICT_DEPTH = 3        # profundidade máxima para truncar dicts
-EXCLUDED_PATHS = ("/faif/historico", "/favicon.ico", "/health")  # caminhos a ignorar
+EXCLUDED_PATHS = ("/faif/historico", "/favicon.ico", "/health", "/metrics")  # caminhos a ignorar
+TRUNCATED_MARK = "...(truncated)"
+
+# Chaves no environ da requisição (mais baratas que o `g`)
+_START_KEY = "faif.log.start"
+_SAMPLED_KEY = "faif.log.sampled"
 
 
 def _truncate_value(value: Any, depth: int = 0) -> Any:
@@ -18,7 +25,7 @@ def _truncate_value(value: Any, depth: int = 0) -> Any:
 
     if isinstance(value, str):
         if len(value) > MAX_STR_LEN:
-            return value[:MAX_STR_LEN] + "...(truncated)"
+            return value[:MAX_STR_LEN] + TRUNCATED_MARK
         return value
 
     if isinstance(value, (int, float, bool)):
@@ -41,82 +48,184 @@ def _truncate_value(value: Any, depth: int = 0) -> Any:
     try:
         s = str(value)
         if len(s) > MAX_STR_LEN:
-            return s[:MAX_STR_LEN] + "...(truncated)"
+            return s[:MAX_STR_LEN] + TRUNCATED_MARK
         return s
     except Exception:
         return f"<{type(value).__name__}>"
 
 
-def init_request_logging(app):
+def _snippet(data: bytes, limit: int, more: bool = False) -> str:
+    """Primeiros `limit` bytes como texto (UTF-8 tolerante), com a marca de corte."""
+    text = bytes(data[:limit]).decode("utf-8", errors="replace")
+    return text + TRUNCATED_MARK if more or len(data) > limit else text
+
+
+class RequestLogger:
     """
-    Inicializa os hooks de request/response no Flask app para salvar histórico automaticamente.
-    Chame: init_request_logging(app) no seu app.py após criar o `app`.
+    Registra as requisições no histórico com custo limitado por requisição.
+
+    Toda requisição (fora EXCLUDED_PATHS e as sub-requisições internas do
+    lote e do aquecimento) entra nos agregados de tráfego, que custam uma
+    soma em memória. A linha completa no `historico` só é montada para uma
+    amostra: REQUEST_LOG_SAMPLE_RATE decide na entrada (amostragem "head");
+    na saída, erros (status >= REQUEST_LOG_ERROR_STATUS) e requisições lentas
+    (>= REQUEST_LOG_SLOW_MS) são sempre guardados (amostragem "tail"). O
+    motivo fica em `parametros["sampled"]`.
+
+    Dos corpos, nunca se lê mais que REQUEST_LOG_BODY_MAX_BYTES: o da
+    requisição só se já foi lido pela rota ou se cabe no limite; o da
+    resposta só se não for streaming nem estiver comprimido. Nada é
+    decodificado além desse trecho. O tempo gasto aqui é medido e aparece em
+    `stats()`; quando já passou de REQUEST_LOG_BUDGET_MS, os corpos são
+    pulados e a requisição conta em `over_budget`.
     """
 
-    @app.before_request
-    def _req_start():
-        # marca o início para medir duração
-        g.__req_start_time = time.time()
-
-    @app.after_request
-    def _req_log(response):
+    def __init__(self) -> None:
+        self.enabled = True
+        self.sample_rate = 0.1
+        self.slow_ms = 1000.0
+        self.error_status = 500
+        self.body_max_bytes = 1024
+        self.budget_ms = 1.0
+        self._stats: Dict[str, Any] = {}
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._stats = {
+            "seen": 0, "logged": 0, "sampled_head": 0, "sampled_error": 0, "sampled_slow": 0,
+            "over_budget": 0, "failed": 0, "overhead_total_ms": 0.0, "overhead_max_ms": 0.0,
+        }
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("REQUEST_LOG_ENABLED", True))
+        self.sample_rate = float(app.config.get("REQUEST_LOG_SAMPLE_RATE", self.sample_rate))
+        self.slow_ms = float(app.config.get("REQUEST_LOG_SLOW_MS", self.slow_ms))
+        self.error_status = int(app.config.get("REQUEST_LOG_ERROR_STATUS", self.error_status))
+        self.body_max_bytes = int(app.config.get("REQUEST_LOG_BODY_MAX_BYTES", self.body_max_bytes))
+        self.budget_ms = float(app.config.get("REQUEST_LOG_BUDGET_MS", self.budget_ms))
+        self._reset_stats()
+        app.extensions["faif_request_logger"] = self
+        if self.enabled:
+            # registrado antes da compressão: roda depois dela e vê a resposta final
+            app.before_request(self._req_start)
+            app.after_request(self._req_log)
+
+    # -- hooks ---------------------------------------------------------------
+
+    def _req_start(self) -> None:
+        environ = request.environ
+        t0 = time.perf_counter()
+        environ[_START_KEY] = t0
+        environ[_SAMPLED_KEY] = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        self._stats["overhead_total_ms"] += (time.perf_counter() - t0) * 1000
+
+    def _req_log(self, response):
+        t0 = time.perf_counter()
         try:
-            path = request.path or ""
-            # Ignora paths configurados (evita recursão no /faif/historico)
-            if any(path.startswith(p) for p in EXCLUDED_PATHS):
-                return response
-
-            start = getattr(g, "__req_start_time", time.time())
-            duration_ms = int((time.time() - start) * 1000)
-
-            # coleta query params (simples dict)
-            try:
-                query = request.args.to_dict(flat=True)
-            except Exception:
-                query = {}
-
-            # tenta obter JSON do body (silencioso)
-            try:
-                body_json = request.get_json(silent=True)
-            except Exception:
-                body_json = None
-
-            # resumo do response (não pega corpo inteiro se muito grande)
-            response_len = getattr(response, "content_length", None)
-            response_snippet = None
-            if response_len is None:
-                # tenta pegar um snippet seguro
-                try:
-                    data = response.get_data(as_text=True)
-                    if data:
-                        response_snippet = data[:MAX_STR_LEN] + ("...(truncated)" if len(data) > MAX_STR_LEN else "")
-                        response_len = len(data)
-                except Exception:
-                    response_snippet = f"<{type(response).__name__}>"
-            else:
-                # não ler o body se content_length grande; apenas anotar o tamanho
-                if response_len and response_len <= MAX_STR_LEN:
-                    try:
-                        response_snippet = response.get_data(as_text=True)
-                    except Exception:
-                        response_snippet = f"<{type(response).__name__}>"
-
-            payload = {
-                "method": request.method,
-                "path": path,
-                "query": _truncate_value(query),
-                "body": _truncate_value(body_json),
-                "status_code": response.status_code,
-                "response_length": response_len,
-                "response_snippet": _truncate_value(response_snippet),
-                "duration_ms": duration_ms,
-            }
-
-            # grava no histórico (endpoint = path)
-            salvar_historico(endpoint=path, parametros=payload)
-
+            self._log(response, t0)
         except Exception as exc:
             # não interrompe a resposta em caso de erro no logger
+            self._stats["failed"] += 1
             current_app.logger.exception("request_logger failed: %s", exc)
-
+        overhead = (time.perf_counter() - t0) * 1000
+        self._stats["overhead_total_ms"] += overhead
+        if overhead > self._stats["overhead_max_ms"]:
+            self._stats["overhead_max_ms"] = overhead
         return response
+
+    def _log(self, response, t0: float) -> None:
+        environ = request.environ
+        start = environ.get(_START_KEY)
+        path = request.path or ""
+        # Ignora paths configurados (evita recursão no /faif/historico) e sub-requisições
+        if start is None or path.startswith(EXCLUDED_PATHS) or is_internal(environ):
+            return
+        self._stats["seen"] += 1
+
+        duration_ms = (t0 - start) * 1000
+        status = response.status_code
+        streamed = response.is_streamed
+        response_len = response.content_length
+        rota = request.url_rule.rule if request.url_rule is not None else None
+        registrar_trafego(rota, status, duration_ms, response_len)
+
+        if environ.get(_SAMPLED_KEY):
+            sampled = "head"
+        elif status >= self.error_status:
+            sampled = "error"
+        elif duration_ms >= self.slow_ms:
+            sampled = "slow"
+        else:
+            return
+        self._stats["sampled_" + sampled] += 1
+
+        within_budget = (time.perf_counter() - t0) * 1000 < self.budget_ms
+        payload = {
+            "method": request.method,
+            "path": path,
+            "query": _truncate_value(request.args.to_dict(flat=True)),
+            "body": self._request_body() if within_budget else None,
+            "status_code": status,
+            "response_length": response_len,
+            "response_snippet": self._response_body(response, streamed) if within_budget else None,
+            "duration_ms": int(duration_ms),
+            "sampled": sampled,
+        }
+
+        # grava no histórico (endpoint = path)
+        salvar_historico(endpoint=path, parametros=payload)
+        self._stats["logged"] += 1
+        if (time.perf_counter() - t0) * 1000 >= self.budget_ms:
+            self._stats["over_budget"] += 1
+
+    # -- corpos --------------------------------------------------------------
+
+    def _request_body(self) -> Optional[str]:
+        length = request.content_length
+        if not length:
+            return None
+        # lido pela rota (get_json/get_data guardam os bytes) ou pequeno o bastante
+        data = getattr(request, "_cached_data", None)
+        if data is None:
+            if length > self.body_max_bytes:
+                return f"<{length} bytes>"
+            data = request.get_data(cache=True)
+        return _snippet(data, self.body_max_bytes)
+
+    def _response_body(self, response, streamed: bool) -> Optional[str]:
+        if streamed or response.direct_passthrough:
+            return "<stream>"
+        encoding = response.headers.get("Content-Encoding")
+        if encoding:
+            return f"<{encoding}>"
+        # só o primeiro pedaço, sem juntar o corpo inteiro
+        chunks = response.response
+        if not isinstance(chunks, (list, tuple)) or not chunks:
+            return None
+        first = chunks[0]
+        if isinstance(first, str):
+            first = first[:self.body_max_bytes + 1].encode("utf-8")
+        if not first:
+            return None
+        return _snippet(first, self.body_max_bytes, more=len(chunks) > 1)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        seen = stats["seen"]
+        stats["enabled"] = self.enabled
+        stats["sample_rate"] = self.sample_rate
+        stats["overhead_avg_us"] = round(stats["overhead_total_ms"] * 1000 / seen, 1) if seen else None
+        stats["overhead_total_ms"] = round(stats["overhead_total_ms"], 3)
+        stats["overhead_max_ms"] = round(stats["overhead_max_ms"], 3)
+        return stats
+
+
+request_logger = RequestLogger()
+
+
+def init_request_logging(app):
+    """
+    Inicializa os hooks de request/response no Flask app para salvar histórico automaticamente.
+    Equivale a `request_logger.init_app(app)`, que o `create_app` já chama.
+    """
+    request_logger.init_app(app)
@@ -0,0 +1,308 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import os
+import random
+import threading
+import time
+
+from .exceptions import ConnectionErrorUpstream, ErrorUpstream
+
+# ---------------------------------------------------------------------------
+# Retentativas com backoff e requisições "hedged" por upstream
+# ---------------------------------------------------------------------------
+
+T = TypeVar("T")
+
+DEFAULT_RETRY_SETTINGS: Dict[str, Any] = {
+    "max_attempts": 3,                 # tentativas no total (1 = sem retry)
+    "base_delay": 0.1,                 # backoff exponencial com jitter total
+    "max_delay": 1.0,
+    "deadline": 12.0,                  # orçamento total da chamada, em segundos
+    "retry_statuses": (429, 502, 503, 504),
+    "hedge_percentile": None,          # ex.: 0.95 liga hedging após o p95 de latência
+    "hedge_min_samples": 20,           # amostras mínimas antes de usar o percentil
+    "hedge_max_delay": 2.0,            # teto para a espera antes do hedge
+}
+
+# Amostras de latência guardadas por host para calcular o percentil de hedge
+LATENCY_SAMPLES = 200
+
+# Requisições primárias hedgeáveis ao mesmo tempo no caminho síncrono; além
+# disso a tentativa roda na própria thread, sem hedge (o pool tem o dobro de
+# threads, para os hedges nunca esperarem na fila)
+HEDGE_WORKERS = int(os.getenv("FAIF_HEDGE_WORKERS", "8"))
+
+
+class RetryPolicy:
+    """Política de um host: quando repetir, quanto esperar e quando fazer hedge."""
+
+    def __init__(self, host: str, settings: Dict[str, Any]) -> None:
+        self.host = host
+        self.max_attempts = max(1, int(settings["max_attempts"]))
+        self.base_delay = float(settings["base_delay"])
+        self.max_delay = float(settings["max_delay"])
+        self.deadline = float(settings["deadline"])
+        self.retry_statuses = frozenset(settings["retry_statuses"])
+        self.hedge_percentile = settings.get("hedge_percentile")
+        self.hedge_min_samples = int(settings["hedge_min_samples"])
+        self.hedge_max_delay = float(settings["hedge_max_delay"])
+
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def should_retry(self, exc: BaseException) -> bool:
+        if isinstance(exc, ConnectionErrorUpstream):
+            return True
+        if isinstance(exc, ErrorUpstream):
+            return exc.upstream_status in self.retry_statuses
+        return False
+
+    def backoff(self, retry_number: int) -> float:
+        """Espera antes da retentativa `retry_number` (1, 2, ...), com jitter total."""
+        cap = min(self.max_delay, self.base_delay * (2 ** (retry_number - 1)))
+        return random.uniform(0, cap)
+
+    def record_latency(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes do hedge (percentil das latências recentes) ou None se desligado."""
+        if not self.hedge_percentile:
+            return None
+        samples = sorted(self.latencies)
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * float(self.hedge_percentile)))
+        return min(samples[index], self.hedge_max_delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
+
+
+class RetryRegistry:
+    """Políticas de retry por host (RETRY_DEFAULTS + RETRY_POLICIES do Config)."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._defaults: Dict[str, Any] = dict(DEFAULT_RETRY_SETTINGS)
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._policies: Dict[str, RetryPolicy] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("RETRY_ENABLED", True))
+        self._defaults = {**DEFAULT_RETRY_SETTINGS, **(app.config.get("RETRY_DEFAULTS") or {})}
+        self._hosts = {h.lower(): dict(s) for h, s in (app.config.get("RETRY_POLICIES") or {}).items()}
+        with self._lock:
+            self._policies = {}
+        app.extensions["faif_retries"] = self
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._hedge_pool = None
+        self._hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+    def policy_for(self, host: str) -> RetryPolicy:
+        host = host.lower()
+        policy = self._policies.get(host)
+        if policy is None:
+            with self._lock:
+                policy = self._policies.get(host)
+                if policy is None:
+                    settings = {**self._defaults, **self._hosts.get(host, {})}
+                    if not self.enabled:
+                        settings.update(max_attempts=1, hedge_percentile=None)
+                    policy = RetryPolicy(host, settings)
+                    self._policies[host] = policy
+        return policy
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=2 * HEDGE_WORKERS, thread_name_prefix="faif-hedge")
+            return self._hedge_pool
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: p.snapshot() for host, p in list(self._policies.items())}
+
+    # -- caminho síncrono ----------------------------------------------------
+
+    def call(self, host: str, attempt: Callable[[float, float], T], read_timeout: float) -> T:
+        """
+        Executa `attempt(timeout, remaining)` com retentativas e, se
+        configurado, hedge. `timeout` é o tempo de leitura da tentativa,
+        limitado pelo deadline; `remaining` é quanto resta do deadline quando
+        a tentativa começa (para esperas antes da requisição, como a cota).
+        Só deve ser usado para requisições idempotentes (GET).
+        """
+        policy = self.policy_for(host)
+        started = time.monotonic()
+        deadline_at = started + policy.deadline
+        retry_number = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                return self._attempt(policy, attempt, max(0.1, min(read_timeout, remaining)), deadline_at)
+            except Exception as exc:
+                if retry_number + 1 >= policy.max_attempts or not policy.should_retry(exc):
+                    raise
+                retry_number += 1
+                delay = policy.backoff(retry_number)
+                if time.monotonic() - started + delay >= policy.deadline:
+                    policy.deadline_exceeded += 1
+                    raise
+                policy.retries += 1
+                time.sleep(delay)
+
+    def _attempt(
+        self, policy: RetryPolicy, attempt: Callable[[float, float], T], timeout: float, deadline_at: float
+    ) -> T:
+        hedge_after = policy.hedge_delay()
+        if hedge_after is None or hedge_after >= timeout:
+            return self._timed(policy, attempt, timeout, deadline_at)
+        if not self._hedge_slots.acquire(blocking=False):
+            # pool ocupado: a tentativa roda aqui, sem hedge, em vez de esperar vaga
+            return self._timed(policy, attempt, timeout, deadline_at)
+
+        pool = self._pool()
+        started = threading.Event()
+
+        def _primary() -> T:
+            started.set()
+            try:
+                return self._timed(policy, attempt, timeout, deadline_at)
+            finally:
+                self._hedge_slots.release()
+
+        try:
+            primary = pool.submit(_primary)
+        except BaseException:
+            self._hedge_slots.release()
+            raise
+        # o prazo do hedge conta a partir do início real da primária
+        started.wait()
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        policy.hedges += 1
+        hedge = pool.submit(self._timed, policy, attempt, timeout, deadline_at)
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if future is hedge:
+                        policy.hedge_wins += 1
+                    # a requisição perdedora termina sozinha e é descartada
+                    return future.result()
+                if not policy.should_retry(error):
+                    # resposta definitiva (ex.: 404): não adianta esperar a outra
+                    raise error
+                first_error = first_error or error
+        raise first_error  # type: ignore[misc]
+
+    @staticmethod
+    def _timed(policy: RetryPolicy, attempt: Callable[[float, float], T], timeout: float, deadline_at: float) -> T:
+        policy.attempts += 1
+        start = time.monotonic()
+        result = attempt(timeout, max(0.0, deadline_at - start))
+        policy.record_latency(time.monotonic() - start)
+        return result
+
+    # -- caminho assíncrono --------------------------------------------------
+
+    async def call_async(
+        self, host: str, attempt: Callable[[float, float], Awaitable[T]], read_timeout: float
+    ) -> T:
+        """Versão assíncrona de `call`; a requisição perdedora do hedge é cancelada."""
+        policy = self.policy_for(host)
+        started = time.monotonic()
+        deadline_at = started + policy.deadline
+        retry_number = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                return await self._attempt_async(
+                    policy, attempt, max(0.1, min(read_timeout, remaining)), deadline_at
+                )
+            except Exception as exc:
+                if retry_number + 1 >= policy.max_attempts or not policy.should_retry(exc):
+                    raise
+                retry_number += 1
+                delay = policy.backoff(retry_number)
+                if time.monotonic() - started + delay >= policy.deadline:
+                    policy.deadline_exceeded += 1
+                    raise
+                policy.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _attempt_async(
+        self,
+        policy: RetryPolicy,
+        attempt: Callable[[float, float], Awaitable[T]],
+        timeout: float,
+        deadline_at: float,
+    ) -> T:
+        hedge_after = policy.hedge_delay()
+        primary = asyncio.ensure_future(self._timed_async(policy, attempt, timeout, deadline_at))
+        if hedge_after is None or hedge_after >= timeout:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        policy.hedges += 1
+        hedge = asyncio.ensure_future(self._timed_async(policy, attempt, timeout, deadline_at))
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is hedge:
+                            policy.hedge_wins += 1
+                        return task.result()
+                    if not policy.should_retry(error):
+                        raise error
+                    first_error = first_error or error
+            raise first_error  # type: ignore[misc]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _timed_async(
+        policy: RetryPolicy, attempt: Callable[[float, float], Awaitable[T]], timeout: float, deadline_at: float
+    ) -> T:
+        policy.attempts += 1
+        start = time.monotonic()
+        result = await attempt(timeout, max(0.0, deadline_at - start))
+        policy.record_latency(time.monotonic() - start)
+        return result
+
+
+retries = RetryRegistry()
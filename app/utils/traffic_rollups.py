@@ -0,0 +1,268 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+import threading
+
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import HistoricoRollup
+from .metrics import UNMATCHED_ROUTE
+
+# ---------------------------------------------------------------------------
+# Agregados de tráfego e latência por rota, por minuto e por hora
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) das faixas do histograma de latência; a última
+# coluna (lat_le_inf) conta o que passou do maior limite.
+LATENCY_BUCKETS_MS: Tuple[int, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LATENCY_COLUMNS: Tuple[str, ...] = tuple(f"lat_le_{b}" for b in LATENCY_BUCKETS_MS) + ("lat_le_inf",)
+
+# Colunas somáveis, na ordem dos vetores acumulados em memória
+COUNTER_COLUMNS: Tuple[str, ...] = (
+    "requisicoes", "erros", "erros_cliente", "bytes_out", "duracao_total_ms",
+) + LATENCY_COLUMNS
+
+GRANULARIDADES: Dict[str, int] = {"minuto": 60, "hora": 3600}
+
+# Falhas seguidas de gravação depois das quais o acumulado pendente é descartado
+MAX_FLUSH_FAILURES = 3
+
+# Rota usada quando a requisição não casou com nenhuma regra (404 de rota)
+SEM_ROTA = UNMATCHED_ROUTE
+
+
+def _bucket_index(duration_ms: float) -> int:
+    for i, limit in enumerate(LATENCY_BUCKETS_MS):
+        if duration_ms <= limit:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _inicio(instante: datetime, seconds: int) -> datetime:
+    ts = int(instante.timestamp())
+    return datetime.fromtimestamp(ts - ts % seconds, tz=timezone.utc)
+
+
+def percentile(hist: Sequence[int], q: float) -> Optional[float]:
+    """
+    Percentil `q` (0–1) estimado a partir das contagens do histograma, com
+    interpolação linear dentro da faixa. Na última faixa (sem limite) devolve
+    o maior limite conhecido.
+    """
+    total = sum(hist)
+    if total <= 0:
+        return None
+    alvo = q * total
+    acumulado = 0
+    for i, count in enumerate(hist):
+        if count and acumulado + count >= alvo:
+            if i >= len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[i - 1] if i else 0
+            upper = LATENCY_BUCKETS_MS[i]
+            return round(lower + (upper - lower) * (alvo - acumulado) / count, 1)
+        acumulado += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Transforma as colunas somadas de um agregado na forma da resposta."""
+    requisicoes = int(row["requisicoes"] or 0)
+    hist = [int(row[c] or 0) for c in LATENCY_COLUMNS]
+    return {
+        "requisicoes": requisicoes,
+        "erros": int(row["erros"] or 0),
+        "erros_cliente": int(row["erros_cliente"] or 0),
+        "bytes_out": int(row["bytes_out"] or 0),
+        "latencia_ms": {
+            "media": round(int(row["duracao_total_ms"] or 0) / requisicoes, 1) if requisicoes else None,
+            "p50": percentile(hist, 0.50),
+            "p95": percentile(hist, 0.95),
+            "p99": percentile(hist, 0.99),
+        },
+    }
+
+
+class TrafficRollups:
+    """
+    Mantém a tabela `historico_rollup`: por rota (a regra do Flask, como
+    /faif/cep/<cep>, para não abrir uma linha por valor) e por minuto e por
+    hora, o total de requisições, erros (5xx), erros do cliente (4xx), bytes
+    enviados, soma das durações e um histograma de latência em faixas fixas,
+    de onde saem p50/p95/p99. Histogramas se somam, então qualquer intervalo
+    é respondido somando linhas, sem tocar no JSON do histórico.
+
+    Cada requisição registrada soma num acumulador em memória (`record`); o
+    acumulado vai para o banco com um upsert aditivo depois dos lotes do
+    `history_writer` (ou na própria requisição, com HISTORY_ASYNC=0). Os
+    agregados por minuto são apagados depois de ROLLUP_MINUTE_RETENTION_DAYS
+    e os por hora depois de ROLLUP_HOUR_RETENTION_DAYS (0 guarda tudo), na
+    manutenção do histórico.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.minute_retention_days = 14
+        self.hour_retention_days = 400
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, datetime, str], List[int]] = {}
+        self._stats = {"recorded": 0, "flushes": 0, "rows_upserted": 0, "failed": 0, "discarded": 0}
+        self._consecutive_failures = 0
+        self._last_error: Optional[str] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        # o acumulado do pai é gravado pelo pai
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("ROLLUPS_ENABLED", True))
+        self.minute_retention_days = int(app.config.get("ROLLUP_MINUTE_RETENTION_DAYS", self.minute_retention_days))
+        self.hour_retention_days = int(app.config.get("ROLLUP_HOUR_RETENTION_DAYS", self.hour_retention_days))
+        app.extensions["faif_traffic_rollups"] = self
+
+    # -- acumulação ----------------------------------------------------------
+
+    def record(
+        self,
+        rota: Optional[str],
+        instante: datetime,
+        status_code: Any,
+        duration_ms: Any,
+        bytes_out: Any,
+    ) -> None:
+        """Soma uma requisição nos agregados de minuto e hora correspondentes."""
+        if not self.enabled:
+            return
+        try:
+            status = int(status_code or 0)
+            duration = float(duration_ms or 0)
+            size = int(bytes_out or 0)
+        except (TypeError, ValueError):
+            return
+        delta = [0] * len(COUNTER_COLUMNS)
+        delta[0] = 1
+        delta[1] = 1 if status >= 500 else 0
+        delta[2] = 1 if 400 <= status < 500 else 0
+        delta[3] = max(size, 0)
+        delta[4] = int(duration)
+        delta[5 + _bucket_index(duration)] = 1
+        rota = (rota or SEM_ROTA)[:255]
+
+        with self._lock:
+            for granularidade, seconds in GRANULARIDADES.items():
+                key = (granularidade, _inicio(instante, seconds), rota)
+                acc = self._pending.get(key)
+                if acc is None:
+                    self._pending[key] = list(delta)
+                else:
+                    for i, value in enumerate(delta):
+                        if value:
+                            acc[i] += value
+            self._stats["recorded"] += 1
+
+    # -- gravação ------------------------------------------------------------
+
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self, conn) -> int:
+        """
+        Grava o acumulado na conexão dada; quem chama usa uma transação só
+        para isso, separada das linhas do histórico. Se a gravação falhar, o
+        acumulado volta para a memória e é tentado de novo no próximo flush,
+        até MAX_FLUSH_FAILURES falhas seguidas, quando é descartado. Em bancos
+        sem upsert suportado os agregados são desligados. Nunca levanta;
+        devolve o número de linhas tocadas.
+        """
+        stmt = self._upsert(conn.dialect.name)
+        if stmt is None:
+            logger.warning(
+                "[FAIFApi] agregados de tráfego não suportam o banco %r; desligados", conn.dialect.name
+            )
+            self.enabled = False
+            with self._lock:
+                self._pending = {}
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        rows = [
+            {"granularidade": g, "inicio": inicio, "rota": rota, **dict(zip(COUNTER_COLUMNS, values))}
+            for (g, inicio, rota), values in pending.items()
+        ]
+        try:
+            conn.execute(stmt, rows)
+        except SQLAlchemyError as exc:
+            self._stats["failed"] += 1
+            self._consecutive_failures += 1
+            self._last_error = str(exc).splitlines()[0]
+            if self._consecutive_failures < MAX_FLUSH_FAILURES:
+                self._restore(pending)
+            else:
+                self._stats["discarded"] += len(pending)
+                self._consecutive_failures = 0
+            logger.warning("[FAIFApi] falha ao gravar os agregados de tráfego: %s", self._last_error)
+            return 0
+        self._consecutive_failures = 0
+        self._stats["flushes"] += 1
+        self._stats["rows_upserted"] += len(rows)
+        return len(rows)
+
+    def _restore(self, pending: Dict[Tuple[str, datetime, str], List[int]]) -> None:
+        with self._lock:
+            for key, values in pending.items():
+                acc = self._pending.get(key)
+                if acc is None:
+                    self._pending[key] = values
+                else:
+                    for i, value in enumerate(values):
+                        acc[i] += value
+
+    @staticmethod
+    def _upsert(dialect: str) -> Any:
+        table = HistoricoRollup.__table__
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return None
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.granularidade, table.c.rota, table.c.inicio],
+            set_={c: table.c[c] + stmt.excluded[c] for c in COUNTER_COLUMNS},
+        )
+
+    def cleanup(self, conn, now: Optional[datetime] = None) -> int:
+        """Apaga os agregados que passaram da retenção. Devolve as linhas apagadas."""
+        now = now or datetime.now(timezone.utc)
+        table = HistoricoRollup.__table__
+        removed = 0
+        for granularidade, days in (("minuto", self.minute_retention_days), ("hora", self.hour_retention_days)):
+            if days > 0:
+                result = conn.execute(delete(table).where(
+                    table.c.granularidade == granularidade,
+                    table.c.inicio < now - timedelta(days=days),
+                ))
+                removed += result.rowcount or 0
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "last_error": self._last_error,
+            **self._stats,
+        }
+
+
+traffic_rollups = TrafficRollups()
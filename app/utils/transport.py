@@ -0,0 +1,205 @@
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import logging
+import os
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+# ---------------------------------------------------------------------------
+# Transporte HTTP com pools de conexão por upstream
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Valores usados quando o host não tem configuração própria em HTTP_POOLS
+DEFAULT_POOL_SETTINGS: Dict[str, Any] = {
+    "pool_maxsize": 10,
+    "pool_block": False,
+    "connect_timeout": 3.05,
+    "read_timeout": float(os.getenv("FAIF_HTTP_TIMEOUT", "10")),
+    "keepalive": True,
+    "keepalive_idle": 60,
+}
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def _keepalive_socket_options(idle: Optional[int]) -> list:
+    """Opções de socket para manter conexões ociosas vivas (TCP keep-alive)."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if idle and hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(idle)))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(idle) // 4)))
+    return options
+
+
+class _UpstreamAdapter(HTTPAdapter):
+    """HTTPAdapter com opções de keep-alive aplicadas aos sockets do pool."""
+
+    def __init__(self, *, socket_options: Optional[list] = None, **kwargs: Any) -> None:
+        self._socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self._socket_options is not None:
+            pool_kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+
+class Transport:
+    """
+    Mantém um adapter (pool de conexões urllib3) por host upstream e uma
+    `requests.Session` por thread montada sobre esses adapters.
+
+    Os pools são compartilhados entre threads (urllib3 é thread-safe); a Session
+    é por thread porque o estado dela (cookies, adapters montados) não é.
+    Depois de um fork os pools herdados são descartados sem fechar os sockets,
+    que continuam pertencendo ao processo pai.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._defaults: Dict[str, Any] = dict(DEFAULT_POOL_SETTINGS)
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._generation = 0
+        self._pid = os.getpid()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app) -> None:
+        self.configure(app.config.get("HTTP_POOL_DEFAULTS"), app.config.get("HTTP_POOLS"))
+        app.extensions["faif_transport"] = self
+
+    def configure(
+        self,
+        defaults: Optional[Dict[str, Any]] = None,
+        hosts: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        with self._lock:
+            self._defaults = {**DEFAULT_POOL_SETTINGS, **(defaults or {})}
+            self._hosts = {h.lower(): dict(s) for h, s in (hosts or {}).items()}
+            self._drop_adapters(close=True)
+
+    def settings_for(self, host: str) -> Dict[str, Any]:
+        return {**self._defaults, **self._hosts.get(host.lower(), {})}
+
+    def timeout_for(self, host: str, override: Optional[float] = None) -> Tuple[float, float]:
+        settings = self.settings_for(host)
+        read = override if override is not None else settings["read_timeout"]
+        return (settings["connect_timeout"], read)
+
+    # -- ciclo de vida -------------------------------------------------------
+
+    def _drop_adapters(self, *, close: bool) -> None:
+        if close:
+            for adapter in self._adapters.values():
+                try:
+                    adapter.close()
+                except Exception:
+                    logger.debug("[FAIFApi] falha ao fechar adapter", exc_info=True)
+        self._adapters = {}
+        self._generation += 1
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._drop_adapters(close=False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop_adapters(close=True)
+
+    # -- pools e sessões -----------------------------------------------------
+
+    def _adapter_for(self, host: str) -> HTTPAdapter:
+        adapter = self._adapters.get(host)
+        if adapter is not None:
+            return adapter
+        with self._lock:
+            adapter = self._adapters.get(host)
+            if adapter is None:
+                settings = self.settings_for(host)
+                socket_options = (
+                    _keepalive_socket_options(settings.get("keepalive_idle"))
+                    if settings.get("keepalive")
+                    else None
+                )
+                adapter = _UpstreamAdapter(
+                    pool_connections=1,
+                    pool_maxsize=int(settings["pool_maxsize"]),
+                    pool_block=bool(settings["pool_block"]),
+                    max_retries=0,
+                    socket_options=socket_options,
+                )
+                self._adapters[host] = adapter
+                logger.info(
+                    "[FAIFApi] pool criado para %s (maxsize=%s, block=%s)",
+                    host, settings["pool_maxsize"], settings["pool_block"],
+                )
+        return adapter
+
+    def _session(self) -> requests.Session:
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        local = self._local
+        session = getattr(local, "session", None)
+        if session is None or local.generation != self._generation:
+            session = requests.Session()
+            local.session = session
+            local.generation = self._generation
+            local.mounted = set()
+        return session
+
+    def get(
+        self,
+        url: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> requests.Response:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        session = self._session()
+        prefix = f"{parts.scheme}://{parts.netloc}/"
+        if prefix not in self._local.mounted:
+            session.mount(prefix, self._adapter_for(host))
+            self._local.mounted.add(prefix)
+        return session.get(url, headers=headers, params=params, timeout=self.timeout_for(host, timeout))
+
+    # -- observabilidade -----------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Uso dos pools por host: conexões criadas, em uso, ociosas e requisições."""
+        out: Dict[str, Any] = {}
+        for host, adapter in list(self._adapters.items()):
+            settings = self.settings_for(host)
+            host_stats = {
+                "maxsize": settings["pool_maxsize"],
+                "connections_created": 0,
+                "in_use": 0,
+                "idle": 0,
+                "requests": 0,
+            }
+            for pool_key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(pool_key)
+                if pool is None or pool.pool is None:
+                    continue
+                queued = list(pool.pool.queue)
+                host_stats["connections_created"] += pool.num_connections
+                host_stats["requests"] += pool.num_requests
+                host_stats["idle"] += sum(1 for conn in queued if conn is not None)
+                host_stats["in_use"] += max(0, pool.pool.maxsize - len(queued))
+            out[host] = host_stats
+        return out
+
+
+transport = Transport()
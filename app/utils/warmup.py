@@ -0,0 +1,228 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+from ..models import Historico
+from .cache import response_cache
+from .dispatch import BULK_PATH_PREFIXES, internal_get, is_bulk_route
+from .exceptions import err
+from .fetch import refresh_ahead
+from .ratelimit import MemoryBucketBackend
+from .singleflight import upstream_flights
+
+# ---------------------------------------------------------------------------
+# Aquecimento do cache a partir do histórico e atualização antecipada
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Rotas que não passam pelos upstreams (ou que agregam outras) não são aquecidas
+WARMUP_EXCLUDED_PREFIXES = ("/faif/batch", "/faif/historico", "/health") + BULK_PATH_PREFIXES
+
+# Marca do request_logger para valores cortados; a query original se perdeu
+TRUNCATED_MARK = "...(truncated)"
+
+
+class CacheWarmer:
+    """
+    Aquece o cache de respostas em segundo plano, em dois momentos:
+
+    - na subida do processo, lê as últimas WARMUP_HISTORY_ROWS linhas do
+      `historico`, escolhe as WARMUP_TOP_KEYS consultas GET bem-sucedidas mais
+      frequentes e as executa pelas próprias rotas (mesmas chaves de cache);
+    - a cada WARMUP_INTERVAL segundos, atualiza as entradas que expiram nos
+      próximos WARMUP_REFRESH_AHEAD segundos e que foram lidas ao menos
+      WARMUP_MIN_HITS vezes, antes que um cliente pague a ida ao upstream.
+
+    As chamadas são sequenciais, limitadas a WARMUP_BUDGET_PER_MINUTE, e ficam
+    em espera enquanto houver WARMUP_MAX_LIVE_IN_FLIGHT ou mais chamadas de
+    clientes em andamento, para não disputar os upstreams com o tráfego real.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.delay = 5.0
+        self.history_rows = 5000
+        self.top_keys = 200
+        self.budget_per_minute = 60.0
+        self.refresh_window = 60.0
+        self.min_hits = 3
+        self.interval = 15.0
+        self.max_live_in_flight = 8
+        self._app: Any = None
+        self._budget = MemoryBucketBackend()
+        self._stop = threading.Event()
+        self._pid: Optional[int] = None
+        self._stats = {"warmed": 0, "refreshed": 0, "failed": 0, "waits_for_traffic": 0}
+        self._last_warmup: Optional[float] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def init_app(self, app) -> None:
+        self.enabled = bool(app.config.get("WARMUP_ENABLED", False))
+        self.delay = float(app.config.get("WARMUP_DELAY", self.delay))
+        self.history_rows = int(app.config.get("WARMUP_HISTORY_ROWS", self.history_rows))
+        self.top_keys = int(app.config.get("WARMUP_TOP_KEYS", self.top_keys))
+        self.budget_per_minute = float(app.config.get("WARMUP_BUDGET_PER_MINUTE", self.budget_per_minute))
+        self.refresh_window = float(app.config.get("WARMUP_REFRESH_AHEAD", self.refresh_window))
+        self.min_hits = int(app.config.get("WARMUP_MIN_HITS", self.min_hits))
+        self.interval = float(app.config.get("WARMUP_INTERVAL", self.interval))
+        self.max_live_in_flight = int(app.config.get("WARMUP_MAX_LIVE_IN_FLIGHT", self.max_live_in_flight))
+        self._app = app
+        app.extensions["faif_warmup"] = self
+        if self.enabled:
+            self.start()
+
+    # -- ciclo de vida -------------------------------------------------------
+
+    def start(self) -> None:
+        """Sobe a thread do processo atual (uma por processo)."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="faif-warmup", daemon=True).start()
+
+    def _restart_after_fork(self) -> None:
+        # a thread do processo pai não existe no filho; cada worker aquece o seu cache
+        self._pid = None
+        if self.enabled and self._app is not None:
+            self.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pid = None
+
+    def _run(self) -> None:
+        if self._stop.wait(self.delay):
+            return
+        try:
+            self.warm_from_history()
+        except Exception:
+            logger.exception("[FAIFApi] aquecimento do cache falhou")
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_expiring()
+            except Exception:
+                logger.exception("[FAIFApi] atualização antecipada do cache falhou")
+
+    # -- orçamento -----------------------------------------------------------
+
+    def _acquire(self) -> bool:
+        """Espera uma ficha do orçamento e uma folga no tráfego real. False se parou."""
+        rate = self.budget_per_minute / 60.0
+        while True:
+            wait = self._budget.take("warmup", rate, 1.0) if rate > 0 else self.interval
+            if wait <= 0:
+                break
+            if self._stop.wait(wait):
+                return False
+        while upstream_flights.stats()["in_flight"] >= self.max_live_in_flight:
+            self._stats["waits_for_traffic"] += 1
+            if self._stop.wait(1.0):
+                return False
+        return True
+
+    # -- aquecimento pelo histórico -------------------------------------------
+
+    def hot_keys(self) -> List[Tuple[str, str]]:
+        """(path, query canônica) das consultas mais frequentes no histórico recente."""
+        stmt = (
+            select(Historico.endpoint, Historico.parametros)
+            .order_by(Historico.data_hora.desc(), Historico.id.desc())
+            .limit(self.history_rows)
+        )
+        counts: Counter = Counter()
+        with self._app.app_context():
+            rows = db.session.execute(stmt).all()
+            db.session.remove()
+        for endpoint, parametros in rows:
+            key = _history_key(endpoint, parametros)
+            if key is not None:
+                counts[key] += 1
+        return [key for key, _ in counts.most_common(self.top_keys)]
+
+    def warm_from_history(self) -> int:
+        """Executa as consultas mais frequentes do histórico. Devolve quantas deram 200."""
+        try:
+            keys = self.hot_keys()
+        except SQLAlchemyError as exc:
+            logger.warning("[FAIFApi] aquecimento do cache: histórico indisponível: %s", exc)
+            return 0
+        started = time.monotonic()
+        warmed = 0
+        for path, query in keys:
+            if not self._acquire():
+                break
+            status, _ = internal_get(self._app, path, query, purpose="warmup")
+            if status == 200:
+                warmed += 1
+            else:
+                self._stats["failed"] += 1
+        self._stats["warmed"] += warmed
+        self._last_warmup = time.time()
+        logger.info(
+            "[FAIFApi] cache aquecido: %d de %d consultas do histórico em %.1fs",
+            warmed, len(keys), time.monotonic() - started,
+        )
+        return warmed
+
+    # -- atualização antecipada ----------------------------------------------
+
+    def refresh_expiring(self) -> int:
+        """Atualiza as entradas quentes que estão para expirar. Devolve quantas."""
+        refreshed = 0
+        for key, entry in response_cache.expiring(self.refresh_window, self.min_hits):
+            if not entry.is_fresh():
+                continue  # expirou enquanto esperava; o próximo cliente revalida
+            if not self._acquire():
+                break
+            try:
+                with self._app.app_context():
+                    if refresh_ahead(key, entry):
+                        refreshed += 1
+            except err as exc:
+                self._stats["failed"] += 1
+                logger.info("[FAIFApi] atualização antecipada falhou para %s: %s", key, exc)
+        self._stats["refreshed"] += refreshed
+        return refreshed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "budget_per_minute": self.budget_per_minute,
+            "last_warmup": self._last_warmup,
+            **self._stats,
+        }
+
+
+def _history_key(endpoint: Optional[str], parametros: Any) -> Optional[Tuple[str, str]]:
+    """Chave (path, query canônica) de uma linha do histórico, se ela for aquecível."""
+    if not endpoint or not endpoint.startswith("/faif/") or endpoint.startswith(WARMUP_EXCLUDED_PREFIXES):
+        return None
+    if not isinstance(parametros, dict):
+        return None
+    if parametros.get("method") != "GET" or parametros.get("status_code") != 200:
+        return None
+    query = parametros.get("query") or {}
+    if not isinstance(query, dict):
+        return None
+    pairs = []
+    for name, value in query.items():
+        if not isinstance(value, str) or value.endswith(TRUNCATED_MARK):
+            return None
+        pairs.append((name, value))
+    if is_bulk_route(endpoint, pairs):
+        return None
+    return endpoint, urlencode(sorted(pairs))
+
+
+cache_warmer = CacheWarmer()
@@ -0,0 +1,134 @@
+"""
+Compara os providers JSON (stdlib x orjson) nos formatos reais das respostas
+do FAIF e confere que os dois produzem os mesmos bytes.
+
+O orjson só entra com JSON_ENSURE_ASCII desligado: com o padrão
+FAIF_JSON_ENSURE_ASCII=1 as respostas saem sempre pela stdlib, e o provider
+nativo não muda nada no deploy padrão. As linhas "ascii=sim" medem só a stdlib.
+
+Uso: python benchmarks/json_providers.py [repetições]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.utils.jsonprovider import FastJSONProvider, orjson  # noqa: E402
+
+
+def emendas_page():
+    return [
+        {
+            "codigoEmenda": f"2023{i:08d}",
+            "ano": 2023,
+            "tipoEmenda": "Emenda Individual - Transferências com Finalidade Definida",
+            "autor": "JOÃO DA CONCEIÇÃO",
+            "nomeAutor": "JOÃO DA CONCEIÇÃO",
+            "numeroEmenda": f"{i:04d}",
+            "localidadeDoGasto": "SÃO JOSÉ DOS PINHAIS - PR",
+            "funcao": "Saúde",
+            "subfuncao": "Atenção Básica",
+            "valorEmpenhado": "1.250.000,00",
+            "valorLiquidado": "987.654,32",
+            "valorPago": "987.654,32",
+            "valorRestoInscrito": "0,00",
+            "valorRestoCancelado": "0,00",
+            "valorRestoPago": "0,00",
+        }
+        for i in range(15)
+    ]
+
+
+def ibge_pesquisas():
+    return [
+        {
+            "id": str(i),
+            "nome": f"Pesquisa Nacional por Amostra de Domicílios {i}",
+            "codigo": f"P{i:03d}",
+            "periodos": [
+                {"frequencia": "anual", "literals": [str(ano)], "dataInicio": f"{ano}-01-01", "dataFim": f"{ano}-12-31"}
+                for ano in range(2000, 2024)
+            ],
+        }
+        for i in range(300)
+    ]
+
+
+def cnpj_record():
+    return {
+        "cnpj": "19131243000197",
+        "razao_social": "OPEN KNOWLEDGE BRASIL",
+        "nome_fantasia": "REDE PELO CONHECIMENTO LIVRE",
+        "descricao_situacao_cadastral": "ATIVA",
+        "capital_social": 0,
+        "municipio": "SÃO PAULO",
+        "uf": "SP",
+        "cnae_fiscal_descricao": "Atividades de associações de defesa de direitos sociais",
+        "qsa": [
+            {
+                "nome_socio": f"SÓCIO NÚMERO {i}",
+                "qualificacao_socio": "Diretor",
+                "data_entrada_sociedade": "2019-10-25",
+                "faixa_etaria": "Entre 31 a 40 anos",
+                "identificador_de_socio": 2,
+            }
+            for i in range(40)
+        ],
+        "cnaes_secundarios": [
+            {"codigo": 9493600 + i, "descricao": f"Atividades de organizações associativas ligadas à cultura e à arte {i}"}
+            for i in range(60)
+        ],
+    }
+
+
+SHAPES = {
+    "emendas": lambda: {"ok": True, "data": emendas_page()},
+    "ibge": lambda: {"ok": True, "data": ibge_pesquisas()},
+    "cnpj": lambda: {"ok": True, "data": cnpj_record()},
+    "erro": lambda: {"ok": False, "error": {"code": "CEP_NOT_FOUND", "message": "CEP não encontrado.", "details": None}},
+}
+
+
+def _provider(app, *, ensure_ascii: bool, native: bool) -> FastJSONProvider:
+    # o provider decide no __init__ se usa o orjson, a partir da config do app
+    app.config["JSON_ENSURE_ASCII"] = ensure_ascii
+    return FastJSONProvider(app, native=native)
+
+
+def main(number: int) -> None:
+    app = create_app()
+    original = app.config.get("JSON_ENSURE_ASCII", True)
+    if orjson is None:
+        print("orjson não está instalado; só o provider da stdlib será medido")
+    # Com ensure_ascii ligado (o padrão, FAIF_JSON_ENSURE_ASCII=1) o provider
+    # nunca usa o orjson: só existe a linha da stdlib para comparar.
+    print("ascii=sim: só stdlib (o orjson só é usado com FAIF_JSON_ENSURE_ASCII=0)")
+
+    print(f"{'formato':<10} {'ascii':<6} {'provider':<8} {'bytes':>9} {'µs/resposta':>12}")
+    try:
+        with app.app_context():
+            for shape, build in SHAPES.items():
+                obj = build()
+                for ensure_ascii in (True, False):
+                    outputs = {}
+                    for native in (False, True):
+                        provider = _provider(app, ensure_ascii=ensure_ascii, native=native)
+                        name = "orjson" if provider.native else "stdlib"
+                        if name in outputs:
+                            continue
+                        outputs[name] = provider.response(obj).get_data()
+                        seconds = timeit.timeit(lambda: provider.response(obj), number=number)
+                        print(
+                            f"{shape:<10} {'sim' if ensure_ascii else 'não':<6} {name:<8} "
+                            f"{len(outputs[name]):>9} {seconds / number * 1e6:>12.1f}"
+                        )
+                    if len(set(outputs.values())) > 1:
+                        print(f"  !! saídas diferentes para {shape}")
+    finally:
+        app.config["JSON_ENSURE_ASCII"] = original
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -3,6 +3,11 @@ import os
 class Config:
     APP_VERSION = os.getenv("APP_VERSION", "dev")
     JSON_SORT_KEYS = False
+    # Encoder das respostas: "auto" (orjson se instalado), "orjson" ou "stdlib"
+    JSON_PROVIDER = os.getenv("FAIF_JSON_PROVIDER", "auto")
+    # "0" envia texto não-ASCII em UTF-8 em vez de escapado (\u00e3); o orjson
+    # só é usado com "0" (NaN/Infinity saem como null no caminho nativo)
+    JSON_ENSURE_ASCII = os.getenv("FAIF_JSON_ENSURE_ASCII", "1") == "1"
     PROPAGATE_EXCEPTIONS = False
     
     SQLALCHEMY_DATABASE_URI = os.getenv(
@@ -11,4 +16,199 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    TOKEN_PORTAL = os.getenv("TOKEN_PORTAL", "d1b5fac8951a331b63047753f1eaa2fb")
\ No newline at end of file
+    TOKEN_PORTAL = os.getenv("TOKEN_PORTAL", "d1b5fac8951a331b63047753f1eaa2fb")
+    # Tokens extras do Portal (separados por vírgula) para somar vazão
+    TOKENS_PORTAL = [TOKEN_PORTAL] + [t.strip() for t in os.getenv("TOKENS_PORTAL", "").split(",") if t.strip()]
+
+    # --- Transporte HTTP (um pool de conexões por upstream) ---
+    # Valores padrão; cada host em HTTP_POOLS sobrescreve apenas o que precisar.
+    HTTP_POOL_DEFAULTS = {
+        "pool_maxsize": 10,           # conexões mantidas abertas por host
+        "pool_block": False,          # True: espera conexão livre em vez de abrir uma extra
+        "connect_timeout": 3.05,
+        "read_timeout": float(os.getenv("FAIF_HTTP_TIMEOUT", "10")),
+        "keepalive": True,
+        "keepalive_idle": 60,         # segundos até o primeiro probe TCP keep-alive
+    }
+    HTTP_POOLS = {
+        "brasilapi.com.br": {"pool_maxsize": 20},
+        "api.portaldatransparencia.gov.br": {"pool_maxsize": 10, "read_timeout": 15},
+        "dadosabertos.camara.leg.br": {"pool_maxsize": 10},
+        "servicodados.ibge.gov.br": {"pool_maxsize": 4, "read_timeout": 20},
+        "www.servicos.gov.br": {"pool_maxsize": 4},
+    }
+
+    # --- Cache de respostas dos upstreams (em memória, TTL + LRU) ---
+    CACHE_ENABLED = os.getenv("FAIF_CACHE_ENABLED", "1") == "1"
+    CACHE_MAX_BYTES = int(os.getenv("FAIF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Depois do TTL: janela em que a entrada expirada é servida enquanto revalida
+    # em segundo plano, e janela em que ela cobre falhas do upstream (segundos).
+    # Cada política pode sobrescrever com "stale_while_revalidate"/"stale_if_error".
+    CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("FAIF_CACHE_STALE_WHILE_REVALIDATE", "300"))
+    CACHE_STALE_IF_ERROR = int(os.getenv("FAIF_CACHE_STALE_IF_ERROR", str(6 * 3600)))
+    # TTL em segundos por política; cada blueprint escolhe a sua em fetch_json
+    CACHE_POLICIES = {
+        "cep": {"ttl": 6 * 3600},
+        "cnpj": {"ttl": 6 * 3600},
+        "deputados": {"ttl": 3600},
+        "ibge": {"ttl": 12 * 3600},
+        "servicos": {"ttl": 3600},
+        "emendas": {"ttl": 300, "stale_while_revalidate": 60},
+        # páginas lidas pela exportação: passam uma vez só, fora dos caches
+        "emendas_export": {"ttl": 0},
+        "pessoa_fisica": {"ttl": 600},
+        "servidores": {"ttl": 600},
+    }
+
+    # --- Cache L2 no PostgreSQL (tabela upstream_cache), compartilhado entre nós ---
+    # Consultado depois de uma falta no cache em memória. Sem URL própria usa o
+    # mesmo banco da aplicação. Invalidações chegam aos outros nós via NOTIFY.
+    CACHE_L2_ENABLED = os.getenv("FAIF_CACHE_L2_ENABLED", "0") == "1"
+    CACHE_L2_DATABASE_URL = os.getenv("FAIF_CACHE_L2_DATABASE_URL")
+    CACHE_L2_CLEANUP_INTERVAL = int(os.getenv("FAIF_CACHE_L2_CLEANUP_INTERVAL", "60"))   # segundos
+    CACHE_L2_CLEANUP_BATCH = int(os.getenv("FAIF_CACHE_L2_CLEANUP_BATCH", "500"))       # linhas por DELETE
+    CACHE_L2_RETRY_AFTER = int(os.getenv("FAIF_CACHE_L2_RETRY_AFTER", "30"))            # pausa após erro do banco
+
+    # --- Circuit breaker por upstream ---
+    # Abre quando a taxa de erro/timeout na janela passa do limite; aberto, o
+    # fetch_json falha na hora com UPSTREAM_CIRCUIT_OPEN (503).
+    CIRCUIT_BREAKER_ENABLED = os.getenv("FAIF_CIRCUIT_BREAKER_ENABLED", "1") == "1"
+    CIRCUIT_BREAKER_DEFAULTS = {
+        "window_seconds": 30,
+        "min_calls": 10,
+        "error_rate": 0.5,
+        "timeout_rate": 0.3,
+        "open_seconds": 15,
+        "half_open_max_calls": 1,
+    }
+    CIRCUIT_BREAKERS = {
+        "api.portaldatransparencia.gov.br": {"timeout_rate": 0.2, "open_seconds": 30},
+    }
+
+    # --- Retentativas e hedging por upstream (apenas GET) ---
+    # Backoff exponencial com jitter dentro de um deadline total; "hedge_percentile"
+    # dispara uma segunda requisição idêntica se a primeira passar desse percentil
+    # de latência, e a primeira resposta vence.
+    RETRY_ENABLED = os.getenv("FAIF_RETRY_ENABLED", "1") == "1"
+    RETRY_DEFAULTS = {
+        "max_attempts": 3,
+        "base_delay": 0.1,
+        "max_delay": 1.0,
+        "deadline": 12.0,
+        "retry_statuses": (429, 502, 503, 504),
+        "hedge_percentile": None,
+        "hedge_min_samples": 20,
+        "hedge_max_delay": 2.0,
+    }
+    RETRY_POLICIES = {
+        "brasilapi.com.br": {"hedge_percentile": 0.95},
+        # cada tentativa consome a cota do token no Portal
+        "api.portaldatransparencia.gov.br": {"max_attempts": 2, "deadline": 20.0},
+        "servicodados.ibge.gov.br": {"deadline": 25.0},
+    }
+
+    # --- Cota dos upstreams (token bucket por host e credencial) ---
+    # "memory" (por processo) ou "sqlite:///caminho/arquivo.db" (compartilhado
+    # entre os processos da máquina). Sem ficha, a requisição espera até
+    # "max_wait" (ou o que resta do "deadline" de RETRY_DEFAULTS, se menor)
+    # antes de falhar com UPSTREAM_RATE_LIMITED (503).
+    RATE_LIMIT_BACKEND = os.getenv("FAIF_RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMITS = {
+        # o Portal limita cada token a 90 requisições/minuto no horário comercial
+        "api.portaldatransparencia.gov.br": {
+            "rate": 1.5,
+            "burst": 10,
+            "max_wait": 3.0,
+            "credential_header": "chave-api-dados",
+            "credentials": TOKENS_PORTAL,
+        },
+    }
+
+    # --- Compressão das respostas (gzip; brotli se o pacote estiver instalado) ---
+    COMPRESSION_ENABLED = os.getenv("FAIF_COMPRESSION_ENABLED", "1") == "1"
+    COMPRESSION_MIN_SIZE = int(os.getenv("FAIF_COMPRESSION_MIN_SIZE", "1024"))   # bytes
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("FAIF_COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("FAIF_COMPRESSION_BROTLI_QUALITY", "5"))
+
+    # --- Lote de consultas (POST /faif/batch) ---
+    BATCH_MAX_ITEMS = int(os.getenv("FAIF_BATCH_MAX_ITEMS", "500"))
+    # sub-requisições executadas ao mesmo tempo, somando todos os lotes do processo
+    BATCH_CONCURRENCY = int(os.getenv("FAIF_BATCH_CONCURRENCY", "16"))
+
+    # --- Aquecimento do cache (histórico na subida + atualização antecipada) ---
+    WARMUP_ENABLED = os.getenv("FAIF_WARMUP_ENABLED", "0") == "1"
+    WARMUP_DELAY = float(os.getenv("FAIF_WARMUP_DELAY", "5"))                     # segundos após a subida
+    WARMUP_HISTORY_ROWS = int(os.getenv("FAIF_WARMUP_HISTORY_ROWS", "5000"))
+    WARMUP_TOP_KEYS = int(os.getenv("FAIF_WARMUP_TOP_KEYS", "200"))
+    # chamadas do aquecimento por minuto, somando subida e atualização antecipada
+    WARMUP_BUDGET_PER_MINUTE = float(os.getenv("FAIF_WARMUP_BUDGET_PER_MINUTE", "60"))
+    WARMUP_REFRESH_AHEAD = float(os.getenv("FAIF_WARMUP_REFRESH_AHEAD", "60"))    # segundos antes de expirar
+    WARMUP_MIN_HITS = int(os.getenv("FAIF_WARMUP_MIN_HITS", "3"))
+    WARMUP_INTERVAL = float(os.getenv("FAIF_WARMUP_INTERVAL", "15"))
+    # com tantas chamadas de clientes em andamento, o aquecimento espera
+    WARMUP_MAX_LIVE_IN_FLIGHT = int(os.getenv("FAIF_WARMUP_MAX_LIVE_IN_FLIGHT", "8"))
+
+    # --- Exportação de emendas (GET /faif/transparencia/emendas/export) ---
+    EMENDAS_EXPORT_MAX_PAGES = int(os.getenv("FAIF_EMENDAS_EXPORT_MAX_PAGES", "500"))
+    # páginas buscadas à frente da que está sendo enviada
+    EMENDAS_EXPORT_PREFETCH = int(os.getenv("FAIF_EMENDAS_EXPORT_PREFETCH", "4"))
+    EMENDAS_EXPORT_PAGE_TIMEOUT = float(os.getenv("FAIF_EMENDAS_EXPORT_PAGE_TIMEOUT", "60"))   # segundos
+
+    # --- Varredura de servidores (GET /faif/transparencia/servidores?varredura=1) ---
+    SERVIDORES_SCAN_MAX_RESULTS = int(os.getenv("FAIF_SERVIDORES_SCAN_MAX_RESULTS", "100"))
+    SERVIDORES_SCAN_MAX_PAGES = int(os.getenv("FAIF_SERVIDORES_SCAN_MAX_PAGES", "20"))        # por chamada
+    SERVIDORES_SCAN_CONCURRENCY = int(os.getenv("FAIF_SERVIDORES_SCAN_CONCURRENCY", "4"))
+    SERVIDORES_SCAN_TIME_BUDGET = float(os.getenv("FAIF_SERVIDORES_SCAN_TIME_BUDGET", "10"))  # segundos
+
+    # --- Lista local de deputados (busca por nome sem ir à API da Câmara) ---
+    DEPUTADOS_ROSTER_ENABLED = os.getenv("FAIF_DEPUTADOS_ROSTER_ENABLED", "1") == "1"
+    DEPUTADOS_ROSTER_REFRESH = float(os.getenv("FAIF_DEPUTADOS_ROSTER_REFRESH", "21600"))       # segundos
+    # depois de uma carga inicial sem sucesso, quanto esperar antes de tentar de novo
+    DEPUTADOS_ROSTER_RETRY_AFTER = float(os.getenv("FAIF_DEPUTADOS_ROSTER_RETRY_AFTER", "60"))
+
+    # --- Cópia local dos metadados do IBGE (busca e paginação em GET /faif/ibge) ---
+    IBGE_INDEX_ENABLED = os.getenv("FAIF_IBGE_INDEX_ENABLED", "1") == "1"
+    IBGE_INDEX_REFRESH = float(os.getenv("FAIF_IBGE_INDEX_REFRESH", "21600"))          # segundos
+    IBGE_INDEX_RETRY_AFTER = float(os.getenv("FAIF_IBGE_INDEX_RETRY_AFTER", "60"))
+    IBGE_INDEX_MAX_LIMIT = int(os.getenv("FAIF_IBGE_INDEX_MAX_LIMIT", "100"))           # itens por página
+
+    # --- Gravação do histórico (fila em memória + INSERT em lotes) ---
+    HISTORY_ASYNC = os.getenv("FAIF_HISTORY_ASYNC", "1") == "1"        # "0" grava na própria requisição
+    HISTORY_QUEUE_SIZE = int(os.getenv("FAIF_HISTORY_QUEUE_SIZE", "10000"))
+    HISTORY_BATCH_SIZE = int(os.getenv("FAIF_HISTORY_BATCH_SIZE", "500"))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv("FAIF_HISTORY_FLUSH_INTERVAL", "1"))       # segundos
+    # fila cheia: "drop" descarta na hora; "block" espera HISTORY_BLOCK_TIMEOUT e então descarta
+    HISTORY_OVERFLOW = os.getenv("FAIF_HISTORY_OVERFLOW", "drop")
+    HISTORY_BLOCK_TIMEOUT = float(os.getenv("FAIF_HISTORY_BLOCK_TIMEOUT", "0.05"))
+    HISTORY_SHUTDOWN_TIMEOUT = float(os.getenv("FAIF_HISTORY_SHUTDOWN_TIMEOUT", "5"))
+
+    # --- Partições diárias do histórico (PostgreSQL) e consulta paginada ---
+    HISTORY_PARTITION_MAINTENANCE = os.getenv("FAIF_HISTORY_PARTITION_MAINTENANCE", "1") == "1"
+    HISTORY_RETENTION_DAYS = int(os.getenv("FAIF_HISTORY_RETENTION_DAYS", "90"))      # 0 guarda tudo
+    HISTORY_PARTITION_PREMAKE_DAYS = int(os.getenv("FAIF_HISTORY_PARTITION_PREMAKE_DAYS", "7"))
+    HISTORY_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("FAIF_HISTORY_PARTITION_MAINTENANCE_INTERVAL", "3600"))
+    HISTORICO_MAX_LIMIT = int(os.getenv("FAIF_HISTORICO_MAX_LIMIT", "1000"))           # linhas por página
+
+    # --- Registro das requisições no histórico (amostrado) ---
+    REQUEST_LOG_ENABLED = os.getenv("FAIF_REQUEST_LOG_ENABLED", "1") == "1"
+    # fração das requisições gravadas no histórico, sorteada na entrada (1 = todas)
+    REQUEST_LOG_SAMPLE_RATE = float(os.getenv("FAIF_REQUEST_LOG_SAMPLE_RATE", "0.1"))
+    # sempre gravadas, mesmo fora da amostra: status a partir deste e requisições lentas
+    REQUEST_LOG_ERROR_STATUS = int(os.getenv("FAIF_REQUEST_LOG_ERROR_STATUS", "500"))
+    REQUEST_LOG_SLOW_MS = float(os.getenv("FAIF_REQUEST_LOG_SLOW_MS", "1000"))
+    REQUEST_LOG_BODY_MAX_BYTES = int(os.getenv("FAIF_REQUEST_LOG_BODY_MAX_BYTES", "1024"))
+    # passado disso (ms) dentro do logger, os corpos não são capturados
+    REQUEST_LOG_BUDGET_MS = float(os.getenv("FAIF_REQUEST_LOG_BUDGET_MS", "1"))
+
+    # --- Métricas no formato do Prometheus (GET /metrics) ---
+    METRICS_ENABLED = os.getenv("FAIF_METRICS_ENABLED", "1") == "1"
+    # diretório local (limpo na subida) onde cada worker grava suas métricas; vazio = só o processo
+    METRICS_DIR = os.getenv("FAIF_METRICS_DIR", "")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("FAIF_METRICS_FLUSH_INTERVAL", "5"))       # segundos
+
+    # --- Agregados de tráfego e latência (GET /faif/historico/agregados) ---
+    ROLLUPS_ENABLED = os.getenv("FAIF_ROLLUPS_ENABLED", "1") == "1"
+    ROLLUP_MINUTE_RETENTION_DAYS = int(os.getenv("FAIF_ROLLUP_MINUTE_RETENTION_DAYS", "14"))   # 0 guarda tudo
+    ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv("FAIF_ROLLUP_HOUR_RETENTION_DAYS", "400"))
+    # períodos por consulta sem `resumo=1` (10080 = uma semana por minuto)
+    ROLLUPS_MAX_PERIODS = int(os.getenv("FAIF_ROLLUPS_MAX_PERIODS", "10080"))
@@ -0,0 +1,39 @@
+"""tabela upstream_cache (cache L2 das respostas dos upstreams)
+
+Revision ID: 29fc6035edc7
+Revises: c7f2aaed11de
+Create Date: 2026-10-16 10:47:03.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '29fc6035edc7'
+down_revision = 'c7f2aaed11de'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upstream_cache',
+    sa.Column('key_hash', sa.String(length=64), nullable=False),
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('body', sa.LargeBinary(), nullable=False),
+    sa.Column('etag', sa.String(length=255), nullable=True),
+    sa.Column('last_modified', sa.String(length=64), nullable=True),
+    sa.Column('stored_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('retain_until', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key_hash')
+    )
+    with op.batch_alter_table('upstream_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upstream_cache_retain_until'), ['retain_until'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upstream_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upstream_cache_retain_until'))
+
+    op.drop_table('upstream_cache')
@@ -0,0 +1,117 @@
+"""historico particionado por dia, com índices de tempo e endpoint
+
+Revision ID: 5b1e9d04a3c2
+Revises: 29fc6035edc7
+Create Date: 2026-10-16 15:20:11.402387
+
+No PostgreSQL a tabela é recriada particionada por intervalo de `data_hora`
+(uma partição por dia, em UTC, chamada historico_pAAAAMMDD). As partições
+que cobrem as linhas existentes e os próximos dias são criadas aqui; depois
+disso, `history_partitions` (app/utils/history_partitions.py) cria as
+partições futuras e apaga as que passaram da retenção. A chave primária
+passa a ser (id, data_hora), exigência do particionamento.
+
+Em outros bancos (SQLite de desenvolvimento) só os tipos e índices mudam.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e9d04a3c2'
+down_revision = '29fc6035edc7'
+branch_labels = None
+depends_on = None
+
+# Dias de partição criados à frente de hoje (a manutenção continua daí)
+PREMAKE_DAYS = 7
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('historico', schema=None) as batch_op:
+            batch_op.alter_column('data_hora', existing_type=sa.DateTime(), type_=sa.DateTime(timezone=True),
+                                  nullable=False, existing_server_default=sa.text('now()'))
+            batch_op.create_index('ix_historico_data_hora_id', ['data_hora', 'id'], unique=False)
+            batch_op.create_index('ix_historico_endpoint_data_hora_id', ['endpoint', 'data_hora', 'id'], unique=False)
+        return
+
+    op.execute("ALTER TABLE historico RENAME TO historico_legado")
+    op.execute("ALTER TABLE historico_legado RENAME CONSTRAINT historico_pkey TO historico_legado_pkey")
+    op.execute("ALTER SEQUENCE historico_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE historico_legado ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE historico_id_seq AS bigint")
+
+    op.execute("""
+        CREATE TABLE historico (
+            id bigint NOT NULL DEFAULT nextval('historico_id_seq'),
+            endpoint varchar(255) NOT NULL,
+            parametros json,
+            ip_cliente varchar(45),
+            data_hora timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT historico_pkey PRIMARY KEY (id, data_hora)
+        ) PARTITION BY RANGE (data_hora)
+    """)
+    op.execute("CREATE INDEX ix_historico_data_hora_id ON historico (data_hora, id)")
+    op.execute("CREATE INDEX ix_historico_endpoint_data_hora_id ON historico (endpoint, data_hora, id)")
+
+    # uma partição por dia, do dia da linha mais antiga até PREMAKE_DAYS à frente
+    op.execute(f"""
+        DO $$
+        DECLARE
+            dia date;
+            ultimo date := (now() AT TIME ZONE 'UTC')::date + {PREMAKE_DAYS};
+        BEGIN
+            SELECT coalesce((min(data_hora)::timestamptz AT TIME ZONE 'UTC')::date, (now() AT TIME ZONE 'UTC')::date)
+              INTO dia FROM historico_legado;
+            WHILE dia <= ultimo LOOP
+                EXECUTE 'CREATE TABLE IF NOT EXISTS ' || quote_ident('historico_p' || to_char(dia, 'YYYYMMDD'))
+                    || ' PARTITION OF historico FOR VALUES FROM ('
+                    || quote_literal(dia::timestamp AT TIME ZONE 'UTC') || ') TO ('
+                    || quote_literal((dia + 1)::timestamp AT TIME ZONE 'UTC') || ')';
+                dia := dia + 1;
+            END LOOP;
+        END $$
+    """)
+
+    # data_hora era timestamp sem fuso, preenchido pelo now() no fuso da sessão
+    op.execute("""
+        INSERT INTO historico (id, endpoint, parametros, ip_cliente, data_hora)
+        SELECT id, endpoint, parametros, ip_cliente, coalesce(data_hora::timestamptz, now())
+          FROM historico_legado
+    """)
+    op.execute("DROP TABLE historico_legado")
+    op.execute("ALTER SEQUENCE historico_id_seq OWNED BY historico.id")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('historico', schema=None) as batch_op:
+            batch_op.drop_index('ix_historico_endpoint_data_hora_id')
+            batch_op.drop_index('ix_historico_data_hora_id')
+            batch_op.alter_column('data_hora', existing_type=sa.DateTime(timezone=True), type_=sa.DateTime(),
+                                  nullable=True, existing_server_default=sa.text('now()'))
+        return
+
+    op.execute("ALTER TABLE historico RENAME TO historico_particionado")
+    op.execute("ALTER TABLE historico_particionado RENAME CONSTRAINT historico_pkey TO historico_particionado_pkey")
+    op.execute("ALTER SEQUENCE historico_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE historico_particionado ALTER COLUMN id DROP DEFAULT")
+    op.execute("""
+        CREATE TABLE historico (
+            id integer NOT NULL DEFAULT nextval('historico_id_seq'),
+            endpoint varchar(255) NOT NULL,
+            parametros json,
+            ip_cliente varchar(45),
+            data_hora timestamp DEFAULT now(),
+            CONSTRAINT historico_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO historico (id, endpoint, parametros, ip_cliente, data_hora)
+        SELECT id, endpoint, parametros, ip_cliente, data_hora::timestamp
+          FROM historico_particionado
+    """)
+    op.execute("DROP TABLE historico_particionado")
+    op.execute("ALTER SEQUENCE historico_id_seq AS integer")
+    op.execute("ALTER SEQUENCE historico_id_seq OWNED BY historico.id")
@@ -0,0 +1,31 @@
+"""tabela historico
+
+Revision ID: c7f2aaed11de
+Revises: 
+Create Date: 2026-10-16 09:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f2aaed11de'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('historico',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('parametros', sa.JSON(), nullable=True),
+    sa.Column('ip_cliente', sa.String(length=45), nullable=True),
+    sa.Column('data_hora', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('historico')
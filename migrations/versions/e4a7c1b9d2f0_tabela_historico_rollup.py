@@ -0,0 +1,45 @@
+"""tabela historico_rollup (agregados de tráfego e latência por rota)
+
+Revision ID: e4a7c1b9d2f0
+Revises: 5b1e9d04a3c2
+Create Date: 2026-10-16 17:02:45.118730
+
+Os agregados começam vazios: as linhas antigas do histórico guardam o path,
+não a regra da rota, e não são reprocessadas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c1b9d2f0'
+down_revision = '5b1e9d04a3c2'
+branch_labels = None
+depends_on = None
+
+LATENCY_COLUMNS = ('lat_le_5', 'lat_le_10', 'lat_le_25', 'lat_le_50', 'lat_le_100', 'lat_le_250',
+                   'lat_le_500', 'lat_le_1000', 'lat_le_2500', 'lat_le_5000', 'lat_le_10000', 'lat_le_inf')
+
+
+def upgrade():
+    op.create_table('historico_rollup',
+    sa.Column('granularidade', sa.String(length=8), nullable=False),
+    sa.Column('rota', sa.String(length=255), nullable=False),
+    sa.Column('inicio', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('requisicoes', sa.BigInteger(), nullable=False),
+    sa.Column('erros', sa.BigInteger(), nullable=False),
+    sa.Column('erros_cliente', sa.BigInteger(), nullable=False),
+    sa.Column('bytes_out', sa.BigInteger(), nullable=False),
+    sa.Column('duracao_total_ms', sa.BigInteger(), nullable=False),
+    *[sa.Column(name, sa.BigInteger(), nullable=False) for name in LATENCY_COLUMNS],
+    sa.PrimaryKeyConstraint('granularidade', 'rota', 'inicio')
+    )
+    with op.batch_alter_table('historico_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_historico_rollup_granularidade_inicio', ['granularidade', 'inicio'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('historico_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_historico_rollup_granularidade_inicio')
+
+    op.drop_table('historico_rollup')